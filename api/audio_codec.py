@@ -0,0 +1,206 @@
+"""
+Streaming audio transcoding between client formats and the realtime session.
+The realtime session always runs PCM16 at 24 kHz; clients on slow links can
+send and receive 16/8 kHz PCM16, G.711 mu-law (8 bits per sample) or Opus
+(when `opuslib` is installed) and the server converts each frame with
+vectorized NumPy code. Converters keep state across frames so resampling is
+continuous at chunk boundaries.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import opuslib
+except ImportError:  # Opus is optional
+    opuslib = None
+
+SESSION_FORMAT = "pcm16"
+SESSION_RATE = 24000
+
+FORMATS = ("pcm16", "g711_ulaw", "opus")
+RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Anti-aliasing filter length used when downsampling
+FILTER_TAPS = 31
+# Opus frames are 20 ms
+OPUS_FRAME_MS = 20
+
+_ULAW_BIAS = 0x84
+_ULAW_CLIP = 32635
+
+
+def _build_ulaw_decode_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    sign = codes & 0x80
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + _ULAW_BIAS) << exponent) - _ULAW_BIAS
+    return np.where(sign, -magnitude, magnitude).astype(np.int16)
+
+
+_ULAW_DECODE = _build_ulaw_decode_table()
+
+
+def ulaw_decode(data: bytes) -> np.ndarray:
+    """G.711 mu-law bytes to int16 samples."""
+    return _ULAW_DECODE[np.frombuffer(data, dtype=np.uint8)]
+
+
+def ulaw_encode(samples: np.ndarray) -> bytes:
+    """int16 samples to G.711 mu-law bytes (14-bit companding, as in audioop)."""
+    pcm = samples.astype(np.int32) >> 2
+    sign = np.where(pcm < 0, 0x00, 0x80)
+    magnitude = np.minimum(np.abs(pcm), _ULAW_CLIP >> 2) + (_ULAW_BIAS >> 2)
+    # Segment is the position of the highest set bit above bit 5
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 5, 0, 7)
+    mantissa = (magnitude >> (exponent + 1)) & 0x0F
+    return ((sign | (exponent << 4) | mantissa) ^ 0x7F).astype(np.uint8).tobytes()
+
+
+def _lowpass(cutoff: float, taps: int = FILTER_TAPS) -> np.ndarray:
+    """Windowed-sinc FIR; `cutoff` is a fraction of the input sample rate."""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (h / h.sum()).astype(np.float32)
+
+
+class Resampler:
+    """Streaming linear-interpolation resampler with anti-aliasing on downsample."""
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.step = src_rate / dst_rate
+        self._filter = _lowpass(0.5 / self.step * 0.9) if dst_rate < src_rate else None
+        self._history = np.zeros(FILTER_TAPS - 1, dtype=np.float32)
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._pos = 0.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.src_rate == self.dst_rate or not len(samples):
+            return samples.astype(np.int16, copy=False)
+        x = samples.astype(np.float32)
+        if self._filter is not None:
+            padded = np.concatenate((self._history, x))
+            self._history = padded[-(FILTER_TAPS - 1):]
+            x = np.convolve(padded, self._filter, mode="valid")
+        # Prepend the last sample of the previous chunk so interpolation spans the boundary
+        x = np.concatenate((self._tail, x))
+        positions = np.arange(self._pos, len(x) - 1, self.step)
+        out = np.interp(positions, np.arange(len(x)), x)
+        next_pos = positions[-1] + self.step if len(positions) else self._pos
+        self._pos = next_pos - (len(x) - 1)
+        self._tail = x[-1:]
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+class AudioConverter:
+    """Converts a stream of frames from one (format, rate) to another."""
+
+    def __init__(self, src_format: str, src_rate: int, dst_format: str, dst_rate: int):
+        for fmt in (src_format, dst_format):
+            if fmt not in FORMATS:
+                raise ValueError(f"Unsupported audio format: {fmt}")
+            if fmt == "opus" and opuslib is None:
+                raise ValueError("Opus audio requires the opuslib package")
+        for rate in (src_rate, dst_rate):
+            if rate not in RATES:
+                raise ValueError(f"Unsupported sample rate: {rate}")
+        if "g711_ulaw" in (src_format, dst_format):
+            # G.711 is defined at 8 kHz
+            if (src_format == "g711_ulaw" and src_rate != 8000) or (dst_format == "g711_ulaw" and dst_rate != 8000):
+                raise ValueError("g711_ulaw audio must be 8000 Hz")
+        self.src_format = src_format
+        self.src_rate = src_rate
+        self.dst_format = dst_format
+        self.dst_rate = dst_rate
+        self.passthrough = src_format == dst_format and src_rate == dst_rate and src_format != "opus"
+        self.resampler = Resampler(src_rate, dst_rate)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._odd = b""
+        self._decoder = opuslib.Decoder(src_rate, 1) if src_format == "opus" else None
+        self._encoder = None
+        self._encode_frame = 0
+        self._pending = np.zeros(0, dtype=np.int16)
+        if dst_format == "opus":
+            self._encoder = opuslib.Encoder(dst_rate, 1, opuslib.APPLICATION_VOIP)
+            self._encode_frame = dst_rate * OPUS_FRAME_MS // 1000
+
+    def _decode(self, data: bytes) -> np.ndarray:
+        if self.src_format == "g711_ulaw":
+            return ulaw_decode(data)
+        if self.src_format == "opus":
+            # One Opus packet per frame; 120 ms is the largest packet duration
+            pcm = self._decoder.decode(data, self.src_rate * 120 // 1000)
+            return np.frombuffer(pcm, dtype=np.int16)
+        # Keep an odd trailing byte for the next frame
+        data = self._odd + data
+        cut = len(data) - len(data) % 2
+        self._odd = data[cut:]
+        return np.frombuffer(data[:cut], dtype="<i2")
+
+    def _encode(self, samples: np.ndarray) -> List[bytes]:
+        if self.dst_format == "g711_ulaw":
+            return [ulaw_encode(samples)] if len(samples) else []
+        if self.dst_format == "opus":
+            pending = np.concatenate((self._pending, samples))
+            frames = len(pending) // self._encode_frame
+            packets = [
+                self._encoder.encode(pending[i * self._encode_frame:(i + 1) * self._encode_frame].tobytes(), self._encode_frame)
+                for i in range(frames)
+            ]
+            self._pending = pending[frames * self._encode_frame:]
+            return packets
+        return [samples.astype("<i2", copy=False).tobytes()] if len(samples) else []
+
+    def convert(self, data: bytes) -> List[bytes]:
+        """Convert one input frame; returns zero or more output frames.
+
+        PCM and G.711 produce at most one frame; Opus output is split into
+        20 ms packets, each of which must be sent as its own frame.
+        """
+        self.bytes_in += len(data)
+        if self.passthrough:
+            self.bytes_out += len(data)
+            return [data]
+        frames = self._encode(self.resampler.process(self._decode(data)))
+        self.bytes_out += sum(len(f) for f in frames)
+        return frames
+
+
+def parse_client_formats(params) -> Dict:
+    """Client audio formats from query parameters, defaulting to the session's.
+
+    `input_format`/`input_rate` describe what the client sends and
+    `output_format`/`output_rate` what it wants back.
+    """
+    formats = {}
+    for direction in ("input", "output"):
+        fmt = params.get(f"{direction}_format", SESSION_FORMAT)
+        default_rate = 8000 if fmt == "g711_ulaw" else SESSION_RATE
+        try:
+            rate = int(params.get(f"{direction}_rate", default_rate))
+        except ValueError:
+            raise ValueError(f"Invalid {direction}_rate")
+        formats[direction] = (fmt, rate)
+    return formats
+
+
+def client_converters(params) -> Dict[str, Optional[AudioConverter]]:
+    """Input (client -> session) and output (session -> client) converters.
+
+    A direction that already matches the session format gets None so the
+    handler can keep its zero-copy path. Raises ValueError for bad formats.
+    """
+    formats = parse_client_formats(params)
+    in_fmt, in_rate = formats["input"]
+    out_fmt, out_rate = formats["output"]
+    converters: Dict[str, Optional[AudioConverter]] = {"input": None, "output": None}
+    if (in_fmt, in_rate) != (SESSION_FORMAT, SESSION_RATE):
+        converters["input"] = AudioConverter(in_fmt, in_rate, SESSION_FORMAT, SESSION_RATE)
+    if (out_fmt, out_rate) != (SESSION_FORMAT, SESSION_RATE):
+        converters["output"] = AudioConverter(SESSION_FORMAT, SESSION_RATE, out_fmt, out_rate)
+    return converters
@@ -0,0 +1,96 @@
+"""
+Barge-in: interrupting the assistant when the user starts talking.
+ResponseTracker follows the assistant response being streamed to one client.
+When server VAD reports speech_started while that response is still
+streaming or playing, the handler cancels it upstream and truncates the
+assistant item to the audio the client can have played. It also drops the
+audio still queued for the client. Deltas that arrive later for the
+cancelled response are discarded too.
+"""
+
+import os
+import time
+from typing import Dict, Optional, Set
+
+BARGE_IN = os.getenv("BARGE_IN", "true").lower() == "true"
+
+# 24 kHz mono PCM16
+PCM_BYTES_PER_MS = 48
+
+
+class ResponseTracker:
+    """The current assistant response of one audio session, for interruption."""
+
+    def __init__(self):
+        self.response_id: Optional[str] = None
+        self.item_id: Optional[str] = None
+        self.active = False
+        self.audio_bytes = 0
+        self.first_audio_at: Optional[float] = None
+        self._cancelled: Set[str] = set()
+        # Audio bytes discarded per cancelled response, reported on response.done
+        self.dropped: Dict[str, int] = {}
+
+    def response_created(self, response_id: str):
+        self.response_id = response_id
+        self.item_id = None
+        self.active = True
+        self.audio_bytes = 0
+        self.first_audio_at = None
+
+    def audio(self, response_id: Optional[str], item_id: Optional[str], size: int) -> bool:
+        """Record an upstream audio delta; False if it belongs to a cancelled response."""
+        if response_id in self._cancelled:
+            self.dropped[response_id] = self.dropped.get(response_id, 0) + size
+            return False
+        if item_id != self.item_id:
+            self.item_id = item_id
+            self.audio_bytes = 0
+            self.first_audio_at = None
+        if self.first_audio_at is None:
+            self.first_audio_at = time.monotonic()
+        self.audio_bytes += size
+        return True
+
+    def is_cancelled(self, response_id: Optional[str]) -> bool:
+        return response_id in self._cancelled
+
+    def response_done(self, response_id: Optional[str]) -> Optional[int]:
+        """Mark a response finished; returns the bytes dropped if it was cancelled."""
+        if response_id == self.response_id:
+            self.active = False
+        if response_id in self._cancelled:
+            self._cancelled.discard(response_id)
+            return self.dropped.pop(response_id, 0)
+        return None
+
+    def played_ms(self) -> int:
+        """Audio the client can have played: no more than was sent, no faster than real time."""
+        if self.first_audio_at is None:
+            return 0
+        elapsed = (time.monotonic() - self.first_audio_at) * 1000
+        return int(min(self.audio_bytes / PCM_BYTES_PER_MS, elapsed))
+
+    def is_speaking(self) -> bool:
+        """The response is still streaming, or its audio is still playing on the client."""
+        if self.response_id is None:
+            return False
+        return self.active or self.played_ms() < self.audio_bytes // PCM_BYTES_PER_MS
+
+    def interrupt(self) -> Dict:
+        """Forget the current response; returns what the handler must cancel and truncate."""
+        cut = {
+            "response_id": self.response_id,
+            "item_id": self.item_id,
+            "played_ms": self.played_ms(),
+            "cancel": self.active,
+        }
+        if self.active and self.response_id is not None:
+            self._cancelled.add(self.response_id)
+            self.dropped[self.response_id] = 0
+        self.response_id = None
+        self.item_id = None
+        self.active = False
+        self.audio_bytes = 0
+        self.first_audio_at = None
+        return cut
@@ -0,0 +1,78 @@
+"""
+Batch prompt throughput versus the number of realtime connections.
+Runs the same prompt file through realtime_batch.BatchRunner against a fake
+realtime server in this process, first one prompt at a time on a single
+connection (what the interactive demos do) and then over more connections.
+
+Usage:
+    python benchmarks/bench_batch_prompts.py
+    python benchmarks/bench_batch_prompts.py --prompts 2000 --concurrency 1 16 64
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.dirname(API_DIR))
+
+from fake_realtime_server import FakeRealtimeServer
+from endpoint_router import Endpoint, EndpointRouter
+from session_profiles import load_profiles
+from realtime_batch import BatchRunner, read_prompts
+
+
+def ms(value, width: int) -> str:
+    return f"{'n/a':>{width}}  " if value is None else f"{value:>{width}.0f}ms"
+
+
+async def run(get_client, prompts_path: str, concurrency: int, first_token_delay: float) -> dict:
+    server = FakeRealtimeServer(port=0, tokens_per_sec=100, first_token_delay=first_token_delay)
+    await server.start()
+    router = EndpointRouter([Endpoint("fake", server.url, "gpt-realtime")], get_client)
+    runner = BatchRunner(router, load_profiles()["default"], concurrency=concurrency, progress_interval=0)
+    try:
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as output:
+            return await runner.run(read_prompts(prompts_path), output)
+    finally:
+        await server.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Realtime batch runner benchmark")
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--first-token-delay", type=float, default=0.2,
+                        help="Seconds the fake server waits before the first token")
+    args = parser.parse_args()
+
+    from credentials import ClientFactory, TokenCache
+    factory = ClientFactory(TokenCache(api_key="fake"))
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+        for i in range(args.prompts):
+            f.write(json.dumps({"id": i, "prompt": f"Question number {i}?"}) + "\n")
+    print(f"{args.prompts} prompts, fake server with {args.first_token_delay * 1000:.0f} ms to first token")
+    print(f"{'connections':>11} {'prompts/s':>10} {'seconds':>8} {'ttft p50':>9} {'ttft p95':>9} "
+          f"{'total p50':>10} {'total p95':>10}")
+    try:
+        for concurrency in args.concurrency:
+            try:
+                s = await run(factory.get_realtime_client, f.name, concurrency, args.first_token_delay)
+            except ConnectionError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            failed = f"  ({s['failed']} failed)" if s["failed"] else ""
+            print(f"{concurrency:>11} {s['prompts_per_sec']:>10.1f} {s['seconds']:>8.1f} "
+                  f"{ms(s['ttft_ms_p50'], 7)} {ms(s['ttft_ms_p95'], 7)} "
+                  f"{ms(s['total_ms_p50'], 8)} {ms(s['total_ms_p95'], 8)}{failed}")
+    finally:
+        os.unlink(f.name)
+        await factory.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Benchmark delta batching: frames/sec and CPU per session with and without
+the DeltaBatcher window. Each simulated session streams single-token deltas
+at a fixed rate into an OutboundQueue whose socket JSON-encodes every frame,
+like Starlette's send_json.
+
+Usage:
+    python benchmarks/bench_delta_batching.py --sessions 200 --tokens 200 --rate 100
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import DeltaBatcher, OutboundQueue
+
+
+class CountingSocket:
+    """Stands in for a browser WebSocket; encodes and counts frames."""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_json(self, data):
+        self.frames += 1
+        self.bytes += len(json.dumps(data))
+
+    async def send_bytes(self, data):
+        self.frames += 1
+        self.bytes += len(data)
+
+
+async def session(tokens: int, rate: float, flush_ms: float, sockets: list):
+    socket = CountingSocket()
+    sockets.append(socket)
+    outbound = OutboundQueue(socket, max_size=100000)
+    batcher = DeltaBatcher(outbound, flush_ms=flush_ms)
+    writer = asyncio.create_task(outbound.run())
+    for _ in range(tokens):
+        batcher.add_text("text_delta", " tok")
+        await asyncio.sleep(1 / rate)
+    batcher.send({"type": "response_done"})
+    while outbound.depth:
+        await asyncio.sleep(0.001)
+    batcher.close()
+    outbound.close()
+    await writer
+
+
+async def run(sessions: int, tokens: int, rate: float, flush_ms: float):
+    sockets: list = []
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*[session(tokens, rate, flush_ms, sockets) for _ in range(sessions)])
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    frames = sum(s.frames for s in sockets)
+    print(
+        f"flush_ms={flush_ms:>5.1f} | frames: {frames:8d} | frames/sec: {frames / wall:10.0f} | "
+        f"frames/session: {frames / sessions:7.1f} | CPU/session: {cpu / sessions * 1000:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta batching benchmark")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=200, help="Deltas per session")
+    parser.add_argument("--rate", type=float, default=100, help="Deltas per second per session")
+    parser.add_argument("--flush-ms", type=float, nargs="+", default=[0, 15, 50])
+    args = parser.parse_args()
+    for flush_ms in args.flush_ms:
+        asyncio.run(run(args.sessions, args.tokens, args.rate, flush_ms))
+
+
+if __name__ == "__main__":
+    main()
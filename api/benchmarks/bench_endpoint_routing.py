@@ -0,0 +1,114 @@
+"""
+Connect latency and failures with one endpoint versus the endpoint router.
+Starts three fake realtime servers in this process standing in for regions
+with different handshake delays, then opens connections one after another:
+
+    single   every connect to the fast region (AZURE_OPENAI_ENDPOINT alone)
+    router   fastest healthy region, failing over on errors
+    hedged   router racing the two best regions
+
+Half way through, the fastest region starts rejecting every connection with a
+429, so the run also shows failover and circuit breaking.
+
+Usage:
+    python benchmarks/bench_endpoint_routing.py
+    python benchmarks/bench_endpoint_routing.py --connects 400
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_realtime_server import FakeRealtimeServer
+from endpoint_router import Endpoint, EndpointRouter
+
+# (name, handshake delay, extra random delay) in seconds
+REGIONS = [
+    ("steady", 0.12, 0.04),
+    ("fast", 0.03, 0.02),
+    ("jittery", 0.04, 0.25),
+]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def ms(seconds: Optional[float]) -> str:
+    return f"{'n/a':>6}  " if seconds is None else f"{seconds * 1000:>6.0f}ms"
+
+
+async def run(mode: str, get_client: Callable, connects: int) -> Dict:
+    servers = [FakeRealtimeServer(port=0, connect_delay=delay, connect_jitter=jitter)
+               for _, delay, jitter in REGIONS]
+    for server in servers:
+        await server.start()
+    endpoints = [Endpoint(name, server.url, "gpt-realtime") for (name, _, _), server in zip(REGIONS, servers)]
+    if mode == "single":
+        endpoints = endpoints[1:2]
+    router = EndpointRouter(endpoints, get_client, hedge=mode == "hedged",
+                            connect_timeout=2.0, probe_interval=0.5)
+    await router.start()
+    # Connect latencies before and after the fast region starts failing
+    phases: List[List[float]] = [[], []]
+    failed = 0
+    try:
+        for i in range(connects):
+            if i == connects // 2:
+                servers[1].fail_rate = 1.0
+            started = time.perf_counter()
+            try:
+                _, connection, _ = await router.connect()
+            except Exception:
+                failed += 1
+                continue
+            phases[i >= connects // 2].append(time.perf_counter() - started)
+            await connection.close()
+    finally:
+        await router.stop()
+        for server in servers:
+            await server.stop()
+    stats = router.stats()
+    before, after = phases
+    return {
+        "p50": percentile(before, 50),
+        "p95": percentile(before, 95),
+        "p50_429": percentile(after, 50),
+        "p95_429": percentile(after, 95),
+        "failed": failed,
+        "failovers": stats["failovers"],
+        "circuit_opens": sum(e["circuit_opens"] for e in stats["endpoints"].values()),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Realtime endpoint routing benchmark")
+    parser.add_argument("--connects", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["single", "router", "hedged"],
+                        choices=["single", "router", "hedged"])
+    args = parser.parse_args()
+
+    from credentials import ClientFactory, TokenCache
+    factory = ClientFactory(TokenCache(api_key="fake"))
+    print(f"{args.connects} sequential connects; the fast region returns 429 from the midpoint")
+    print(f"{'':<8} {'healthy':^17} {'fast region 429':^17}")
+    print(f"{'mode':<8} {'p50':>8} {'p95':>8} {'p50':>8} {'p95':>8} {'failed':>7} {'failovers':>10} {'circuit opens':>14}")
+    try:
+        for mode in args.modes:
+            r = await run(mode, factory.get_realtime_client, args.connects)
+            print(f"{mode:<8} {ms(r['p50'])} {ms(r['p95'])} {ms(r['p50_429'])} {ms(r['p95_429'])} "
+                  f"{r['failed']:>7} {r['failovers']:>10} {r['circuit_opens']:>14}")
+    finally:
+        await factory.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Bytes sent and server time for saving a 500-turn conversation.
+The client saves after every turn, either the whole session (PUT
+/chat-history/{id}, the mux `save`) or only the new messages (POST
+/chat-history/{id}/messages, the mux `append`). Server time covers parsing
+the request body, the size checks and the store write.
+
+Usage:
+    python benchmarks/bench_history_append.py
+    python benchmarks/bench_history_append.py --turns 200 --backends memory
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import MemoryHistoryStore, SqliteHistoryStore, check_messages
+
+
+def _turn(i: int) -> List[Dict]:
+    return [
+        {"role": "user", "content": f"Turn {i}: what should I check next on the deployment?"},
+        {
+            "role": "assistant",
+            "content": f"For step {i}, look at the health endpoint first, then the logs of the "
+                       "newest replica. If requests fail only on that replica, roll it back and "
+                       "compare its configuration with the previous release before retrying. "
+                       "Keep the old release running until the new one passes its checks.",
+            "complete": True,
+        },
+    ]
+
+
+def build_store(backend: str, directory: str):
+    if backend == "sqlite":
+        return SqliteHistoryStore(os.path.join(directory, "bench.db"))
+    return MemoryHistoryStore(archive_dir=None)
+
+
+def run(backend: str, mode: str, turns: int) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(backend, directory)
+        session = store.add("Bench", [])
+        session_id, version = session["id"], session["version"]
+        messages: List[Dict] = []
+        sent = 0
+        server = 0.0
+        last = 0.0
+        for i in range(turns):
+            new = _turn(i)
+            messages.extend(new)
+            if mode == "full":
+                body = json.dumps({"messages": messages})
+            else:
+                body = json.dumps({"base_version": version, "start": len(messages) - len(new),
+                                   "messages": new})
+            sent += len(body)
+            start = time.perf_counter()
+            request = json.loads(body)
+            if mode == "full":
+                check_messages(request["messages"])
+                version = store.update(session_id, None, request["messages"])
+            else:
+                version = store.append(session_id, request["messages"], request["start"],
+                                       request["base_version"])["version"]
+            last = time.perf_counter() - start
+            server += last
+        assert len(store.get(session_id)["messages"]) == len(messages)
+        store.close()
+    return {"sent": sent, "server": server, "last": last}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental chat save benchmark")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "memory"], choices=["sqlite", "memory"])
+    args = parser.parse_args()
+
+    print(f"{args.turns} turns ({args.turns * 2} messages), one save per turn")
+    print(f"{'backend':<8} {'save':<7} {'bytes sent':>12} {'server total':>13} {'last save':>10}")
+    for backend in args.backends:
+        for mode in ("full", "append"):
+            result = run(backend, mode, args.turns)
+            print(f"{backend:<8} {mode:<7} {result['sent'] / 2 ** 20:>10.2f}MB "
+                  f"{result['server'] * 1000:>11.0f}ms {result['last'] * 1000:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Resident memory of chat history storage for 10k, 100k and 1M messages.
+Each configuration runs in a fresh subprocess, so the reported growth in RSS
+is just the stored sessions (10 messages each) plus allocator overhead.
+
+Usage:
+    python benchmarks/bench_history_memory.py
+    python benchmarks/bench_history_memory.py --messages 10000 100000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES_PER_SESSION = 10
+CONFIGS = ("list", "memory-hot", "memory", "memory-16mb")
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # ru_maxrss is KB on Linux; peak rather than current elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _session(i: int) -> List[Dict]:
+    messages = []
+    for turn in range(MESSAGES_PER_SESSION // 2):
+        messages.append({"role": "user", "content": f"Question {turn} in chat {i}: how do I reset my password?"})
+        messages.append({
+            "role": "assistant",
+            "content": f"Answer {turn} for chat {i}. Open Settings, choose Security, select Reset "
+                       "password and follow the link we email you. The link expires after one hour, "
+                       "so request a new one if it has expired.",
+            "complete": True,
+        })
+    return messages
+
+
+def build_store(config: str, archive_dir: str):
+    from bench_history_store import ListHistory
+    from history_store import MemoryHistoryStore
+
+    if config == "list":
+        return ListHistory()
+    if config == "memory-hot":
+        # Everything uncompressed: slotted records only
+        return MemoryHistoryStore(hot_sessions=10 ** 9, memory_budget=0, archive_dir=None)
+    if config == "memory":
+        return MemoryHistoryStore(archive_dir=archive_dir)
+    if config == "memory-16mb":
+        return MemoryHistoryStore(memory_budget=16 * 1024 * 1024, archive_dir=archive_dir)
+    raise ValueError(config)
+
+
+def child(config: str, messages: int):
+    with tempfile.TemporaryDirectory() as archive_dir:
+        store = build_store(config, archive_dir)
+        before = rss_bytes()
+        start = time.perf_counter()
+        for i in range(messages // MESSAGES_PER_SESSION):
+            store.add(f"Chat {i}", _session(i))
+        elapsed = time.perf_counter() - start
+        after = rss_bytes()
+        stats = store.stats() if hasattr(store, "stats") else {}
+        print(json.dumps({"rss": after - before, "seconds": elapsed, "archived": stats.get("archived", 0)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history memory benchmark")
+    parser.add_argument("--messages", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=CONFIGS)
+    parser.add_argument("--child", nargs=2, metavar=("CONFIG", "MESSAGES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    print(f"{'config':<12} {'messages':>10} {'RSS growth':>12} {'bytes/msg':>10} {'add time':>9} {'archived':>9}")
+    for messages in args.messages:
+        for config in args.configs:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", config, str(messages)],
+                capture_output=True, text=True, check=True, cwd=API_DIR,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{config:<12} {messages:>10} {result['rss'] / 2 ** 20:>10.1f}MB "
+                  f"{result['rss'] / messages:>10.0f} {result['seconds']:>8.2f}s {result['archived']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Search latency over chat history, against scanning every session.
+Builds 100k sessions (6 messages each) with a mix of rare, uncommon and
+common words, then times /chat-history/search queries on each backend and
+the client-side scan of every summary and message the app needed before.
+
+Usage:
+    python benchmarks/bench_history_search.py
+    python benchmarks/bench_history_search.py --sessions 10000 --backends memory
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import MemoryHistoryStore, SqliteHistoryStore
+
+TOPICS = [f"topic{i}" for i in range(200)]
+PRODUCTS = [f"product{i}" for i in range(5000)]
+FILLER = ("please explain how the service handles this and what I should check first "
+          "when it does not work as expected").split()
+
+# (label, query builder); each query is drawn for a random session
+QUERIES = {
+    "rare (1 session)": lambda i: f"ticket{i}",
+    "uncommon (0.5%)": lambda i: f"topic{i % 200}",
+    "common (all)": lambda i: "service",
+    "two words": lambda i: f"topic{i % 200} product{i % 5000}",
+    "rare + common": lambda i: f"topic{i % 200} question",
+    "two common": lambda i: "service restart",
+}
+
+
+def _session(i: int, rng: random.Random) -> List[Dict]:
+    topic, product = TOPICS[i % 200], PRODUCTS[i % 5000]
+    messages = []
+    for turn in range(3):
+        words = rng.sample(FILLER, 8)
+        messages.append({"role": "user",
+                         "content": f"About {product} and {topic}: {' '.join(words)} (ticket{i})"})
+        messages.append({"role": "assistant", "complete": True,
+                         "content": f"For {product}, the service usually recovers after a restart. "
+                                    f"{' '.join(rng.sample(FILLER, 12))}."})
+    return messages
+
+
+def scan(sessions: List[Dict], query: str, limit: int) -> List[int]:
+    """What the client could do before: match every session, newest first."""
+    words = query.lower().split()
+    hits = []
+    for session in sessions:
+        text = " ".join([session["summary"]] + [m["content"] for m in session["messages"]]).lower()
+        if all(w in text for w in words):
+            hits.append(session["id"])
+    return hits[::-1][:limit]
+
+
+def timed(func, repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report(name: str, label: str, times: List[float]):
+    times.sort()
+    p95 = times[max(0, int(len(times) * 0.95) - 1)]
+    print(f"{name:<8} {label:<20} {statistics.median(times):>9.2f}ms {p95:>9.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history search benchmark")
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "memory", "scan"],
+                        choices=["sqlite", "memory", "scan"])
+    args = parser.parse_args()
+    rng = random.Random(7)
+    data = [(f"{TOPICS[i % 200]} question {i}", _session(i, rng)) for i in range(args.sessions)]
+    picks = [rng.randrange(args.sessions) for _ in range(args.queries)]
+
+    print(f"{args.sessions} sessions, {args.queries} queries each, limit {args.limit}")
+    print(f"{'backend':<8} {'query':<20} {'median':>11} {'p95':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in args.backends:
+            start = time.perf_counter()
+            if backend == "scan":
+                listing = [{"id": i + 1, "summary": s, "messages": m} for i, (s, m) in enumerate(data)]
+                search = lambda q: scan(listing, q, args.limit)
+            else:
+                if backend == "sqlite":
+                    store = SqliteHistoryStore(os.path.join(directory, "bench.db"))
+                else:
+                    store = MemoryHistoryStore(hot_sessions=10 ** 9, memory_budget=0, archive_dir=None)
+                for summary, messages in data:
+                    store.add(summary, messages)
+                search = lambda q, store=store: store.search(q, args.limit)
+            print(f"{backend:<8} {'(build)':<20} {time.perf_counter() - start:>10.1f}s")
+            for label, build in QUERIES.items():
+                queries = iter([build(i) for i in picks])
+                report(backend, label, timed(lambda: search(next(queries)), args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark chat history backends against the original module-global list.
+
+Usage:
+    python benchmarks/bench_history_store.py --sessions 100000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import MemoryHistoryStore, SqliteHistoryStore
+
+
+class ListHistory:
+    """The original implementation: a list scanned on every update/delete."""
+
+    def __init__(self):
+        self.chat_history: List[Dict] = []
+
+    def add(self, summary, messages):
+        session = {
+            "id": len(self.chat_history) + 1,
+            "summary": summary,
+            "timestamp": datetime.now().isoformat(),
+            "messages": messages,
+        }
+        self.chat_history.append(session)
+        return session
+
+    def update(self, session_id, summary=None, messages=None):
+        for chat in self.chat_history:
+            if chat["id"] == session_id:
+                chat["summary"] = summary or chat["summary"]
+                chat["messages"] = messages if messages is not None else chat["messages"]
+                chat["timestamp"] = datetime.now().isoformat()
+                return True
+        return False
+
+    def delete(self, session_id):
+        self.chat_history = [s for s in self.chat_history if s["id"] != session_id]
+        return True
+
+    def close(self):
+        pass
+
+
+def _messages(i: int) -> List[Dict]:
+    return [
+        {"role": "user", "content": f"Question number {i}"},
+        {"role": "assistant", "content": f"Answer number {i}", "complete": True},
+    ]
+
+
+def bench(name: str, store, sessions: int, ops: int):
+    start = time.perf_counter()
+    for i in range(sessions):
+        store.add(f"Chat {i}", _messages(i))
+    add_time = time.perf_counter() - start
+
+    ids = [random.randint(1, sessions) for _ in range(ops)]
+    start = time.perf_counter()
+    for session_id in ids:
+        store.update(session_id, "Updated", _messages(session_id))
+    update_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for session_id in ids:
+        store.delete(session_id)
+    delete_time = time.perf_counter() - start
+    store.close()
+
+    print(
+        f"{name:<8} add {sessions}: {add_time:8.3f}s | "
+        f"update: {update_time / ops * 1e6:10.1f} us/op | "
+        f"delete: {delete_time / ops * 1e6:10.1f} us/op"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history store benchmark")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--ops", type=int, default=200, help="Random updates/deletes to time")
+    args = parser.parse_args()
+    random.seed(0)
+
+    bench("list", ListHistory(), args.sessions, args.ops)
+    bench("memory", MemoryHistoryStore(), args.sessions, args.ops)
+    with tempfile.TemporaryDirectory() as tmp:
+        bench("sqlite", SqliteHistoryStore(os.path.join(tmp, "bench.db")), args.sessions, args.ops)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Event loop stalls and dropped frames when recording voice sessions.
+Simulates concurrent sessions that exchange 100 ms audio chunks in both
+directions in real time, with every chunk recorded either
+
+    inline     written to the WAV segments from the event loop
+    recorder   handed to SessionRecorder's background writer thread
+
+A ticker task measures how late the event loop wakes up. `--write-delay-ms`
+makes every segment write sleep to stand in for a slow or saturated disk.
+
+Usage:
+    python benchmarks/bench_session_recording.py
+    python benchmarks/bench_session_recording.py --sessions 50 --seconds 10 --write-delay-ms 0 5 20
+"""
+
+import os
+import sys
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import session_recorder
+from session_recorder import SessionRecorder, _SessionFiles, _WavSegment
+
+CHUNK_MS = 100
+CHUNK = bytes(24000 * 2 * CHUNK_MS // 1000)
+CHUNK_B64 = base64.b64encode(CHUNK).decode("ascii")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def ticker(lags: List[float], stop: asyncio.Event, interval: float = 0.005):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def session_inline(recorder: SessionRecorder, directory: str, index: int, seconds: float):
+    files = _SessionFiles(recorder, os.path.join(directory, f"inline-{index}"), time.monotonic())
+    for _ in range(int(seconds * 1000 / CHUNK_MS)):
+        t = time.monotonic() - files.started
+        files.tracks["input"].write(CHUNK, t)
+        files.tracks["output"].write(base64.b64decode(CHUNK_B64), t)
+        await asyncio.sleep(CHUNK_MS / 1000)
+    files.close(time.monotonic() - files.started)
+
+
+async def session_queued(recorder: SessionRecorder, index: int, seconds: float):
+    recording = recorder.open(f"session-{index}")
+    for _ in range(int(seconds * 1000 / CHUNK_MS)):
+        recording.audio_in(CHUNK)
+        recording.audio_out(CHUNK_B64)
+        await asyncio.sleep(CHUNK_MS / 1000)
+    recording.close()
+
+
+async def run(mode: str, sessions: int, seconds: float, queue_bytes: int) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = SessionRecorder(directory, enabled=True, queue_bytes=queue_bytes)
+        if mode == "recorder":
+            recorder.start()
+        lags: List[float] = []
+        stop = asyncio.Event()
+        tick = asyncio.create_task(ticker(lags, stop))
+        started = time.perf_counter()
+        if mode == "inline":
+            await asyncio.gather(*(session_inline(recorder, directory, i, seconds) for i in range(sessions)))
+        else:
+            await asyncio.gather(*(session_queued(recorder, i, seconds) for i in range(sessions)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await tick
+        if mode == "recorder":
+            await asyncio.to_thread(recorder.stop)
+        stats = recorder.stats()
+    return {
+        "elapsed": elapsed,
+        "lag_p99": percentile(lags, 99),
+        "lag_max": max(lags),
+        "dropped": stats["frames_dropped"],
+        "frames": sessions * 2 * int(seconds * 1000 / CHUNK_MS),
+        "queue_peak": stats["queue_peak_bytes"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Session recording benchmark")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Audio per session")
+    parser.add_argument("--write-delay-ms", type=float, nargs="+", default=[0, 2, 10])
+    parser.add_argument("--queue-bytes", type=int, default=session_recorder.RECORDING_QUEUE_BYTES)
+    args = parser.parse_args()
+
+    write = _WavSegment.write
+    print(f"{args.sessions} sessions x {args.seconds:.0f} s, {CHUNK_MS} ms chunks both ways, "
+          f"queue budget {args.queue_bytes / 2 ** 20:.0f} MiB")
+    print(f"{'disk delay':>10} {'mode':<9} {'wall':>7} {'loop lag p99':>13} {'loop lag max':>13} "
+          f"{'dropped':>14} {'queue peak':>11}")
+    for delay in args.write_delay_ms:
+        def slow_write(self, pcm, delay=delay / 1000):
+            if delay:
+                time.sleep(delay)
+            write(self, pcm)
+        _WavSegment.write = slow_write
+        for mode in ("inline", "recorder"):
+            r = await run(mode, args.sessions, args.seconds, args.queue_bytes)
+            print(f"{delay:>8.0f}ms {mode:<9} {r['elapsed']:>6.1f}s {r['lag_p99'] * 1000:>11.1f}ms "
+                  f"{r['lag_max'] * 1000:>11.1f}ms {r['dropped']:>6}/{r['frames']:<7} "
+                  f"{r['queue_peak'] / 2 ** 20:>9.1f}Mi")
+    _WavSegment.write = write
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
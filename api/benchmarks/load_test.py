@@ -0,0 +1,271 @@
+"""
+Offline load test for /ws/text and /ws/audio.
+Starts the fake realtime server in this process, launches the API server as
+a subprocess pointed at it (or targets --api-url), then drives N concurrent
+simulated browsers and reports throughput, connect and time-to-first-delta
+percentiles, and memory/CPU per session of the API process.
+
+Usage:
+    python benchmarks/load_test.py --mode text --sessions 200 --turns 3
+    python benchmarks/load_test.py --mode audio --sessions 50 --tokens-per-sec 30
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+import websockets
+
+from fake_realtime_server import FakeRealtimeServer
+
+# Browser capture: 4096 samples of 24 kHz PCM16 per ScriptProcessor callback
+AUDIO_CHUNK_BYTES = 4096 * 2
+AUDIO_CHUNK_SECONDS = 4096 / 24000
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ProcessSampler:
+    """RSS and CPU time of a process, from psutil when installed or /proc."""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self._process = None
+        if pid is None:
+            return
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            pass
+
+    def sample(self) -> Optional[Dict[str, float]]:
+        if self.pid is None:
+            return None
+        if self._process is not None:
+            cpu = self._process.cpu_times()
+            return {"rss": self._process.memory_info().rss, "cpu": cpu.user + cpu.system}
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            ticks = os.sysconf("SC_CLK_TCK")
+            page = os.sysconf("SC_PAGE_SIZE")
+            return {"rss": int(fields[21]) * page, "cpu": (int(fields[11]) + int(fields[12])) / ticks}
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+class Results:
+    def __init__(self):
+        self.connect: List[float] = []
+        self.first_delta: List[float] = []
+        self.response: List[float] = []
+        self.responses = 0
+        self.deltas = 0
+        self.errors = 0
+
+
+async def wait_connected(ws):
+    """Skip to the server's connected frame; an error frame fails the session."""
+    while True:
+        data = json.loads(await ws.recv())
+        if data["type"] == "connected":
+            return
+        if data["type"] == "error":
+            raise RuntimeError(data.get("message"))
+
+
+async def text_browser(url: str, turns: int, results: Results):
+    started = time.perf_counter()
+    async with websockets.connect(url + "/ws/text", max_size=None) as ws:
+        await wait_connected(ws)
+        results.connect.append(time.perf_counter() - started)
+        for turn in range(turns):
+            sent = time.perf_counter()
+            await ws.send(json.dumps({"type": "message", "text": f"Question {turn}"}))
+            first = None
+            while True:
+                data = json.loads(await ws.recv())
+                if data["type"] == "text_delta":
+                    results.deltas += 1
+                    if first is None:
+                        first = time.perf_counter() - sent
+                        results.first_delta.append(first)
+                elif data["type"] == "response_done":
+                    results.response.append(time.perf_counter() - sent)
+                    results.responses += 1
+                    break
+                elif data["type"] == "error":
+                    raise RuntimeError(data.get("message"))
+
+
+async def audio_browser(url: str, turns: int, turn_bytes: int, results: Results):
+    started = time.perf_counter()
+    chunk = bytes(AUDIO_CHUNK_BYTES)
+    async with websockets.connect(url + "/ws/audio?transport=binary", max_size=None) as ws:
+        await wait_connected(ws)
+        results.connect.append(time.perf_counter() - started)
+        for _ in range(turns):
+            # Stream microphone-sized chunks in real time until the fake VAD fires
+            for _ in range(-(-turn_bytes // AUDIO_CHUNK_BYTES)):
+                await ws.send(chunk)
+                sent = time.perf_counter()
+                await asyncio.sleep(AUDIO_CHUNK_SECONDS)
+            first = None
+            while True:
+                message = await ws.recv()
+                if isinstance(message, bytes):
+                    results.deltas += 1
+                    if first is None:
+                        first = time.perf_counter() - sent
+                        results.first_delta.append(first)
+                    continue
+                data = json.loads(message)
+                if data["type"] == "response_done":
+                    results.response.append(time.perf_counter() - sent)
+                    results.responses += 1
+                    break
+                elif data["type"] == "error":
+                    raise RuntimeError(data.get("message"))
+
+
+async def run_browser(args, url: str, results: Results):
+    try:
+        if args.mode == "text":
+            await text_browser(url, args.turns, results)
+        else:
+            await audio_browser(url, args.turns, args.turn_bytes, results)
+    except Exception as e:
+        results.errors += 1
+        if results.errors <= 5:
+            print(f"Session error: {e!r}")
+
+
+async def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"API server did not start on port {port}")
+
+
+async def main_async(args):
+    fake = FakeRealtimeServer(
+        port=_free_port(),
+        script=args.script,
+        tokens_per_sec=args.tokens_per_sec,
+        audio_chunk_bytes=args.audio_chunk_bytes,
+        audio_chunks=args.audio_chunks,
+        connect_delay=args.connect_delay,
+        first_token_delay=args.first_token_delay,
+        turn_bytes=args.turn_bytes,
+    )
+    await fake.start()
+
+    api = None
+    url = args.api_url
+    if url is None:
+        port = _free_port()
+        env = dict(
+            os.environ,
+            AZURE_OPENAI_ENDPOINT=fake.url,
+            AZURE_OPENAI_API_KEY="fake",
+            CHAT_HISTORY_BACKEND="memory",
+        )
+        api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=API_DIR, env=env,
+        )
+        await wait_for_port(port)
+        url = f"ws://127.0.0.1:{port}"
+    else:
+        print(f"Targeting {url}; start it with AZURE_OPENAI_ENDPOINT={fake.url} AZURE_OPENAI_API_KEY=fake")
+
+    sampler = ProcessSampler(api.pid if api else None)
+    try:
+        await asyncio.sleep(args.warmup)
+        before = sampler.sample()
+        results = Results()
+        started = time.perf_counter()
+        tasks = []
+        for i in range(args.sessions):
+            tasks.append(asyncio.create_task(run_browser(args, url, results)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.sessions)
+        # Peak memory while sessions are open
+        peak = None
+        while not all(t.done() for t in tasks):
+            current = sampler.sample()
+            if current and (peak is None or current["rss"] > peak["rss"]):
+                peak = current
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        after = sampler.sample()
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        await fake.stop()
+
+    print()
+    print(f"mode={args.mode} sessions={args.sessions} turns={args.turns} elapsed={elapsed:.2f}s")
+    print(f"  completed sessions: {args.sessions - results.errors}  errors: {results.errors}")
+    print(f"  responses/sec: {results.responses / elapsed:.1f}  deltas/sec: {results.deltas / elapsed:.1f}")
+    for name, values in (
+        ("connect", results.connect),
+        ("time-to-first-delta", results.first_delta),
+        ("response", results.response),
+    ):
+        print(f"  {name:<20} p50 {percentile(values, 50) * 1000:8.1f} ms   p99 {percentile(values, 99) * 1000:8.1f} ms")
+    if before and after:
+        peak = peak or after
+        print(f"  API memory/session: {(peak['rss'] - before['rss']) / args.sessions / 1024:.1f} KiB "
+              f"(peak RSS {peak['rss'] / 1024 / 1024:.1f} MiB)")
+        print(f"  API CPU/session:    {(after['cpu'] - before['cpu']) / args.sessions * 1000:.2f} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against a fake realtime server")
+    parser.add_argument("--mode", choices=("text", "audio"), default="text")
+    parser.add_argument("--sessions", type=int, default=100, help="Concurrent simulated browsers")
+    parser.add_argument("--turns", type=int, default=3, help="Requests per session")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which to start sessions")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds to let the API fill its pools")
+    parser.add_argument("--api-url", help="Existing API server (ws://host:port); spawned when omitted")
+    parser.add_argument("--script", default="This is a scripted reply used for load testing the realtime API.")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--audio-chunk-bytes", type=int, default=4800)
+    parser.add_argument("--audio-chunks", type=int, default=10)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--turn-bytes", type=int, default=48000, help="Input audio bytes per simulated turn")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
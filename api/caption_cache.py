@@ -0,0 +1,148 @@
+"""
+Caption cache with single-flight request coalescing.
+Captions depend only on the first few user messages, so they are keyed by a
+hash of that context. Entries live in an in-process LRU with a TTL and can
+optionally be persisted to a SQLite file shared across workers and restarts.
+Concurrent requests for the same key share one upstream call.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "10000"))
+CAPTION_CACHE_TTL = float(os.getenv("CAPTION_CACHE_TTL", "86400"))
+# Optional persistent tier; memory only when unset
+CAPTION_CACHE_DB = os.getenv("CAPTION_CACHE_DB")
+
+
+def caption_key(context: str, model: str = "") -> str:
+    """Content hash identifying a caption request."""
+    return hashlib.sha256(f"{model}\n{context}".encode("utf-8")).hexdigest()
+
+
+class _SqliteTier:
+    """Persistent key -> caption table."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS captions "
+                "(key TEXT PRIMARY KEY, caption TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str, ttl: float) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT caption FROM captions WHERE key = ? AND created > ?",
+                (key, time.time() - ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, caption: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO captions (key, caption, created) VALUES (?, ?, ?)",
+                (key, caption, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CaptionCache:
+    """LRU + TTL caption cache with an optional SQLite tier and single-flight."""
+
+    def __init__(self, max_entries: int = CAPTION_CACHE_SIZE, ttl: float = CAPTION_CACHE_TTL,
+                 path: Optional[str] = CAPTION_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._persistent = _SqliteTier(path) if path else None
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        caption, expires = entry
+        if time.monotonic() > expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return caption
+
+    def _set_local(self, key: str, caption: str):
+        self._entries[key] = (caption, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Return the cached caption or compute it once for all concurrent callers.
+
+        `compute` returns None when it could not produce a caption worth caching.
+        """
+        caption = self._get_local(key)
+        if caption is not None:
+            self.hits += 1
+            return caption
+        if key in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            caption = None
+            if self._persistent is not None:
+                caption = await asyncio.to_thread(self._persistent.get, key, self.ttl)
+                if caption is not None:
+                    self.persistent_hits += 1
+            if caption is None:
+                self.misses += 1
+                caption = await compute()
+                if caption is not None and self._persistent is not None:
+                    await asyncio.to_thread(self._persistent.set, key, caption)
+            if caption is not None:
+                self._set_local(key, caption)
+            future.set_result(caption)
+            return caption
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters see the exception; don't warn about it being unretrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def close(self):
+        if self._persistent is not None:
+            self._persistent.close()
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,185 @@
+"""
+Multi-worker support: per-worker admission control and shared load state.
+Each worker caps its concurrent realtime sessions and periodically publishes
+its load to a shared state backend (a SQLite file visible to every worker on
+the host or on a shared volume, or an in-process stand-in for tests) so
+/readyz can report both its own load and the cluster's.
+"""
+
+import os
+import time
+import socket
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+MAX_REALTIME_SESSIONS = int(os.getenv("MAX_REALTIME_SESSIONS", "200"))
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "sqlite")
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB", "shared_state.db")
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "5"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class AdmissionController:
+    """Caps concurrent realtime sessions on this worker."""
+
+    def __init__(self, max_sessions: int = MAX_REALTIME_SESSIONS):
+        self.max_sessions = max_sessions
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.active >= self.max_sessions:
+            self.rejected += 1
+            return False
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.active = max(0, self.active - 1)
+
+    @property
+    def load(self) -> float:
+        return self.active / self.max_sessions if self.max_sessions else 1.0
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "max_sessions": self.max_sessions,
+            "load": round(self.load, 4),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class SharedState(ABC):
+    """Interface for state shared between workers."""
+
+    @abstractmethod
+    def publish(self, worker_id: str, stats: Dict):
+        ...
+
+    @abstractmethod
+    def workers(self, max_age: float) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def remove(self, worker_id: str):
+        ...
+
+    def close(self):
+        pass
+
+
+class MemorySharedState(SharedState):
+    """Single-process stand-in used for tests and one-worker deployments."""
+
+    def __init__(self):
+        self._workers: Dict[str, Dict] = {}
+
+    def publish(self, worker_id: str, stats: Dict):
+        self._workers[worker_id] = {"worker_id": worker_id, "updated": time.time(), **stats}
+
+    def workers(self, max_age: float) -> List[Dict]:
+        cutoff = time.time() - max_age
+        return [w for w in self._workers.values() if w["updated"] >= cutoff]
+
+    def remove(self, worker_id: str):
+        self._workers.pop(worker_id, None)
+
+
+class SqliteSharedState(SharedState):
+    """Worker heartbeats in a SQLite file shared by all workers."""
+
+    def __init__(self, path: str = SHARED_STATE_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "worker_id TEXT PRIMARY KEY, active INTEGER NOT NULL, "
+                "max_sessions INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def publish(self, worker_id: str, stats: Dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, active, max_sessions, updated) VALUES (?, ?, ?, ?)",
+                (worker_id, stats["active"], stats["max_sessions"], time.time()),
+            )
+
+    def workers(self, max_age: float) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker_id, active, max_sessions, updated FROM workers WHERE updated >= ?",
+                (time.time() - max_age,),
+            ).fetchall()
+        return [
+            {"worker_id": r[0], "active": r[1], "max_sessions": r[2], "updated": r[3]}
+            for r in rows
+        ]
+
+    def remove(self, worker_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_shared_state(backend: str = SHARED_STATE_BACKEND) -> SharedState:
+    """Build the configured shared state backend."""
+    if backend == "memory":
+        return MemorySharedState()
+    if backend == "sqlite":
+        return SqliteSharedState()
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+
+
+class Heartbeat:
+    """Publishes this worker's admission stats to the shared state."""
+
+    def __init__(self, state: SharedState, admission: AdmissionController,
+                 interval: float = HEARTBEAT_INTERVAL, worker_id: str = WORKER_ID):
+        self.state = state
+        self.admission = admission
+        self.interval = interval
+        self.worker_id = worker_id
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.state.publish, self.worker_id, self.admission.stats())
+            except Exception as e:
+                print(f"Error publishing worker heartbeat: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.to_thread(self.state.remove, self.worker_id)
+        except Exception:
+            pass
+
+    def cluster(self) -> List[Dict]:
+        """Live workers (heartbeat within three intervals)."""
+        return self.state.workers(self.interval * 3)
@@ -0,0 +1,178 @@
+"""
+Process-wide Azure credential, token cache and OpenAI client factory.
+One DefaultAzureCredential is shared by every request, the bearer token is
+cached and refreshed in the background before it expires, and AsyncOpenAI
+clients share a single HTTP connection pool.
+"""
+
+import os
+import time
+import asyncio
+from typing import Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
+from azure.identity import DefaultAzureCredential
+
+TOKEN_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# Refresh the token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+# Optional key auth (e.g. for the local fake realtime server); Entra ID is used when unset
+API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+
+
+class TokenCache:
+    """Caches a bearer token and refreshes it before expiry."""
+
+    def __init__(self, scope: str = TOKEN_SCOPE, refresh_margin: int = TOKEN_REFRESH_MARGIN,
+                 api_key: Optional[str] = API_KEY):
+        self.scope = scope
+        self.api_key = api_key
+        self.refresh_margin = refresh_margin
+        self._credential: Optional[DefaultAzureCredential] = None
+        self._token: Optional[str] = None
+        self._expires_on = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and time.time() < self._expires_on - self.refresh_margin
+
+    async def _fetch(self):
+        """Fetch a new token. The credential chain is blocking, so run it off the event loop."""
+        if self._credential is None:
+            self._credential = DefaultAzureCredential()
+        access_token = await asyncio.to_thread(self._credential.get_token, self.scope)
+        self._token = access_token.token
+        self._expires_on = float(access_token.expires_on)
+        self.refreshes += 1
+
+    async def get_token(self) -> str:
+        """Return a valid bearer token, fetching one only when the cache is stale."""
+        if self.api_key:
+            self.hits += 1
+            return self.api_key
+        if self._is_fresh():
+            self.hits += 1
+            return self._token
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if self._is_fresh():
+                self.hits += 1
+                return self._token
+            self.misses += 1
+            await self._fetch()
+            return self._token
+
+    async def _refresh_loop(self):
+        while True:
+            delay = self._expires_on - self.refresh_margin - time.time()
+            await asyncio.sleep(max(delay, 5))
+            try:
+                async with self._lock:
+                    if not self._is_fresh():
+                        await self._fetch()
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"Error refreshing token: {e}")
+
+    async def start(self):
+        """Warm the cache and start background refresh."""
+        if self.api_key:
+            return
+        try:
+            await self.get_token()
+        except Exception as e:
+            print(f"Error warming token cache: {e}")
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        if self._credential is not None:
+            self._credential.close()
+            self._credential = None
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "expires_in": max(0, int(self._expires_on - time.time())) if self._token else 0,
+        }
+
+
+class ClientFactory:
+    """Builds AsyncOpenAI clients once and hands out the same instances."""
+
+    def __init__(self, token_cache: TokenCache):
+        self.token_cache = token_cache
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[str, AsyncOpenAI] = {}
+        self.clients_created = 0
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                ),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+        return self._http_client
+
+    def get_realtime_client(self, endpoint: str) -> AsyncOpenAI:
+        """Client for the Realtime API on the given endpoint."""
+        key = "realtime:" + endpoint
+        if key not in self._clients:
+            # http:// for local stand-ins such as fake_realtime_server.py
+            base_url = endpoint.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/openai/v1"
+            self._clients[key] = AsyncOpenAI(
+                websocket_base_url=base_url,
+                api_key=self.token_cache.get_token,
+                http_client=self._get_http_client(),
+            )
+            self.clients_created += 1
+        return self._clients[key]
+
+    def get_chat_client(self, endpoint: str, deployment: str) -> AsyncOpenAI:
+        """Client for chat completions on the given deployment."""
+        key = "chat:" + endpoint + ":" + deployment
+        if key not in self._clients:
+            base_url = endpoint.rstrip("/") + "/openai/deployments/" + deployment
+            self._clients[key] = AsyncOpenAI(
+                base_url=base_url,
+                api_key=self.token_cache.get_token,
+                default_query={"api-version": "2024-08-01-preview"},
+                http_client=self._get_http_client(),
+            )
+            self.clients_created += 1
+        return self._clients[key]
+
+    async def close(self):
+        self._clients.clear()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def stats(self) -> Dict:
+        return {"clients": len(self._clients), "clients_created": self.clients_created}
+
+
+token_cache = TokenCache()
+client_factory = ClientFactory(token_cache)
@@ -0,0 +1,328 @@
+"""
+Latency-aware routing of Realtime connections across endpoints.
+REALTIME_ENDPOINTS lists several Azure OpenAI resources (optionally with
+their own deployment). Every connect is timed up to the first upstream event
+and a failure (error event such as a 429, exception or timeout) counts
+against its endpoint. New connections go to the healthy endpoint with the
+lowest smoothed connect latency and fail over to the next on error.
+
+After ROUTER_FAILURE_THRESHOLD consecutive failures an endpoint's circuit
+opens and it is skipped for ROUTER_OPEN_SECONDS; then one trial connect
+decides whether it closes again. With ROUTER_HEDGE the two best endpoints
+are raced (the second after ROUTER_HEDGE_DELAY) and the loser is closed.
+Endpoints that are not being picked are probed every ROUTER_PROBE_INTERVAL
+seconds so a region that recovers is noticed.
+"""
+
+import os
+import time
+import asyncio
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from openai import AsyncOpenAI
+
+# Comma-separated `url` or `url|deployment`; empty means AZURE_OPENAI_ENDPOINT only
+REALTIME_ENDPOINTS = os.getenv("REALTIME_ENDPOINTS", "")
+ROUTER_HEDGE = os.getenv("ROUTER_HEDGE", "false").lower() == "true"
+ROUTER_HEDGE_DELAY = float(os.getenv("ROUTER_HEDGE_DELAY", "0"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_OPEN_SECONDS = float(os.getenv("ROUTER_OPEN_SECONDS", "30"))
+ROUTER_PROBE_INTERVAL = float(os.getenv("ROUTER_PROBE_INTERVAL", "30"))
+ROUTER_CONNECT_TIMEOUT = float(os.getenv("ROUTER_CONNECT_TIMEOUT", "10"))
+
+# Weight of the newest sample in the smoothed latency and error rate
+_ALPHA = 0.3
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class EndpointError(Exception):
+    """An endpoint refused a connection with an error event."""
+
+    def __init__(self, message: str, throttled: bool = False):
+        super().__init__(message)
+        self.throttled = throttled
+
+
+class Endpoint:
+    """One Azure OpenAI resource and deployment, with its latency and circuit state."""
+
+    def __init__(self, name: str, url: str, deployment: str):
+        self.name = name
+        self.url = url
+        self.deployment = deployment
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False
+        self.in_flight = 0
+        self.last_attempt = 0.0
+        self.connects = 0
+        self.errors = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.hedge_wins = 0
+        self.circuit_opens = 0
+
+    def state(self, now: Optional[float] = None) -> str:
+        if self.failures < ROUTER_FAILURE_THRESHOLD:
+            return CLOSED
+        return OPEN if (now or time.monotonic()) < self.open_until else HALF_OPEN
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        # A half-open endpoint gets one trial connect at a time
+        return state == CLOSED or (state == HALF_OPEN and not self.trial)
+
+    def _smooth(self, latency: float, error: float):
+        self.latency = latency if self.latency is None else (1 - _ALPHA) * self.latency + _ALPHA * latency
+        self.error_rate = (1 - _ALPHA) * self.error_rate + _ALPHA * error
+
+    def record_success(self, latency: float):
+        self.connects += 1
+        self.failures = 0
+        self._smooth(latency, 0.0)
+
+    def record_failure(self, penalty: float, throttled: bool = False, timeout: bool = False):
+        """Count a failed connect; `penalty` seconds go into the latency average."""
+        self.errors += 1
+        self.throttled += throttled
+        self.timeouts += timeout
+        self.failures += 1
+        self._smooth(penalty, 1.0)
+        if self.failures >= ROUTER_FAILURE_THRESHOLD:
+            # Opened now, or reopened by a failed trial
+            if self.failures == ROUTER_FAILURE_THRESHOLD or self.trial:
+                self.circuit_opens += 1
+            self.open_until = time.monotonic() + ROUTER_OPEN_SECONDS
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "deployment": self.deployment,
+            "state": self.state(),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "in_flight": self.in_flight,
+            "connects": self.connects,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "timeouts": self.timeouts,
+            "hedge_wins": self.hedge_wins,
+            "circuit_opens": self.circuit_opens,
+        }
+
+
+def parse_endpoints(spec: str, default_url: Optional[str], default_deployment: str) -> List[Endpoint]:
+    """Endpoints from REALTIME_ENDPOINTS, or the single default endpoint when `spec` is empty."""
+    entries = [entry.strip() for entry in spec.split(",") if entry.strip()]
+    if not entries:
+        entries = [default_url or ""]
+    endpoints = []
+    for i, entry in enumerate(entries):
+        url, _, deployment = entry.partition("|")
+        endpoints.append(Endpoint(f"endpoint{i}", url.strip(), deployment.strip() or default_deployment))
+    return endpoints
+
+
+def _is_throttled(message: str) -> bool:
+    return "429" in message or "rate_limit" in message or "Too many requests" in message
+
+
+class EndpointRouter:
+    """Opens realtime connections on the best endpoint, with failover and hedging."""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        get_client: Callable[[str], AsyncOpenAI],
+        hedge: bool = ROUTER_HEDGE,
+        hedge_delay: float = ROUTER_HEDGE_DELAY,
+        connect_timeout: float = ROUTER_CONNECT_TIMEOUT,
+        probe_interval: float = ROUTER_PROBE_INTERVAL,
+    ):
+        if not endpoints:
+            raise ValueError("At least one realtime endpoint is required")
+        self.endpoints = endpoints
+        self.get_client = get_client
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.connect_timeout = connect_timeout
+        self.probe_interval = probe_interval
+        # Hedge losers still connecting; closed when they finish
+        self._losers: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.failovers = 0
+        self.hedged = 0
+        self.exhausted = 0
+        self.probes = 0
+
+    def ranked(self) -> List[Endpoint]:
+        """Endpoints to try, best first: unmeasured, then by smoothed latency.
+
+        When every circuit is open all endpoints are returned, soonest to
+        reopen first, so a full outage still retries instead of refusing.
+        """
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.available(now)]
+        if not candidates:
+            self.exhausted += 1
+            return sorted(self.endpoints, key=lambda e: e.open_until)
+        return sorted(candidates, key=lambda e: (e.latency or 0.0, e.in_flight))
+
+    async def _attempt(self, endpoint: Endpoint):
+        """Connect to one endpoint and wait for its first event; returns (manager, connection)."""
+        half_open = endpoint.state() == HALF_OPEN
+        if half_open:
+            endpoint.trial = True
+        endpoint.in_flight += 1
+        endpoint.last_attempt = time.monotonic()
+        started = time.perf_counter()
+        connection = None
+        try:
+            manager = self.get_client(endpoint.url).realtime.connect(model=endpoint.deployment)
+            connection = await asyncio.wait_for(manager.enter(), self.connect_timeout)
+            # session.created, or an error such as a 429 before the socket closes
+            event = await asyncio.wait_for(connection.recv(), self.connect_timeout)
+            if event.type == "error":
+                message = str(getattr(event.error, "message", "") or event.error)
+                code = str(getattr(event.error, "code", "") or "")
+                raise EndpointError(f"{endpoint.name}: {message}", _is_throttled(code + " " + message))
+        except asyncio.CancelledError:
+            if connection is not None:
+                await self._close(connection)
+            raise
+        except Exception as e:
+            if connection is not None:
+                await self._close(connection)
+            timeout = isinstance(e, asyncio.TimeoutError)
+            throttled = getattr(e, "throttled", False) or _is_throttled(str(e))
+            endpoint.record_failure(self.connect_timeout, throttled=throttled, timeout=timeout)
+            raise
+        else:
+            endpoint.record_success(time.perf_counter() - started)
+            return manager, connection
+        finally:
+            endpoint.in_flight -= 1
+            if half_open:
+                endpoint.trial = False
+
+    @staticmethod
+    async def _close(connection):
+        try:
+            await connection.close()
+        except Exception:
+            pass
+
+    async def connect(self) -> Tuple[object, object, Endpoint]:
+        """Open a connection on the best endpoint; returns (manager, connection, endpoint).
+
+        Tries the ranked endpoints in turn (racing the first two when hedging)
+        and raises the last error if all of them fail.
+        """
+        candidates = self.ranked()
+        error: Optional[BaseException] = None
+        if self.hedge and len(candidates) >= 2:
+            try:
+                return await self._hedged(candidates[0], candidates[1])
+            except Exception as e:
+                error = e
+            candidates = candidates[2:]
+        for i, endpoint in enumerate(candidates):
+            if error is not None:
+                self.failovers += 1
+                print(f"Realtime connect failed ({error}); trying {endpoint.name}")
+            try:
+                manager, connection = await self._attempt(endpoint)
+                return manager, connection, endpoint
+            except Exception as e:
+                error = e
+        raise error
+
+    async def _hedged(self, first: Endpoint, second: Endpoint) -> Tuple[object, object, Endpoint]:
+        """Race two endpoints, the second after hedge_delay; keep the first to connect."""
+        tasks = {asyncio.create_task(self._attempt(first)): first}
+        done: Set[asyncio.Task] = set()
+        if self.hedge_delay > 0:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+        winner = next((t for t in done if t.exception() is None), None)
+        if winner is None:
+            self.hedged += 1
+            tasks[asyncio.create_task(self._attempt(second))] = second
+        pending = set(tasks) - done
+        error: Optional[BaseException] = next((t.exception() for t in done), None)
+        try:
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+        except asyncio.CancelledError:
+            for task in pending:
+                task.cancel()
+            raise
+        if winner is None:
+            raise error
+        # Let the loser finish so its latency is still measured, then close it
+        for task in pending:
+            self._losers.add(task)
+            task.add_done_callback(self._discard)
+        endpoint = tasks[winner]
+        if len(tasks) > 1:
+            endpoint.hedge_wins += 1
+        manager, connection = winner.result()
+        return manager, connection, endpoint
+
+    def _discard(self, task: asyncio.Task):
+        self._losers.discard(task)
+        if not task.cancelled() and task.exception() is None:
+            _, connection = task.result()
+            loser = asyncio.ensure_future(self._close(connection))
+            self._losers.add(loser)
+            loser.add_done_callback(self._losers.discard)
+
+    async def _probe(self):
+        """Measure endpoints that ranking has not picked lately."""
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            stale = [
+                e for e in self.endpoints
+                if e.available(now) and e.in_flight == 0 and now - e.last_attempt >= self.probe_interval
+            ]
+            for endpoint in stale:
+                self.probes += 1
+                try:
+                    _, connection = await self._attempt(endpoint)
+                except Exception as e:
+                    print(f"Probe of {endpoint.name} failed: {e}")
+                    continue
+                await self._close(connection)
+
+    async def start(self):
+        if len(self.endpoints) > 1 and self.probe_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._probe())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._losers):
+            task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "hedge": int(self.hedge),
+            "failovers": self.failovers,
+            "hedged": self.hedged,
+            "exhausted": self.exhausted,
+            "probes": self.probes,
+            "endpoints": {e.name: e.stats() for e in self.endpoints},
+        }
@@ -0,0 +1,112 @@
+"""
+Stand-in for a PyAudio device, for running the audio demo offline.
+Implements the parts of the PyAudio API the demo uses (open() with a
+stream_callback, start/stop/close, terminate). Each stream runs its callback
+from its own thread at real-time pace, like PortAudio does: input streams
+feed a tone for `speech_seconds` followed by `silence_seconds` of silence,
+repeating, and output streams record what the callback returns.
+
+Usage:
+    device = FakeAudioDevice()
+    demo = RealtimeAudioDemo(audio=device)
+"""
+
+import math
+import array
+import threading
+import time
+from typing import Callable, List, Optional
+
+# Same values as pyaudio.paContinue / paComplete
+PA_CONTINUE = 0
+PA_COMPLETE = 1
+
+
+class FakeStream:
+    """One callback-mode stream driven by a background thread."""
+
+    def __init__(self, device: "FakeAudioDevice", rate: int, frames_per_buffer: int,
+                 callback: Callable, input: bool):
+        self.device = device
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.input = input
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._position = 0
+
+    def start_stream(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop_stream(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def is_active(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    def close(self):
+        self.stop_stream()
+
+    def _capture(self) -> bytes:
+        """Next buffer of the speech/silence pattern as PCM16."""
+        device = self.device
+        period = device.speech_seconds + device.silence_seconds
+        samples = array.array("h")
+        for i in range(self.frames_per_buffer):
+            t = (self._position + i) / self.rate
+            if period > 0 and t % period < device.speech_seconds:
+                samples.append(int(device.amplitude * math.sin(2 * math.pi * device.tone_hz * t)))
+            else:
+                samples.append(0)
+        self._position += self.frames_per_buffer
+        return samples.tobytes()
+
+    def _run(self):
+        interval = self.frames_per_buffer / self.rate
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            in_data = self._capture() if self.input else None
+            out_data, flag = self.callback(in_data, self.frames_per_buffer, {}, 0)
+            if not self.input and out_data is not None:
+                self.device.played.append(bytes(out_data))
+            if flag != PA_CONTINUE:
+                break
+            deadline += interval
+            self._stop.wait(max(0.0, deadline - time.monotonic()))
+
+
+class FakeAudioDevice:
+    """PyAudio-compatible microphone and speaker with scripted input."""
+
+    def __init__(self, speech_seconds: float = 1.5, silence_seconds: float = 2.0,
+                 tone_hz: float = 440.0, amplitude: int = 8000):
+        self.speech_seconds = speech_seconds
+        self.silence_seconds = silence_seconds
+        self.tone_hz = tone_hz
+        self.amplitude = amplitude
+        self.played: List[bytes] = []
+        self.streams: List[FakeStream] = []
+
+    def open(self, format=None, channels: int = 1, rate: int = 24000, input: bool = False,
+             output: bool = False, frames_per_buffer: int = 1024,
+             stream_callback: Optional[Callable] = None, start: bool = True) -> FakeStream:
+        if stream_callback is None:
+            raise ValueError("FakeAudioDevice only supports callback mode")
+        stream = FakeStream(self, rate, frames_per_buffer, stream_callback, input)
+        self.streams.append(stream)
+        if start:
+            stream.start_stream()
+        return stream
+
+    def terminate(self):
+        for stream in self.streams:
+            stream.close()
+        self.streams.clear()
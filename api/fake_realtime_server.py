@@ -0,0 +1,265 @@
+"""
+Local stand-in for the Azure OpenAI Realtime WebSocket API.
+Speaks enough of the protocol for the API server and demos to run offline:
+session.update, conversation items, scripted streaming responses (text or
+audio), input audio buffering with a simple simulated VAD, and response.cancel.
+
+Usage:
+    python fake_realtime_server.py --port 9000
+    # then run the API with AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9000
+    # and AZURE_OPENAI_API_KEY=fake
+"""
+
+import json
+import base64
+import random
+import asyncio
+import argparse
+import itertools
+from typing import Dict, List, Optional
+
+import websockets
+from websockets.asyncio.server import serve
+
+DEFAULT_SCRIPT = "Sure! This is a scripted reply from the fake realtime server."
+
+_ids = itertools.count(1)
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{next(_ids)}"
+
+
+class FakeRealtimeServer:
+    """Scripted Realtime API server for offline testing and load tests."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 9000,
+        script: str = DEFAULT_SCRIPT,
+        tokens_per_sec: float = 50.0,
+        audio_chunk_bytes: int = 4800,
+        audio_chunks: int = 10,
+        connect_delay: float = 0.0,
+        connect_jitter: float = 0.0,
+        first_token_delay: float = 0.0,
+        turn_bytes: int = 48000,
+        fail_rate: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.script = script
+        self.tokens_per_sec = tokens_per_sec
+        self.audio_chunk_bytes = audio_chunk_bytes
+        self.audio_chunks = audio_chunks
+        self.connect_delay = connect_delay
+        self.connect_jitter = connect_jitter
+        self.first_token_delay = first_token_delay
+        self.turn_bytes = turn_bytes
+        self.fail_rate = fail_rate
+        self._server = None
+        self._attempts = 0
+        self.connections = 0
+        self.active = 0
+        self.responses = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await serve(self._handle, self.host, self.port, max_size=None)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _should_fail(self) -> bool:
+        # Deterministically reject fail_rate of all connection attempts
+        return int(self._attempts * self.fail_rate) > int((self._attempts - 1) * self.fail_rate)
+
+    def _tokens(self) -> List[str]:
+        words = self.script.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    async def _handle(self, ws):
+        self._attempts += 1
+        if self.connect_delay or self.connect_jitter:
+            await asyncio.sleep(self.connect_delay + random.uniform(0, self.connect_jitter))
+        if self._should_fail():
+            await ws.send(json.dumps({
+                "type": "error", "event_id": _new_id("event"),
+                "error": {"type": "rate_limit_exceeded", "code": "429", "message": "Too many requests"},
+            }))
+            await ws.close(code=1013, reason="rate limited")
+            return
+        self.connections += 1
+        self.active += 1
+        session: Dict = {"id": _new_id("sess"), "type": "realtime", "output_modalities": ["text"]}
+        state = {"audio_bytes": 0, "response": None}
+
+        async def send(event: Dict):
+            event.setdefault("event_id", _new_id("event"))
+            await ws.send(json.dumps(event))
+
+        try:
+            await send({"type": "session.created", "session": session})
+            async for raw in ws:
+                event = json.loads(raw)
+                etype = event.get("type")
+                if etype == "session.update":
+                    session.update(event.get("session", {}))
+                    await send({"type": "session.updated", "session": session})
+                elif etype == "conversation.item.create":
+                    item = dict(event.get("item", {}))
+                    item.setdefault("id", _new_id("item"))
+                    await send({"type": "conversation.item.created", "item": item})
+                elif etype == "response.create":
+                    self._start_response(state, session, send)
+                elif etype == "response.cancel":
+                    task = state["response"]
+                    if task is not None and not task.done():
+                        task.cancel()
+                elif etype == "conversation.item.truncate":
+                    await send({
+                        "type": "conversation.item.truncated",
+                        "item_id": event.get("item_id"),
+                        "content_index": event.get("content_index", 0),
+                        "audio_end_ms": event.get("audio_end_ms", 0),
+                    })
+                elif etype == "input_audio_buffer.append":
+                    state["audio_bytes"] += len(base64.b64decode(event.get("audio", "")))
+                    if state["audio_bytes"] >= self.turn_bytes:
+                        state["audio_bytes"] = 0
+                        await self._simulate_turn(state, session, send)
+                elif etype == "input_audio_buffer.commit":
+                    state["audio_bytes"] = 0
+                    await send({"type": "input_audio_buffer.committed", "item_id": _new_id("item")})
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            task = state["response"]
+            if task is not None and not task.done():
+                task.cancel()
+            self.active -= 1
+
+    async def _simulate_turn(self, state: Dict, session: Dict, send):
+        """Pretend server VAD detected a complete utterance."""
+        item_id = _new_id("item")
+        await send({"type": "input_audio_buffer.speech_started", "audio_start_ms": 0, "item_id": item_id})
+        await send({"type": "input_audio_buffer.speech_stopped", "audio_end_ms": 1000, "item_id": item_id})
+        await send({"type": "input_audio_buffer.committed", "item_id": item_id})
+        await send({
+            "type": "conversation.item.input_audio_transcription.completed",
+            "item_id": item_id, "content_index": 0, "transcript": "Hello there.",
+        })
+        turn_detection = session.get("audio", {}).get("input", {}).get("turn_detection") or {}
+        if turn_detection.get("create_response", True):
+            self._start_response(state, session, send)
+
+    def _start_response(self, state: Dict, session: Dict, send):
+        task = state["response"]
+        if task is not None and not task.done():
+            task.cancel()
+        state["response"] = asyncio.create_task(self._stream_response(session, send))
+
+    async def _stream_response(self, session: Dict, send):
+        self.responses += 1
+        response_id = _new_id("resp")
+        item_id = _new_id("item")
+        audio = "audio" in session.get("output_modalities", ["text"])
+        interval = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+        status = "completed"
+        await send({"type": "response.created", "response": {"id": response_id, "status": "in_progress"}})
+        try:
+            if self.first_token_delay:
+                await asyncio.sleep(self.first_token_delay)
+            tokens = self._tokens()
+            chunk = base64.b64encode(bytes(self.audio_chunk_bytes)).decode("ascii") if audio else None
+            for i in range(max(len(tokens), self.audio_chunks if audio else 0)):
+                if audio:
+                    if i < self.audio_chunks:
+                        await send({
+                            "type": "response.output_audio.delta", "response_id": response_id,
+                            "item_id": item_id, "output_index": 0, "content_index": 0, "delta": chunk,
+                        })
+                    if i < len(tokens):
+                        await send({
+                            "type": "response.output_audio_transcript.delta", "response_id": response_id,
+                            "item_id": item_id, "output_index": 0, "content_index": 0, "delta": tokens[i],
+                        })
+                else:
+                    await send({
+                        "type": "response.output_text.delta", "response_id": response_id,
+                        "item_id": item_id, "output_index": 0, "content_index": 0, "delta": tokens[i],
+                    })
+                if interval:
+                    await asyncio.sleep(interval)
+            if audio:
+                await send({"type": "response.output_audio.done", "response_id": response_id, "item_id": item_id})
+                await send({
+                    "type": "response.output_audio_transcript.done", "response_id": response_id,
+                    "item_id": item_id, "transcript": self.script,
+                })
+            else:
+                await send({
+                    "type": "response.output_text.done", "response_id": response_id,
+                    "item_id": item_id, "text": self.script,
+                })
+        except asyncio.CancelledError:
+            status = "cancelled"
+        try:
+            await send({"type": "response.done", "response": {"id": response_id, "status": status}})
+        except websockets.ConnectionClosed:
+            pass
+
+
+async def run_server(server: FakeRealtimeServer):
+    await server.start()
+    print(f"Fake realtime server listening on ws://{server.host}:{server.port}")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.stop()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI Realtime server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="Text streamed back for every response")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--audio-chunk-bytes", type=int, default=4800)
+    parser.add_argument("--audio-chunks", type=int, default=10)
+    parser.add_argument("--connect-delay", type=float, default=0.0, help="Seconds to delay each handshake")
+    parser.add_argument("--connect-jitter", type=float, default=0.0,
+                        help="Up to this many extra seconds, at random, per handshake")
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--turn-bytes", type=int, default=48000, help="Input audio bytes per simulated turn")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of connections rejected with 429")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        asyncio.run(run_server(FakeRealtimeServer(
+            host=args.host,
+            port=args.port,
+            script=args.script,
+            tokens_per_sec=args.tokens_per_sec,
+            audio_chunk_bytes=args.audio_chunk_bytes,
+            audio_chunks=args.audio_chunks,
+            connect_delay=args.connect_delay,
+            connect_jitter=args.connect_jitter,
+            first_token_delay=args.first_token_delay,
+            turn_bytes=args.turn_bytes,
+            fail_rate=args.fail_rate,
+        )))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,831 @@
+"""
+Chat history storage backends.
+SqliteHistoryStore is the default: a WAL-mode SQLite file shared by every
+uvicorn worker, with ids from AUTOINCREMENT so they are never reused after a
+delete. MemoryHistoryStore keeps sessions in process for tests and local
+runs, compressing and archiving cold sessions to stay within a budget.
+check_messages() enforces the per-session size limits for every backend.
+
+Every session has a version that changes whenever its messages do. append()
+replaces only the tail of a session, so a client that sends its base version
+saves just the messages that changed instead of the whole conversation.
+search() is backed by an index both backends keep up to date on every write
+(see search_index.py).
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from search_index import (
+    SUMMARY_WEIGHT, InvertedIndex, common_threshold, fts_query, query_terms, rare_terms, snippet,
+)
+
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "sqlite")
+CHAT_HISTORY_DB = os.getenv("CHAT_HISTORY_DB", "chat_history.db")
+
+# Per-session limits, checked before anything is stored
+CHAT_MAX_MESSAGES = int(os.getenv("CHAT_MAX_MESSAGES", "1000"))
+CHAT_MAX_MESSAGE_CHARS = int(os.getenv("CHAT_MAX_MESSAGE_CHARS", "32000"))
+CHAT_MAX_SESSION_BYTES = int(os.getenv("CHAT_MAX_SESSION_BYTES", str(1024 * 1024)))
+
+# Memory backend: uncompressed sessions, total budget and archive directory
+CHAT_HOT_SESSIONS = int(os.getenv("CHAT_HOT_SESSIONS", "100"))
+CHAT_MEMORY_BUDGET_BYTES = int(os.getenv("CHAT_MEMORY_BUDGET_BYTES", str(64 * 1024 * 1024)))
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "chat_archive")
+
+
+class MessageLimitError(ValueError):
+    """A chat session exceeds the configured size limits."""
+
+
+class VersionConflictError(Exception):
+    """An append was based on a version of the session that is no longer current."""
+
+    def __init__(self, version: int):
+        super().__init__(f"Chat session has changed (now version {version})")
+        self.version = version
+
+
+def check_messages(messages, max_messages: int = CHAT_MAX_MESSAGES,
+                   max_chars: int = CHAT_MAX_MESSAGE_CHARS,
+                   max_bytes: int = CHAT_MAX_SESSION_BYTES,
+                   base_count: int = 0, base_bytes: int = 0) -> int:
+    """Raise MessageLimitError unless `messages` is a list within every limit.
+
+    When appending, `base_count` and `base_bytes` describe the messages kept
+    ahead of `messages`. Returns the total content bytes.
+    """
+    if not isinstance(messages, list):
+        raise MessageLimitError("messages must be a list")
+    count = base_count + len(messages)
+    if count > max_messages:
+        raise MessageLimitError(f"Too many messages ({count} > {max_messages})")
+    total = base_bytes
+    for message in messages:
+        if not isinstance(message, dict):
+            raise MessageLimitError("Each message must be an object")
+        content = message.get("content", "")
+        if not isinstance(content, str):
+            raise MessageLimitError("Message content must be a string")
+        if len(content) > max_chars:
+            raise MessageLimitError(f"Message too long ({len(content)} > {max_chars} characters)")
+        total += len(content.encode("utf-8"))
+        if total > max_bytes:
+            raise MessageLimitError(f"Chat session larger than {max_bytes} bytes")
+    return total
+
+
+def _content_size(messages: List[Dict]) -> int:
+    return sum(len(m.get("content", "").encode("utf-8")) for m in messages)
+
+
+class HistoryStore(ABC):
+    """Interface shared by all chat history backends."""
+
+    @abstractmethod
+    def add(self, summary: str, messages: List[Dict]) -> Dict:
+        ...
+
+    @abstractmethod
+    def get(self, session_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def update(self, session_id: int, summary: Optional[str] = None,
+               messages: Optional[List[Dict]] = None) -> Optional[int]:
+        """Change the summary and/or replace the messages.
+
+        Returns the session's version afterwards, or None if it does not exist.
+        """
+
+    @abstractmethod
+    def append(self, session_id: int, messages: List[Dict], start: Optional[int] = None,
+               base_version: Optional[int] = None) -> Optional[Dict]:
+        """Replace the messages from index `start` on (the end when None) with `messages`.
+
+        Returns {version, message_count}, or None if the session does not
+        exist. Raises VersionConflictError when `base_version` is given and
+        is not the current version, MessageLimitError when the result is over
+        the limits and ValueError when `start` is past the last message.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def list(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def list_summaries(self, limit: int, before_id: Optional[int] = None) -> List[Dict]:
+        """Newest-first page of {id, summary, timestamp, message_count} without messages."""
+
+    @abstractmethod
+    def search(self, query: str, limit: int, offset: int = 0) -> List[Dict]:
+        """Sessions containing every word of `query`, best match first.
+
+        Each result is a summary ({id, summary, timestamp, message_count})
+        plus `score` (higher is better) and a `snippet` of a matching message
+        or None when only the summary matched.
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def revision(self) -> int:
+        """Counter bumped on every write; used to build ETags for listings."""
+
+    def stats(self) -> Dict:
+        return {"sessions": self.count()}
+
+    def close(self):
+        pass
+
+
+class _Message:
+    """Compact chat message: interned role, no per-message dict."""
+
+    __slots__ = ("role", "content", "complete", "extra")
+
+    def __init__(self, message: Dict):
+        self.role = sys.intern(str(message.get("role", "")))
+        self.content = message.get("content", "")
+        self.complete = message.get("complete")
+        extra = {k: v for k, v in message.items() if k not in _MESSAGE_FIELDS}
+        self.extra = extra or None
+
+    def to_dict(self) -> Dict:
+        message = {"role": self.role, "content": self.content}
+        if self.complete is not None:
+            message["complete"] = self.complete
+        if self.extra:
+            message.update(self.extra)
+        return message
+
+
+_MESSAGE_FIELDS = ("role", "content", "complete")
+
+
+def _pack(messages: List[Dict]) -> bytes:
+    return zlib.compress(json.dumps(messages, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(blob))
+
+
+def _hot_size(records: List[_Message]) -> int:
+    """Rough resident size of a hot session's messages."""
+    return sum(_MESSAGE_OVERHEAD + len(m.content) for m in records)
+
+
+# Slotted record plus its content string header, approximately
+_MESSAGE_OVERHEAD = 120
+
+
+class MemoryHistoryStore(HistoryStore):
+    """Sessions in process memory, within a memory budget.
+
+    Summaries stay in a dict keyed by id, with ids from a counter and never
+    from len(). The `hot_sessions` most recently used sessions keep their
+    messages as slotted records. Older sessions are held as zlib-compressed
+    JSON. When hot and compressed messages exceed `memory_budget` bytes, the
+    least recently used compressed sessions are archived to `archive_dir` and
+    read back on access.
+    """
+
+    def __init__(self, hot_sessions: int = CHAT_HOT_SESSIONS,
+                 memory_budget: int = CHAT_MEMORY_BUDGET_BYTES,
+                 archive_dir: Optional[str] = CHAT_ARCHIVE_DIR):
+        self.hot_sessions = hot_sessions
+        self.memory_budget = memory_budget
+        self.archive_dir = archive_dir
+        # Calls arrive from asyncio.to_thread workers
+        self._lock = threading.RLock()
+        self._sessions: Dict[int, Dict] = {}
+        # Content bytes per session, for the size limit on append
+        self._content_bytes: Dict[int, int] = {}
+        # Covers every tier, so searching never reads compressed or archived sessions
+        self._index = InvertedIndex()
+        # id -> messages, least recently used first
+        self._hot: "OrderedDict[int, List[_Message]]" = OrderedDict()
+        self._warm: "OrderedDict[int, bytes]" = OrderedDict()
+        self._archived: Set[int] = set()
+        self._hot_bytes = 0
+        self._warm_bytes = 0
+        self.compressed = 0
+        self.archived = 0
+        self.restored = 0
+        self._next_id = 1
+        # Start from the clock so ETags from a previous process never match
+        self._revision = int(time.time() * 1000)
+
+    def _archive_path(self, session_id: int) -> str:
+        return os.path.join(self.archive_dir, f"{session_id}.json.z")
+
+    def _drop_messages(self, session_id: int):
+        records = self._hot.pop(session_id, None)
+        if records is not None:
+            self._hot_bytes -= _hot_size(records)
+        blob = self._warm.pop(session_id, None)
+        if blob is not None:
+            self._warm_bytes -= len(blob)
+        if session_id in self._archived:
+            self._archived.discard(session_id)
+            try:
+                os.remove(self._archive_path(session_id))
+            except OSError:
+                pass
+
+    def _store_messages(self, session_id: int, messages: List[Dict]):
+        self._drop_messages(session_id)
+        records = [_Message(m) for m in messages]
+        self._hot[session_id] = records
+        self._hot_bytes += _hot_size(records)
+        self._enforce_budget()
+
+    def _records(self, session_id: int) -> List[_Message]:
+        """Message records of a session from whichever tier holds them, promoted to hot."""
+        records = self._hot.get(session_id)
+        if records is not None:
+            self._hot.move_to_end(session_id)
+            return records
+        if session_id in self._warm:
+            messages = _unpack(self._warm[session_id])
+        elif session_id in self._archived:
+            with open(self._archive_path(session_id), "rb") as f:
+                messages = _unpack(f.read())
+            self.restored += 1
+        else:
+            messages = []
+        self._store_messages(session_id, messages)
+        return self._hot[session_id]
+
+    def _load_messages(self, session_id: int) -> List[Dict]:
+        return [m.to_dict() for m in self._records(session_id)]
+
+    def _peek_contents(self, session_id: int) -> List[str]:
+        """Message contents without promoting the session to hot."""
+        records = self._hot.get(session_id)
+        if records is not None:
+            return [m.content for m in records]
+        if session_id in self._warm:
+            messages = _unpack(self._warm[session_id])
+        elif session_id in self._archived:
+            with open(self._archive_path(session_id), "rb") as f:
+                messages = _unpack(f.read())
+        else:
+            return []
+        return [m.get("content", "") for m in messages]
+
+    def _index_messages(self, session_id: int, contents: List[str], remove: bool = False):
+        update = self._index.remove if remove else self._index.add
+        for content in contents:
+            update(session_id, content)
+
+    def _enforce_budget(self):
+        # The session being read or written always stays hot
+        while len(self._hot) > max(self.hot_sessions, 1):
+            self._compress(next(iter(self._hot)))
+        if self.memory_budget <= 0:
+            return
+        while self._hot_bytes + self._warm_bytes > self.memory_budget:
+            if self._warm and self.archive_dir:
+                self._archive(next(iter(self._warm)))
+            elif len(self._hot) > 1:
+                self._compress(next(iter(self._hot)))
+            else:
+                break
+
+    def _compress(self, session_id: int):
+        records = self._hot.pop(session_id)
+        self._hot_bytes -= _hot_size(records)
+        blob = _pack([m.to_dict() for m in records])
+        self._warm[session_id] = blob
+        self._warm_bytes += len(blob)
+        self.compressed += 1
+
+    def _archive(self, session_id: int):
+        blob = self._warm.pop(session_id)
+        self._warm_bytes -= len(blob)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(self._archive_path(session_id), "wb") as f:
+            f.write(blob)
+        self._archived.add(session_id)
+        self.archived += 1
+
+    def _session(self, session_id: int) -> Dict:
+        return {**self._sessions[session_id], "messages": self._load_messages(session_id)}
+
+    def add(self, summary: str, messages: List[Dict]) -> Dict:
+        with self._lock:
+            session_id = self._next_id
+            self._next_id += 1
+            self._sessions[session_id] = {
+                "id": session_id,
+                "summary": summary,
+                "timestamp": datetime.now().isoformat(),
+                "message_count": len(messages),
+                "version": 1,
+            }
+            self._content_bytes[session_id] = _content_size(messages)
+            self._store_messages(session_id, messages)
+            self._index.add(session_id, summary, SUMMARY_WEIGHT)
+            self._index_messages(session_id, [m.get("content", "") for m in messages])
+            self._revision += 1
+            return {**self._sessions[session_id], "messages": messages}
+
+    def get(self, session_id: int) -> Optional[Dict]:
+        with self._lock:
+            if session_id not in self._sessions:
+                return None
+            session = self._session(session_id)
+            del session["message_count"]
+            return session
+
+    def update(self, session_id: int, summary: Optional[str] = None,
+               messages: Optional[List[Dict]] = None) -> Optional[int]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if summary is not None:
+                self._index.remove(session_id, session["summary"], SUMMARY_WEIGHT)
+                self._index.add(session_id, summary, SUMMARY_WEIGHT)
+                session["summary"] = summary
+            if messages is not None:
+                session["message_count"] = len(messages)
+                session["version"] += 1
+                self._content_bytes[session_id] = _content_size(messages)
+                self._index_messages(session_id, self._peek_contents(session_id), remove=True)
+                self._index_messages(session_id, [m.get("content", "") for m in messages])
+                self._store_messages(session_id, messages)
+            session["timestamp"] = datetime.now().isoformat()
+            self._revision += 1
+            return session["version"]
+
+    def append(self, session_id: int, messages: List[Dict], start: Optional[int] = None,
+               base_version: Optional[int] = None) -> Optional[Dict]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if base_version is not None and base_version != session["version"]:
+                raise VersionConflictError(session["version"])
+            count = session["message_count"]
+            start = count if start is None else start
+            if not 0 <= start <= count:
+                raise ValueError(f"start must be between 0 and {count}")
+            records = self._records(session_id)
+            removed = records[start:]
+            kept_bytes = self._content_bytes[session_id] - sum(
+                len(m.content.encode("utf-8")) for m in removed
+            )
+            self._content_bytes[session_id] = check_messages(
+                messages, base_count=start, base_bytes=kept_bytes
+            )
+            added = [_Message(m) for m in messages]
+            self._index_messages(session_id, [m.content for m in removed], remove=True)
+            self._index_messages(session_id, [m.content for m in added])
+            del records[start:]
+            records.extend(added)
+            self._hot_bytes += _hot_size(added) - _hot_size(removed)
+            session["message_count"] = len(records)
+            session["version"] += 1
+            session["timestamp"] = datetime.now().isoformat()
+            self._revision += 1
+            self._enforce_budget()
+            return {"version": session["version"], "message_count": len(records)}
+
+    def delete(self, session_id: int) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._content_bytes.pop(session_id, None)
+            self._index.remove(session_id, session["summary"], SUMMARY_WEIGHT)
+            self._index_messages(session_id, self._peek_contents(session_id), remove=True)
+            self._drop_messages(session_id)
+            self._revision += 1
+            return True
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [self.get(session_id) for session_id in list(self._sessions)]
+
+    def list_summaries(self, limit: int, before_id: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            # Dicts keep insertion order, so ids are ascending; walk backwards
+            page = []
+            for session_id in reversed(self._sessions):
+                if before_id is not None and session_id >= before_id:
+                    continue
+                page.append(dict(self._sessions[session_id]))
+                if len(page) >= limit:
+                    break
+            return page
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[Dict]:
+        terms = query_terms(query)
+        with self._lock:
+            hits = self._index.search(terms, len(self._sessions), limit, offset)
+            results = []
+            for session_id, score in hits:
+                excerpt = next(filter(None, (
+                    snippet(content, terms) for content in self._peek_contents(session_id)
+                )), None)
+                results.append({**self._sessions[session_id], "score": score, "snippet": excerpt})
+            return results
+
+    def count(self) -> int:
+        return len(self._sessions)
+
+    def revision(self) -> int:
+        return self._revision
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "hot": len(self._hot),
+                "compressed": len(self._warm),
+                "archived": len(self._archived),
+                "hot_bytes": self._hot_bytes,
+                "compressed_bytes": self._warm_bytes,
+                "memory_budget": self.memory_budget,
+                "compressions": self.compressed,
+                "archivals": self.archived,
+                "restores": self.restored,
+                "index_terms": self._index.terms(),
+            }
+
+
+class SqliteHistoryStore(HistoryStore):
+    """Sessions in a SQLite file, indexed by id (primary key) and timestamp.
+
+    Messages are rows of chat_messages keyed by (session_id, position), so an
+    append writes only the new rows. Databases from before that layout, with
+    a JSON array per session, are migrated on open (needs SQLite 3.35+).
+    The FTS5 table chat_search holds one row per summary and per message,
+    with rowids from _search_rowid() so a session's rows form one range.
+    """
+
+    def __init__(self, path: str = CHAT_HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    summary TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    content_bytes INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 1
+                );
+                CREATE INDEX IF NOT EXISTS idx_chat_sessions_timestamp
+                    ON chat_sessions (timestamp);
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    session_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (session_id, position)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS chat_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO chat_meta (key, value) VALUES ('revision', 0);
+            """)
+            self._migrate()
+            self._conn.commit()
+
+    def _migrate(self):
+        """Bring databases created by earlier versions to the current schema."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(chat_sessions)")}
+        if "message_count" not in columns:
+            self._conn.execute(
+                "ALTER TABLE chat_sessions ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"
+            )
+            self._conn.execute("UPDATE chat_sessions SET message_count = json_array_length(messages)")
+        for column, default in (("content_bytes", 0), ("version", 1)):
+            if column not in columns:
+                self._conn.execute(
+                    f"ALTER TABLE chat_sessions ADD COLUMN {column} INTEGER NOT NULL DEFAULT {default}"
+                )
+        if "messages" in columns:
+            # One JSON array per session -> one row per message
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_messages (session_id, position, message) "
+                "SELECT s.id, m.key, m.value FROM chat_sessions s, json_each(s.messages) m"
+            )
+            self._conn.execute(
+                f"UPDATE chat_sessions SET content_bytes = ({_CONTENT_BYTES_SQL} "
+                "WHERE session_id = chat_sessions.id)"
+            )
+            self._conn.execute("ALTER TABLE chat_sessions DROP COLUMN messages")
+        if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chat_search'").fetchone():
+            self._conn.execute("CREATE VIRTUAL TABLE chat_search USING fts5(summary, content)")
+            self._conn.execute(
+                "INSERT INTO chat_search (rowid, summary, content) "
+                "SELECT id << 32, summary, '' FROM chat_sessions"
+            )
+            self._conn.execute(
+                "INSERT INTO chat_search (rowid, summary, content) "
+                "SELECT (session_id << 32) + position + 1, '', "
+                "COALESCE(json_extract(message, '$.content'), '') FROM chat_messages"
+            )
+
+    def _bump_revision(self):
+        self._conn.execute("UPDATE chat_meta SET value = value + 1 WHERE key = 'revision'")
+
+    def _insert_messages(self, session_id: int, start: int, messages: List[Dict]):
+        self._conn.executemany(
+            "INSERT INTO chat_messages (session_id, position, message) VALUES (?, ?, ?)",
+            [(session_id, start + i, json.dumps(m)) for i, m in enumerate(messages)],
+        )
+        self._conn.executemany(
+            "INSERT INTO chat_search (rowid, summary, content) VALUES (?, '', ?)",
+            [(_search_rowid(session_id, start + i), m.get("content", "")) for i, m in enumerate(messages)],
+        )
+
+    def _delete_messages(self, session_id: int, start: int = 0):
+        self._conn.execute(
+            "DELETE FROM chat_messages WHERE session_id = ? AND position >= ?", (session_id, start)
+        )
+        self._conn.execute(
+            "DELETE FROM chat_search WHERE rowid BETWEEN ? AND ?",
+            (_search_rowid(session_id, start), _search_rowid(session_id + 1) - 1),
+        )
+
+    def _messages(self, session_id: int) -> List[Dict]:
+        rows = self._conn.execute(
+            "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY position",
+            (session_id,),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def add(self, summary: str, messages: List[Dict]) -> Dict:
+        timestamp = datetime.now().isoformat()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO chat_sessions (summary, timestamp, message_count, content_bytes, version) "
+                "VALUES (?, ?, ?, ?, 1)",
+                (summary, timestamp, len(messages), _content_size(messages)),
+            )
+            self._conn.execute(
+                "INSERT INTO chat_search (rowid, summary, content) VALUES (?, ?, '')",
+                (_search_rowid(cursor.lastrowid), summary),
+            )
+            self._insert_messages(cursor.lastrowid, 0, messages)
+            self._bump_revision()
+        return {"id": cursor.lastrowid, "summary": summary, "timestamp": timestamp,
+                "version": 1, "messages": messages}
+
+    def get(self, session_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, summary, timestamp, version FROM chat_sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            return {**dict(row), "messages": self._messages(session_id)}
+
+    def update(self, session_id: int, summary: Optional[str] = None,
+               messages: Optional[List[Dict]] = None) -> Optional[int]:
+        timestamp = datetime.now().isoformat()
+        with self._lock, self._conn:
+            if messages is None:
+                row = self._conn.execute(
+                    "UPDATE chat_sessions SET summary = COALESCE(?, summary), timestamp = ? "
+                    "WHERE id = ? RETURNING version",
+                    (summary, timestamp, session_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "UPDATE chat_sessions SET summary = COALESCE(?, summary), message_count = ?, "
+                    "content_bytes = ?, version = version + 1, timestamp = ? "
+                    "WHERE id = ? RETURNING version",
+                    (summary, len(messages), _content_size(messages), timestamp, session_id),
+                ).fetchone()
+                if row is not None:
+                    self._delete_messages(session_id)
+                    self._insert_messages(session_id, 0, messages)
+            if row is None:
+                return None
+            if summary is not None:
+                self._conn.execute(
+                    "UPDATE chat_search SET summary = ? WHERE rowid = ?",
+                    (summary, _search_rowid(session_id)),
+                )
+            self._bump_revision()
+        return row[0]
+
+    def append(self, session_id: int, messages: List[Dict], start: Optional[int] = None,
+               base_version: Optional[int] = None) -> Optional[Dict]:
+        timestamp = datetime.now().isoformat()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT message_count, content_bytes, version FROM chat_sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            if base_version is not None and base_version != row["version"]:
+                raise VersionConflictError(row["version"])
+            count = row["message_count"]
+            start = count if start is None else start
+            if not 0 <= start <= count:
+                raise ValueError(f"start must be between 0 and {count}")
+            removed_bytes = 0
+            if start < count:
+                removed_bytes = self._conn.execute(
+                    f"{_CONTENT_BYTES_SQL} WHERE session_id = ? AND position >= ?",
+                    (session_id, start),
+                ).fetchone()[0]
+            total = check_messages(messages, base_count=start,
+                                   base_bytes=row["content_bytes"] - removed_bytes)
+            if start < count:
+                self._delete_messages(session_id, start)
+            self._insert_messages(session_id, start, messages)
+            version = row["version"] + 1
+            self._conn.execute(
+                "UPDATE chat_sessions SET message_count = ?, content_bytes = ?, version = ?, "
+                "timestamp = ? WHERE id = ?",
+                (start + len(messages), total, version, timestamp, session_id),
+            )
+            self._bump_revision()
+        return {"version": version, "message_count": start + len(messages)}
+
+    def delete(self, session_id: int) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+            if cursor.rowcount > 0:
+                self._delete_messages(session_id, -1)
+                self._bump_revision()
+        return cursor.rowcount > 0
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            sessions = self._conn.execute(
+                "SELECT id, summary, timestamp, version FROM chat_sessions ORDER BY id"
+            ).fetchall()
+            rows = self._conn.execute(
+                "SELECT session_id, message FROM chat_messages ORDER BY session_id, position"
+            ).fetchall()
+        messages: Dict[int, List[Dict]] = {}
+        for row in rows:
+            messages.setdefault(row[0], []).append(json.loads(row[1]))
+        return [{**dict(row), "messages": messages.get(row["id"], [])} for row in sessions]
+
+    def list_summaries(self, limit: int, before_id: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, summary, timestamp, message_count, version FROM chat_sessions "
+                "WHERE id < ? ORDER BY id DESC LIMIT ?",
+                (before_id if before_id is not None else 2 ** 63 - 1, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[Dict]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+            threshold = common_threshold(sessions)
+            rare = rare_terms(terms, lambda term: self._term_sessions(term, threshold), threshold)
+            if rare:
+                hits = self._ranked(rare, [t for t in terms if t not in rare], limit, offset)
+            else:
+                hits = self._newest(terms, limit, offset)
+            results = []
+            for session_id, score in hits:
+                row = self._conn.execute(
+                    "SELECT id, summary, timestamp, message_count, version FROM chat_sessions WHERE id = ?",
+                    (session_id,),
+                ).fetchone()
+                contents = self._conn.execute(
+                    "SELECT content FROM chat_search WHERE rowid BETWEEN ? AND ?",
+                    (_search_rowid(session_id, 0), _search_rowid(session_id + 1) - 1),
+                )
+                excerpt = next(filter(None, (snippet(c, terms) for (c,) in contents)), None)
+                results.append({**dict(row), "score": score, "snippet": excerpt})
+        return results
+
+    def _term_sessions(self, term: str, threshold: int) -> int:
+        """Sessions containing `term`, counting no further than threshold + 1."""
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM (SELECT DISTINCT rowid >> 32 FROM chat_search "
+            "WHERE chat_search MATCH ? LIMIT ?)",
+            (fts_query([term]), threshold + 1),
+        ).fetchone()[0]
+
+    def _has_terms(self, session_id: int, terms: List[str]) -> bool:
+        """Whether the session's summary or messages contain every term."""
+        return all(self._conn.execute(
+            "SELECT 1 FROM chat_search WHERE chat_search MATCH ? AND rowid BETWEEN ? AND ?",
+            (fts_query([term]), _search_rowid(session_id), _search_rowid(session_id + 1) - 1),
+        ).fetchone() for term in terms)
+
+    def _ranked(self, terms: List[str], common: List[str], limit: int, offset: int) -> List:
+        """(session id, score) pages ranked by the summed bm25 of matching rows.
+
+        Only `terms` are scored; results must also contain every `common` term,
+        which is checked per ranked session rather than intersected up front.
+        """
+        # Rank on rows matching any term; keep sessions that contain all of them
+        params: List = [" OR ".join(fts_query([t]) for t in terms)]
+        every_term = ""
+        if len(terms) > 1:
+            every_term = "WHERE session_id IN (" + " INTERSECT ".join(
+                ["SELECT rowid >> 32 FROM chat_search WHERE chat_search MATCH ?"] * len(terms)
+            ) + ")"
+            params.extend(fts_query([t]) for t in terms)
+        # MATERIALIZED keeps bm25() inside the FTS query instead of the GROUP BY
+        rows = self._conn.execute(
+            "WITH hits AS MATERIALIZED ("
+            f"    SELECT rowid >> 32 AS session_id, bm25(chat_search, {SUMMARY_WEIGHT}, 1) AS row_score"
+            "    FROM chat_search WHERE chat_search MATCH ?"
+            ") "
+            f"SELECT session_id, -SUM(row_score) AS score FROM hits {every_term} "
+            "GROUP BY session_id ORDER BY score DESC, session_id DESC LIMIT ? OFFSET ?",
+            (*params, -1 if common else limit, 0 if common else offset),
+        )
+        if not common:
+            return rows.fetchall()
+        found: List = []
+        for session_id, score in rows.fetchall():
+            if self._has_terms(session_id, common):
+                found.append((session_id, score))
+                if len(found) >= offset + limit:
+                    break
+        return found[offset:]
+
+    def _newest(self, terms: List[str], limit: int, offset: int) -> List:
+        """Newest sessions containing every term, streamed from the end of the index."""
+        rows = self._conn.execute(
+            "SELECT rowid >> 32 FROM chat_search WHERE chat_search MATCH ? ORDER BY rowid DESC",
+            (fts_query(terms[:1]),),
+        )
+        found: List = []
+        last = None
+        for (session_id,) in rows:
+            if session_id == last:
+                continue
+            last = session_id
+            if self._has_terms(session_id, terms[1:]):
+                found.append((session_id, 0.0))
+                if len(found) >= offset + limit:
+                    break
+        return found[offset:]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+    def revision(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM chat_meta WHERE key = 'revision'").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _search_rowid(session_id: int, position: int = -1) -> int:
+    """chat_search rowid: the summary at position -1, then one per message."""
+    return (session_id << 32) + position + 1
+
+
+# UTF-8 bytes of message content, matching _content_size()
+_CONTENT_BYTES_SQL = (
+    "SELECT COALESCE(SUM(length(CAST(json_extract(message, '$.content') AS BLOB))), 0) "
+    "FROM chat_messages"
+)
+
+
+def create_history_store(backend: str = CHAT_HISTORY_BACKEND) -> HistoryStore:
+    """Build the configured history backend."""
+    if backend == "memory":
+        return MemoryHistoryStore()
+    if backend == "sqlite":
+        return SqliteHistoryStore()
+    raise ValueError(f"Unknown CHAT_HISTORY_BACKEND: {backend}")
@@ -4,19 +4,91 @@ Provides text and audio chat via WebSocket connections
 """
 
 import os
+import json
 import asyncio
 import base64
-from datetime import datetime
-from typing import List, Dict
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import binascii
+import itertools
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from fastapi import BackgroundTasks, FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field, ValidationError
 from openai import AsyncOpenAI
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Realtime Chat API")
+from credentials import token_cache, client_factory
+from realtime_pool import RealtimePool
+from endpoint_router import REALTIME_ENDPOINTS, EndpointRouter, parse_endpoints
+from history_store import MessageLimitError, VersionConflictError, check_messages, create_history_store
+from caption_cache import CaptionCache, caption_key
+from response_cache import RESPONSE_CACHE_MAX_TURNS, ResponseCache, extend_prefix, response_key
+from outbound import DELTA_BATCH_AUDIO, DeltaBatcher, OutboundQueue, outbound_totals
+from audio_codec import client_converters, parse_client_formats
+from voice_gate import create_voice_gate, voice_gate_totals
+from session_registry import RealtimeSession, SessionRegistry
+from session_profiles import ProfileRegistry, SessionProfile
+from barge_in import BARGE_IN, ResponseTracker
+from session_recorder import SessionRecorder
+import metrics
+from metrics import SessionTimer
+from cluster import WORKER_ID, AdmissionController, Heartbeat, create_shared_state
+from multiplex import Channel, Multiplexer, mux_stats
+
+# Azure OpenAI config
+ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-realtime")
+CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-5.1")
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:3001,http://localhost:5173").split(",")
+
+# Warm realtime connection pools (0 disables pooling)
+REALTIME_POOL_TEXT_SIZE = int(os.getenv("REALTIME_POOL_TEXT_SIZE", "2"))
+REALTIME_POOL_AUDIO_SIZE = int(os.getenv("REALTIME_POOL_AUDIO_SIZE", "2"))
+REALTIME_POOL_MAX_IDLE = float(os.getenv("REALTIME_POOL_MAX_IDLE", "600"))
+REALTIME_POOL_HEALTH_INTERVAL = float(os.getenv("REALTIME_POOL_HEALTH_INTERVAL", "30"))
+
+# Chat history listing page sizes
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+# Session profiles (instructions, voice, VAD timing); clients pick one with ?profile=
+profiles = ProfileRegistry()
+
+# Audio delta event names (GA and preview API versions)
+AUDIO_DELTA_EVENTS = ("response.output_audio.delta", "response.audio.delta")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm shared credentials and connection pools on startup and release them on shutdown."""
+    await token_cache.start()
+    await router.start()
+    await text_pool.start()
+    await audio_pool.start()
+    await heartbeat.start()
+    await sessions.start()
+    recorder.start()
+    yield
+    for task in list(background):
+        task.cancel()
+    await sessions.stop()
+    await heartbeat.stop()
+    await text_pool.stop()
+    await audio_pool.stop()
+    await router.stop()
+    await client_factory.close()
+    await token_cache.stop()
+    # Finishes writing queued audio; the writer thread does the disk I/O
+    await asyncio.to_thread(recorder.stop)
+    history_store.close()
+    caption_cache.close()
+    shared_state.close()
+
+
+app = FastAPI(title="Realtime Chat API", lifespan=lifespan)
 
 # Enable CORS for React app
 app.add_middleware(
@@ -27,106 +99,486 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Azure OpenAI config
-ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-realtime")
-CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-5.1")
-CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:3001,http://localhost:5173").split(",")
+# Chat history storage (SQLite by default, see history_store.py)
+history_store = create_history_store()
 
-# In-memory chat history storage
-chat_history: List[Dict] = []
-
-def get_openai_client():
-    """Create OpenAI client with Azure credentials."""
-    credential = DefaultAzureCredential()
-    token_provider = get_bearer_token_provider(credential, "https://cognitiveservices.azure.com/.default")
-    base_url = ENDPOINT.replace("https://", "wss://").rstrip("/") + "/openai/v1"
-    return AsyncOpenAI(websocket_base_url=base_url, api_key=token_provider())
-
-
-def get_chat_client():
-    """Create OpenAI client for chat completions."""
-    credential = DefaultAzureCredential()
-    token_provider = get_bearer_token_provider(credential, "https://cognitiveservices.azure.com/.default")
-    base_url = ENDPOINT.rstrip("/") + "/openai/deployments/" + CHAT_DEPLOYMENT
-    return AsyncOpenAI(
-        base_url=base_url,
-        api_key=token_provider(),
-        default_query={"api-version": "2024-08-01-preview"}
-    )
+# Captions keyed by the hash of their input context
+caption_cache = CaptionCache()
 
-@app.websocket("/ws/text")
-async def text_chat(websocket: WebSocket):
-    """WebSocket endpoint for text chat."""
-    await websocket.accept()
-    is_open = True
+# Replayable text responses for repeated opening prompts (RESPONSE_CACHE_ENABLED)
+response_cache = ResponseCache()
+
+# Per-worker session cap and load published for the other workers
+admission = AdmissionController()
+shared_state = create_shared_state()
+heartbeat = Heartbeat(shared_state, admission)
+
+# Background work started outside a request (caption generation for saves
+# made over a multiplexed socket); kept referenced until it finishes
+background: Set[asyncio.Task] = set()
+
+# Outbound queues of open history channels, told when this worker changes history
+history_subscribers: Set[OutboundQueue] = set()
+
+def get_openai_client(endpoint: str = ENDPOINT) -> AsyncOpenAI:
+    """Get the shared OpenAI client for the Realtime API on `endpoint`."""
+    return client_factory.get_realtime_client(endpoint)
+
+
+def get_chat_client() -> AsyncOpenAI:
+    """Get the shared OpenAI client for chat completions."""
+    return client_factory.get_chat_client(ENDPOINT, CHAT_DEPLOYMENT)
+
+
+# Picks the upstream endpoint for every new realtime connection (REALTIME_ENDPOINTS)
+router = EndpointRouter(parse_endpoints(REALTIME_ENDPOINTS, ENDPOINT, DEPLOYMENT), get_openai_client)
+
+text_pool = RealtimePool(
+    "text", router, profiles.default,
+    size=REALTIME_POOL_TEXT_SIZE,
+    max_idle=REALTIME_POOL_MAX_IDLE,
+    health_interval=REALTIME_POOL_HEALTH_INTERVAL,
+)
+audio_pool = RealtimePool(
+    "audio", router, profiles.default,
+    size=REALTIME_POOL_AUDIO_SIZE,
+    max_idle=REALTIME_POOL_MAX_IDLE,
+    health_interval=REALTIME_POOL_HEALTH_INTERVAL,
+)
+
+# Upstream sessions kept across client reconnects and mode switches
+sessions = SessionRegistry()
+
+# Voice session audio and transcripts, written to disk by a background thread (SESSION_RECORDING)
+recorder = SessionRecorder()
+
+
+async def attach_session(session_id: Optional[str], mode: str,
+                         profile: SessionProfile) -> Tuple[RealtimeSession, bool]:
+    """Resume the session named by the client if it is still alive, else open a new one."""
+    if session_id:
+        session = await sessions.resume(session_id, mode, profile)
+        if session is not None:
+            return session, True
+    return await sessions.open(audio_pool if mode == "audio" else text_pool, mode, profile), False
+
+
+async def run_session_tasks(*coros):
+    """Run a session's tasks together; when one exits (e.g. the client left), cancel the rest."""
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def reject_at_capacity(websocket: WebSocket) -> bool:
+    """Close the socket with 1013 (try again later) when this worker is full."""
+    if admission.try_acquire():
+        return False
+    try:
+        await websocket.send_json({"type": "error", "message": "Server at capacity, try again later"})
+        await websocket.close(code=1013)
+    except Exception:
+        pass
+    return True
+
+
+# A session's receive() returns a parsed JSON frame (dict) or a binary frame
+# (bytes), raises InvalidFrame for a text frame that is not a JSON object and
+# WebSocketDisconnect when the client is gone
+Receive = Callable[[], Awaitable[Union[Dict, bytes]]]
+
+
+class InvalidFrame(ValueError):
+    """A malformed client frame; answered with an error frame, the session carries on."""
+
+
+def websocket_receiver(websocket: WebSocket) -> Receive:
+    """receive() for a dedicated WebSocket."""
+    async def receive():
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            return message["bytes"]
+        try:
+            data = json.loads(message["text"])
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise InvalidFrame("Invalid frame")
+        return data
+    return receive
+
+
+def audio_client_options(params) -> Dict:
+    """Transport, audio formats, session profile and voice gate requested by an audio client.
+
+    Raises ValueError for unsupported formats and unknown profiles.
+    """
+    profile = profiles.get(params.get("profile"))
+    # voice_gate=true/false overrides VOICE_GATE for this connection
+    gate_param = params.get("voice_gate")
+    return {
+        "profile": profile,
+        "binary": params.get("transport") == "binary",
+        "formats": parse_client_formats(params),
+        "converters": client_converters(params),
+        "gate": create_voice_gate(profile.audio, None if gate_param is None else str(gate_param) == "true"),
+    }
+
+
+async def text_session(params, receive: Receive, outbound: OutboundQueue):
+    """Run one text conversation over a dedicated WebSocket or a mux channel."""
+    profile = profiles.get(params.get("profile"))
+    # Streamed deltas are merged into fewer frames (DELTA_FLUSH_MS window)
+    batcher = DeltaBatcher(outbound)
+    timer = SessionTimer("text", profile.name)
+    session = None
     
-    async def safe_send(data):
-        """Safely send data only if WebSocket is open."""
-        nonlocal is_open
-        if is_open:
+    try:
+        # A pooled connection already configured for text mode, or the
+        # client's previous session switched to text
+        session, resumed = await attach_session(params.get("session_id"), "text", profile)
+        session.kick = outbound.close
+        connection = session.connection
+        timer.connected()
+        batcher.send({"type": "connected", "session_id": session.id, "resumed": resumed})
+        
+        # Conversation so far, for response cache keys. A resumed conversation
+        # has history this handler never saw, so it is never served from cache.
+        conversation = {
+            "cacheable": response_cache.enabled and not resumed and RESPONSE_CACHE_MAX_TURNS > 0,
+            "turns": 0,
+            "prefix": "",
+            "pending": None,
+            "deltas": [],
+        }
+        
+        def finish_turn(prompt: str, reply: str):
+            conversation["prefix"] = extend_prefix(extend_prefix(conversation["prefix"], "user", prompt),
+                                                   "assistant", reply)
+            conversation["turns"] += 1
+            if conversation["turns"] >= RESPONSE_CACHE_MAX_TURNS:
+                conversation["cacheable"] = False
+        
+        async def replay_cached(prompt: str, deltas: List[str]):
+            timer.request_started(cached=True)
+            async for delta in response_cache.replay(deltas):
+                timer.delta()
+                batcher.add_text("text_delta", delta)
+            timer.response_done()
+            batcher.send({"type": "response_done", "cached": True})
+            # Give upstream the exchange so later turns keep their context
+            reply = "".join(deltas)
+            await connection.conversation.item.create(
+                item={"type": "message", "role": "user",
+                      "content": [{"type": "input_text", "text": prompt}]}
+            )
+            await connection.conversation.item.create(
+                item={"type": "message", "role": "assistant",
+                      "content": [{"type": "output_text", "text": reply}]}
+            )
+            finish_turn(prompt, reply)
+        
+        # Handle incoming messages
+        async def handle_client_messages():
             try:
-                await websocket.send_json(data)
-            except Exception:
-                is_open = False
+                while outbound.is_open:
+                    try:
+                        data = await receive()
+                    except InvalidFrame as e:
+                        batcher.send({"type": "error", "message": str(e)})
+                        continue
+                    if isinstance(data, dict) and data.get("type") == "message":
+                        if not isinstance(data.get("text"), str):
+                            batcher.send({"type": "error", "message": "message frames need a text string"})
+                            continue
+                        key = None
+                        if conversation["pending"] is not None:
+                            # Overlapping turns; the prefix can no longer be tracked
+                            conversation["cacheable"] = False
+                            conversation["pending"] = None
+                        if conversation["cacheable"]:
+                            # Endpoints can serve different deployments; key on this session's
+                            key = response_key(data["text"], profile.text["instructions"],
+                                               session.deployment, conversation["prefix"])
+                            deltas = response_cache.get(key)
+                            if deltas is not None:
+                                await replay_cached(data["text"], deltas)
+                                continue
+                        await connection.conversation.item.create(
+                            item={"type": "message", "role": "user", 
+                                  "content": [{"type": "input_text", "text": data["text"]}]}
+                        )
+                        if conversation["cacheable"]:
+                            conversation["pending"] = (data["text"], key)
+                            conversation["deltas"] = []
+                        timer.request_started()
+                        await connection.response.create()
+            except WebSocketDisconnect:
+                pass
+            except Exception as e:
+                # Client frames are checked above, so this is the upstream connection failing
+                session.mark_broken()
+                print(f"Error in handle_client_messages: {e}")
+        
+        # Handle AI responses
+        async def handle_ai_responses():
+            try:
+                async for event in connection:
+                    if not outbound.is_open:
+                        break
+                    if event.type == "response.output_text.delta":
+                        timer.delta()
+                        batcher.add_text("text_delta", event.delta)
+                        if conversation["pending"] is not None:
+                            conversation["deltas"].append(event.delta)
+                    elif event.type == "response.done":
+                        timer.response_done()
+                        batcher.send({"type": "response_done"})
+                        pending = conversation["pending"]
+                        if pending is not None:
+                            conversation["pending"] = None
+                            prompt, key = pending
+                            if getattr(event.response, "status", None) == "completed":
+                                if key is not None:
+                                    response_cache.put(key, conversation["deltas"])
+                                finish_turn(prompt, "".join(conversation["deltas"]))
+                            else:
+                                # Cancelled or failed; the context is no longer known
+                                conversation["cacheable"] = False
+                else:
+                    # Upstream closed the connection
+                    session.mark_broken()
+            except Exception as e:
+                session.mark_broken()
+                print(f"Error in handle_ai_responses: {e}")
+        
+        await run_session_tasks(handle_client_messages(), handle_ai_responses(), outbound.run())
+    finally:
+        if session is not None:
+            await sessions.detach(session)
+        timer.close()
+        batcher.close()
+
+
+async def audio_session(options: Dict, params, receive: Receive, outbound: OutboundQueue):
+    """Run one voice conversation over a dedicated WebSocket or a mux channel."""
+    binary = options["binary"]
+    formats = options["formats"]
+    decoder = options["converters"]["input"]
+    encoder = options["converters"]["output"]
+    gate = options["gate"]
+    # Opus packets must reach the client one per frame, never concatenated
+    batcher = DeltaBatcher(outbound, batch_audio=DELTA_BATCH_AUDIO and formats["output"][0] != "opus")
+    timer = SessionTimer("audio", options["profile"].name)
+    # The response being spoken, so the user can interrupt it
+    tracker = ResponseTracker()
+    session = None
+    recording = None
     
     try:
-        client = get_openai_client()
+        # A pooled connection already configured for audio mode, or the
+        # client's previous session switched to audio
+        session, resumed = await attach_session(params.get("session_id"), "audio", options["profile"])
+        session.kick = outbound.close
+        connection = session.connection
+        timer.connected()
+        batcher.send({
+            "type": "connected",
+            "session_id": session.id,
+            "resumed": resumed,
+            "transport": "binary" if binary else "json",
+            "input_format": {"format": formats["input"][0], "rate": formats["input"][1]},
+            "output_format": {"format": formats["output"][0], "rate": formats["output"][1]},
+            "voice_gate": gate is not None,
+        })
+        recording = recorder.open(session.id, {
+            "profile": options["profile"].name,
+            "resumed": resumed,
+            "client_input_format": formats["input"][0],
+            "client_output_format": formats["output"][0],
+        })
         
-        async with client.realtime.connect(model=DEPLOYMENT) as connection:
-            # Configure for text mode
-            await connection.session.update(session={
-                "type": "realtime",
-                "instructions": "You are a helpful assistant. Be concise.",
-                "output_modalities": ["text"]
+        async def append_audio(audio: bytes):
+            """Transcode and gate client audio, then send it upstream."""
+            try:
+                frames = decoder.convert(audio) if decoder is not None else [audio]
+            except Exception as e:
+                raise InvalidFrame(f"Could not decode audio: {e}")
+            for frame in frames:
+                if recording is not None:
+                    recording.audio_in(frame)
+                if gate is not None:
+                    frame = gate.process(frame)
+                    if not frame:
+                        continue
+                await connection.input_audio_buffer.append(audio=base64.b64encode(frame).decode("ascii"))
+        
+        async def client_frame(data: Union[Dict, bytes]):
+            if isinstance(data, bytes):
+                # Raw audio frame; upstream still expects base64 PCM16
+                timer.add_audio_in(len(data))
+                if decoder is not None or gate is not None:
+                    await append_audio(data)
+                    return
+                if recording is not None:
+                    recording.audio_in(data)
+                audio = base64.b64encode(data).decode("ascii")
+                await connection.input_audio_buffer.append(audio=audio)
+                return
+            if data.get("type") == "audio":
+                if not isinstance(data.get("audio"), str):
+                    raise InvalidFrame("audio frames need a base64 audio string")
+                timer.add_audio_in(len(data["audio"]) * 3 // 4)
+                if decoder is not None or gate is not None:
+                    try:
+                        pcm = base64.b64decode(data["audio"])
+                    except binascii.Error:
+                        raise InvalidFrame("audio is not valid base64")
+                    await append_audio(pcm)
+                    return
+                if recording is not None:
+                    recording.audio_in(data["audio"])
+                await connection.input_audio_buffer.append(audio=data["audio"])
+        
+        # Handle incoming audio
+        async def handle_client_audio():
+            try:
+                while outbound.is_open:
+                    try:
+                        await client_frame(await receive())
+                    except InvalidFrame as e:
+                        # A bad frame from the client leaves the upstream connection usable
+                        batcher.send({"type": "error", "message": str(e)})
+            except WebSocketDisconnect:
+                pass
+            except Exception:
+                session.mark_broken()
+                raise
+        
+        async def interrupt():
+            """The user started talking over the assistant: stop it and drop stale audio."""
+            cut = tracker.interrupt()
+            dropped = batcher.discard_audio() + outbound.discard_audio()
+            timer.interrupted()
+            timer.add_dropped_audio(dropped)
+            if cut["cancel"]:
+                await connection.response.cancel()
+            if cut["item_id"] is not None:
+                # Keep only what the user heard in the conversation context
+                await connection.conversation.item.truncate(
+                    item_id=cut["item_id"], content_index=0, audio_end_ms=cut["played_ms"]
+                )
+            batcher.send({
+                "type": "interrupted",
+                "response_id": cut["response_id"],
+                "played_ms": cut["played_ms"],
+                "dropped_bytes": dropped,
             })
-            
-            await safe_send({"type": "connected"})
-            
-            # Handle incoming messages
-            async def handle_client_messages():
-                nonlocal is_open
-                try:
-                    while is_open:
-                        data = await websocket.receive_json()
-                        if data["type"] == "message":
-                            await connection.conversation.item.create(
-                                item={"type": "message", "role": "user", 
-                                      "content": [{"type": "input_text", "text": data["text"]}]}
-                            )
-                            await connection.response.create()
-                except WebSocketDisconnect:
-                    is_open = False
-                except Exception as e:
-                    is_open = False
-                    print(f"Error in handle_client_messages: {e}")
-            
-            # Handle AI responses
-            async def handle_ai_responses():
-                try:
-                    async for event in connection:
-                        if not is_open:
-                            break
-                        if event.type == "response.output_text.delta":
-                            await safe_send({"type": "text_delta", "delta": event.delta})
-                        elif event.type == "response.done":
-                            await safe_send({"type": "response_done"})
-                except WebSocketDisconnect:
-                    pass
-                except Exception as e:
-                    print(f"Error in handle_ai_responses: {e}")
-            
-            await asyncio.gather(handle_client_messages(), handle_ai_responses())
-            
+            if recording is not None:
+                recording.event("interrupted", response_id=cut["response_id"], played_ms=cut["played_ms"])
+        
+        # Handle AI responses
+        async def handle_ai_audio():
+            try:
+                async for event in connection:
+                    if not outbound.is_open:
+                        break
+                    if event.type in AUDIO_DELTA_EVENTS:
+                        if not tracker.audio(event.response_id, event.item_id, len(event.delta) * 3 // 4):
+                            # Still arriving for a response we cancelled
+                            timer.add_dropped_audio(len(event.delta) * 3 // 4)
+                            continue
+                        timer.delta()
+                        if recording is not None:
+                            recording.audio_out(event.delta)
+                        if encoder is None:
+                            timer.add_audio_out(len(event.delta) * 3 // 4)
+                            batcher.add_audio_b64(event.delta, binary)
+                            continue
+                        for frame in encoder.convert(base64.b64decode(event.delta)):
+                            timer.add_audio_out(len(frame))
+                            batcher.add_audio(frame, binary)
+                    elif event.type == "conversation.item.input_audio_transcription.completed":
+                        batcher.send({"type": "user_transcript", "text": event.transcript})
+                        if recording is not None:
+                            recording.event("user_transcript", item_id=event.item_id, text=event.transcript)
+                    elif event.type == "response.output_audio_transcript.delta":
+                        if not tracker.is_cancelled(event.response_id):
+                            batcher.add_text("assistant_transcript_delta", event.delta)
+                    elif event.type == "response.output_audio_transcript.done":
+                        # The full text even when interrupted; the interrupted event says how much was heard
+                        if recording is not None:
+                            recording.event("assistant_transcript", response_id=event.response_id,
+                                            item_id=event.item_id, text=event.transcript)
+                    elif event.type == "response.created":
+                        tracker.response_created(event.response.id)
+                    elif event.type == "input_audio_buffer.speech_started":
+                        if BARGE_IN and tracker.is_speaking():
+                            await interrupt()
+                        batcher.send({"type": "speech_started"})
+                        if recording is not None:
+                            recording.event("speech_started")
+                    elif event.type == "input_audio_buffer.speech_stopped":
+                        timer.request_started()
+                        if recording is not None:
+                            recording.event("speech_stopped")
+                    elif event.type == "response.done":
+                        timer.response_done()
+                        if recording is not None:
+                            recording.event("response_done", response_id=event.response.id,
+                                            status=event.response.status)
+                        dropped = tracker.response_done(event.response.id)
+                        if dropped is None:
+                            batcher.send({"type": "response_done"})
+                        else:
+                            batcher.send({"type": "response_done", "interrupted": True, "dropped_bytes": dropped})
+                else:
+                    # Upstream closed the connection
+                    session.mark_broken()
+            except Exception:
+                session.mark_broken()
+                raise
+        
+        await run_session_tasks(handle_client_audio(), handle_ai_audio(), outbound.run())
+    finally:
+        if session is not None:
+            await sessions.detach(session)
+        if gate is not None:
+            timer.voice_gate = gate.stats()
+        if recording is not None:
+            timer.recording = recording.stats()
+            recording.close()
+        timer.close()
+        batcher.close()
+
+
+@app.websocket("/ws/text")
+async def text_chat(websocket: WebSocket):
+    """WebSocket endpoint for text chat."""
+    await websocket.accept()
+    if await reject_at_capacity(websocket):
+        return
+    # Frames are queued and written by a separate task so a slow browser
+    # never stalls the upstream event loop
+    outbound = OutboundQueue(websocket)
+    
+    try:
+        await text_session(websocket.query_params, websocket_receiver(websocket), outbound)
     except Exception as e:
         print(f"Error in text_chat: {e}")
-        if is_open:
-            try:
-                await websocket.send_json({"type": "error", "message": str(e)})
-            except:
-                pass
+        try:
+            await websocket.send_json({"type": "error", "message": str(e)})
+        except:
+            pass
     finally:
-        is_open = False
+        admission.release()
+        outbound.close()
         try:
             await websocket.close()
         except:
@@ -135,85 +587,169 @@ async def text_chat(websocket: WebSocket):
 
 @app.websocket("/ws/audio")
 async def audio_chat(websocket: WebSocket):
-    """WebSocket endpoint for audio chat."""
+    """WebSocket endpoint for audio chat.
+
+    Connect with `?transport=binary` to exchange raw audio in binary frames
+    instead of base64 audio inside JSON; control events stay JSON either way.
+    `input_format`/`input_rate` and `output_format`/`output_rate` select a
+    cheaper client format (pcm16 at 8/16 kHz, g711_ulaw, opus); the server
+    transcodes to and from the session's 24 kHz PCM16.
+    """
     await websocket.accept()
-    client = get_openai_client()
-    is_open = True
+    if await reject_at_capacity(websocket):
+        return
+    try:
+        options = audio_client_options(websocket.query_params)
+    except ValueError as e:
+        admission.release()
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=1003)
+        return
+    outbound = OutboundQueue(websocket)
     
-    async def safe_send(data):
-        """Safely send data only if WebSocket is open."""
-        nonlocal is_open
-        if is_open:
+    try:
+        await audio_session(options, websocket.query_params, websocket_receiver(websocket), outbound)
+    except Exception as e:
+        print(f"Error in audio_chat: {e}")
+    finally:
+        admission.release()
+        outbound.close()
+        try:
+            await websocket.close()
+        except:
+            pass
+
+
+def spawn(func, *args):
+    """Run `func(*args)` in the background (same call shape as BackgroundTasks.add_task)."""
+    task = asyncio.create_task(func(*args))
+    background.add(task)
+    task.add_done_callback(background.discard)
+    return task
+
+
+async def mux_text(channel: Channel):
+    """Text conversation on a multiplexed channel."""
+    if not admission.try_acquire():
+        raise RuntimeError("Server at capacity, try again later")
+    try:
+        await text_session(channel.params, channel.receive, channel.outbound)
+    finally:
+        admission.release()
+
+
+async def mux_audio(channel: Channel):
+    """Voice conversation on a multiplexed channel; binary frames carry audio."""
+    options = audio_client_options(channel.params)
+    if not admission.try_acquire():
+        raise RuntimeError("Server at capacity, try again later")
+    try:
+        await audio_session(options, channel.params, channel.receive, channel.outbound)
+    finally:
+        admission.release()
+
+
+async def serve_requests(channel: Channel, handle: Callable[[Dict], Awaitable[Dict]]):
+    """Answer a channel's `{"id": ..., ...}` requests concurrently, echoing the id."""
+    async def answer(request: Dict):
+        try:
+            result = await handle(request)
+        except Exception as e:
+            result = {"type": "error", "message": str(e)}
+        channel.outbound.send({**result, "id": request.get("id")})
+
+    async def read():
+        pending = set()
+        try:
+            while channel.outbound.is_open:
+                request = await channel.receive()
+                if isinstance(request, dict):
+                    task = asyncio.create_task(answer(request))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    await run_session_tasks(read(), channel.outbound.run())
+
+
+async def mux_caption(channel: Channel):
+    """Caption requests: `{"type": "caption", "id": 1, "messages": [...]}`."""
+    async def handle(request: Dict) -> Dict:
+        return {"type": "caption", "caption": await caption_for(request.get("messages", []))}
+    await serve_requests(channel, handle)
+
+
+async def mux_history(channel: Channel):
+    """Chat history requests (list, search, get, save, append, delete) plus change notifications.
+
+    While the channel is open the server pushes `{"type": "changed",
+    "revision": ...}` whenever this worker changes the history, so clients can
+    refresh instead of polling.
+    """
+    async def handle(request: Dict) -> Dict:
+        op = request.get("type")
+        if op == "list":
+            limit = int(request.get("limit") or HISTORY_PAGE_SIZE)
+            return {"type": "history", **await list_history(limit, request.get("cursor"))}
+        if op == "search":
+            limit = int(request.get("limit") or HISTORY_PAGE_SIZE)
+            return {"type": "search", **await search_history(request.get("query", ""), limit,
+                                                             int(request.get("offset") or 0))}
+        if op == "get":
+            chat_session = await asyncio.to_thread(history_store.get, request["session_id"])
+            if chat_session is None:
+                return {"type": "error", "message": "Chat session not found"}
+            return {"type": "session", "session": chat_session}
+        if op == "save":
+            result = await save_chat_session(request, request.get("session_id"), spawn)
+            if "error" in result:
+                return {"type": "error", "message": result["error"]}
+            return {"type": "saved", "session_id": result["id"], "version": result["version"]}
+        if op == "append":
             try:
-                await websocket.send_json(data)
-            except Exception:
-                is_open = False
-    
+                update = MessagesUpdate(**request)
+            except ValidationError as e:
+                return {"type": "error", "message": validation_message(e)}
+            result = await append_chat_messages(request["session_id"], update, spawn)
+            if "conflict" in result:
+                return {"type": "conflict", "session_id": request["session_id"], "version": result["version"]}
+            if "error" in result:
+                return {"type": "error", "message": result["error"]}
+            return {"type": "saved", "session_id": result["id"], "version": result["version"],
+                    "message_count": result["message_count"]}
+        if op == "delete":
+            await delete_chat(request["session_id"])
+            return {"type": "deleted", "session_id": request["session_id"]}
+        return {"type": "error", "message": f"Unknown history request: {op}"}
+
+    history_subscribers.add(channel.outbound)
     try:
-        async with client.realtime.connect(model=DEPLOYMENT) as connection:
-            # Configure for audio mode
-            await connection.session.update(session={
-                "type": "realtime",
-                "instructions": "You are a helpful assistant. Keep responses brief.",
-                "output_modalities": ["audio"],
-                "audio": {
-                    "input": {
-                        "transcription": {"model": "whisper-1"},
-                        "format": {"type": "audio/pcm", "rate": 24000},
-                        "turn_detection": {
-                            "type": "server_vad",
-                            "threshold": 0.5,
-                            "prefix_padding_ms": 300,
-                            "silence_duration_ms": 500,
-                            "create_response": True
-                        }
-                    },
-                    "output": {
-                        "voice": "alloy",
-                        "format": {"type": "audio/pcm", "rate": 24000}
-                    }
-                }
-            })
-            
-            await safe_send({"type": "connected"})
-            
-            # Handle incoming audio
-            async def handle_client_audio():
-                nonlocal is_open
-                try:
-                    while is_open:
-                        data = await websocket.receive_json()
-                        if data["type"] == "audio":
-                            await connection.input_audio_buffer.append(audio=data["audio"])
-                except WebSocketDisconnect:
-                    is_open = False
-            
-            # Handle AI responses
-            async def handle_ai_audio():
-                nonlocal is_open
-                try:
-                    async for event in connection:
-                        if not is_open:
-                            break
-                        if event.type == "response.audio.delta":
-                            await safe_send({"type": "audio_delta", "delta": event.delta})
-                        elif event.type == "conversation.item.input_audio_transcription.completed":
-                            await safe_send({"type": "user_transcript", "text": event.transcript})
-                        elif event.type == "response.output_audio_transcript.delta":
-                            await safe_send({"type": "assistant_transcript_delta", "delta": event.delta})
-                        elif event.type == "input_audio_buffer.speech_started":
-                            await safe_send({"type": "speech_started"})
-                        elif event.type == "response.done":
-                            await safe_send({"type": "response_done"})
-                except WebSocketDisconnect:
-                    is_open = False
-            
-            await asyncio.gather(handle_client_audio(), handle_ai_audio())
-            
-    except WebSocketDisconnect:
-        pass
+        await serve_requests(channel, handle)
+    finally:
+        history_subscribers.discard(channel.outbound)
+
+
+MUX_HANDLERS = {"text": mux_text, "audio": mux_audio, "caption": mux_caption, "history": mux_history}
+
+
+@app.websocket("/ws")
+async def multiplexed(websocket: WebSocket):
+    """One socket carrying many channels (text, audio, caption, history).
+
+    See multiplex.py for the framing, control frames and flow control.
+    """
+    await websocket.accept()
+    try:
+        await Multiplexer(websocket, MUX_HANDLERS).run()
+    except Exception as e:
+        print(f"Error in multiplexed socket: {e}")
     finally:
-        is_open = False
+        try:
+            await websocket.close()
+        except:
+            pass
 
 
 @app.get("/")
@@ -221,23 +757,199 @@ async def root():
     return {"status": "ok", "message": "Realtime Chat API"}
 
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests."""
+    return {"status": "ok", "worker": WORKER_ID}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """Readiness and load for load balancers.
+
+    Returns 503 while this worker is at its session cap so new WebSockets are
+    routed to a less loaded worker; `cluster` lists every live worker's load.
+    """
+    stats = admission.stats()
+    ready = admission.active < admission.max_sessions
+    if not ready:
+        response.status_code = 503
+    cluster = await asyncio.to_thread(heartbeat.cluster)
+    return {"ready": ready, "worker": WORKER_ID, **stats, "cluster": cluster}
+
+
+@app.get("/auth-stats")
+async def auth_stats():
+    """Token cache and client factory counters."""
+    return {"token_cache": token_cache.stats(), "clients": client_factory.stats()}
+
+
+@app.get("/pool-stats")
+async def pool_stats():
+    """Warm realtime connection pool counters."""
+    return {"text": text_pool.stats(), "audio": audio_pool.stats()}
+
+
+@app.get("/router-stats")
+async def router_stats():
+    """Per-endpoint connect latency, errors and circuit state, plus failover/hedge counters."""
+    return router.stats()
+
+
+@app.get("/session-stats")
+async def session_stats():
+    """Resumable session counters (attached, detached, resumed, mode switches)."""
+    return sessions.stats()
+
+
+@app.get("/recording-stats")
+async def recording_stats():
+    """Session recorder queue, dropped frame and disk counters."""
+    return recorder.stats()
+
+
+@app.get("/session-profiles")
+async def session_profiles():
+    """Selectable session profiles and their instructions, voice and VAD settings."""
+    return profiles.describe()
+
+
+@app.get("/outbound-stats")
+async def outbound_stats():
+    """Outbound WebSocket queue depth, coalesced and dropped frame counters."""
+    return outbound_totals()
+
+
+@app.get("/mux-stats")
+async def multiplex_stats():
+    """Multiplexed socket counters (open sockets, channels, frames dropped without credit)."""
+    return mux_stats
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics: session latency histograms plus cache, pool and queue counters."""
+    extra = {}
+    for name, value in token_cache.stats().items():
+        extra[f"token_cache_{name}"] = value
+    for pool in (text_pool, audio_pool):
+        for name, value in pool.stats().items():
+            extra[f"realtime_pool_{pool.name}_{name}"] = value
+    routing = router.stats()
+    for endpoint, values in routing.pop("endpoints").items():
+        values["state"] = ("closed", "half_open", "open").index(values["state"])
+        for name, value in values.items():
+            if isinstance(value, (int, float)):
+                extra[f"router_{endpoint}_{name}"] = value
+    for name, value in routing.items():
+        extra[f"router_{name}"] = value
+    for name, value in outbound_totals().items():
+        extra[f"outbound_{name}"] = value
+    for name, value in caption_cache.stats().items():
+        extra[f"caption_cache_{name}"] = value
+    for name, value in response_cache.stats().items():
+        extra[f"response_cache_{name}"] = value
+    for name, value in (await asyncio.to_thread(history_store.stats)).items():
+        extra[f"chat_history_{name}"] = value
+    for name, value in admission.stats().items():
+        extra[f"admission_{name}"] = value
+    for name, value in voice_gate_totals.items():
+        extra[f"voice_gate_{name}"] = value
+    for name, value in sessions.stats().items():
+        extra[f"sessions_{name}"] = value
+    for name, value in recorder.stats().items():
+        extra[f"recording_{name}"] = value
+    for name, value in mux_stats.items():
+        extra[f"mux_{name}"] = value
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+
+async def list_history(limit: int, cursor: Optional[int]) -> Dict:
+    """A newest-first page of session summaries and the cursor of the next page."""
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    page = await asyncio.to_thread(history_store.list_summaries, limit, cursor)
+    next_cursor = page[-1]["id"] if len(page) == limit else None
+    return {"history": page, "next_cursor": next_cursor}
+
+
+async def search_history(query: str, limit: int, offset: int) -> Dict:
+    """A page of sessions matching `query`, best first, and the offset of the next page."""
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    results = await asyncio.to_thread(history_store.search, query, limit, offset)
+    next_offset = offset + limit if len(results) == limit else None
+    return {"results": results, "next_offset": next_offset}
+
+
+async def notify_history_changed():
+    """Tell open history channels to refresh their listing."""
+    if not history_subscribers:
+        return
+    revision = await asyncio.to_thread(history_store.revision)
+    for outbound in list(history_subscribers):
+        outbound.send({"type": "changed", "revision": revision})
+
+
 @app.get("/chat-history")
-async def get_chat_history():
-    """Get all chat sessions."""
-    return {"history": chat_history}
+async def get_chat_history(request: Request, response: Response,
+                           limit: int = HISTORY_PAGE_SIZE, cursor: Optional[int] = None):
+    """Get a newest-first page of chat session summaries (no messages).
 
+    Pass the returned `next_cursor` as `cursor` to fetch the next page. The
+    response carries an ETag; unchanged listings answer If-None-Match with 304.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    revision = await asyncio.to_thread(history_store.revision)
+    etag = f'W/"{revision}-{limit}-{cursor or 0}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    page = await list_history(limit, cursor)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return page
 
-@app.post("/generate-caption")
-async def generate_caption(data: Dict):
-    """Generate a short caption for chat messages using GPT."""
-    messages = data.get("messages", [])
-    if not messages:
-        return {"caption": "New Chat"}
-    
-    # Extract user messages for context
-    user_messages = [m for m in messages if m.get("role") == "user"]
-    context = "\n".join([m.get("content", "")[:100] for m in user_messages[:3]])  # First 3 user messages
-    
+
+@app.get("/history-stats")
+async def history_stats():
+    """Chat history store counters (memory tiers and budget for the memory backend)."""
+    return await asyncio.to_thread(history_store.stats)
+
+
+@app.get("/chat-history/search")
+async def search_chat_history(q: str, limit: int = HISTORY_PAGE_SIZE, offset: int = 0):
+    """Search session summaries and messages for every word of `q`.
+
+    Results are ranked summaries with a `score` and a `snippet` of a matching
+    message; pass `next_offset` as `offset` for the next page.
+    """
+    return await search_history(q, limit, offset)
+
+
+@app.get("/chat-history/{session_id}")
+async def get_chat_session(session_id: int):
+    """Get one chat session including its messages."""
+    chat_session = await asyncio.to_thread(history_store.get, session_id)
+    if chat_session is None:
+        return {"error": "Chat session not found"}
+    return chat_session
+
+
+def caption_context(messages: List[Dict]) -> str:
+    """The caption only depends on the first 3 user messages, truncated."""
+    # Stop scanning after the third user message instead of filtering the whole list
+    user_messages = itertools.islice((m for m in messages if m.get("role") == "user"), 3)
+    return "\n".join([m.get("content", "")[:100] for m in user_messages])
+
+
+def fallback_caption(messages: List[Dict]) -> str:
+    """Caption from the first user message, used when GPT is unavailable."""
+    first_user = next((m for m in messages if m.get("role") == "user"), None)
+    first_message = first_user.get("content", "New Chat") if first_user else "New Chat"
+    return first_message[:30] + ("..." if len(first_message) > 30 else "")
+
+
+async def request_caption(context: str) -> Optional[str]:
+    """Ask GPT for a caption; returns None on failure so errors are not cached."""
     try:
         client = get_chat_client()
         response = await client.chat.completions.create(
@@ -249,49 +961,185 @@ async def generate_caption(data: Dict):
             max_completion_tokens=20,
             temperature=0.7
         )
-        caption = response.choices[0].message.content.strip()
-        return {"caption": caption}
+        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error generating caption: {e}")
-        # Fallback to first message
-        first_message = user_messages[0].get("content", "New Chat") if user_messages else "New Chat"
-        return {"caption": first_message[:30] + ("..." if len(first_message) > 30 else "")}
+        return None
+
+
+async def caption_for(messages: List[Dict]) -> str:
+    """Cached, coalesced caption for a list of chat messages."""
+    if not messages:
+        return "New Chat"
+    context = caption_context(messages)
+    caption = await caption_cache.get_or_compute(
+        caption_key(context, CHAT_DEPLOYMENT), lambda: request_caption(context)
+    )
+    return caption or fallback_caption(messages)
+
+
+async def caption_in_background(session_id: int, messages: List[Dict]):
+    """Compute a caption after the save has returned and store it as the summary."""
+    caption = await caption_for(messages)
+    await asyncio.to_thread(history_store.update, session_id, caption)
+    await notify_history_changed()
+
+
+async def caption_stored_session(session_id: int):
+    """caption_in_background for a session whose messages were saved in parts."""
+    chat_session = await asyncio.to_thread(history_store.get, session_id)
+    if chat_session is not None:
+        await caption_in_background(session_id, chat_session["messages"])
+
+
+@app.post("/generate-caption")
+async def generate_caption(data: Dict):
+    """Generate a short caption for chat messages using GPT."""
+    return {"caption": await caption_for(data.get("messages", []))}
+
+
+@app.get("/caption-stats")
+async def caption_stats():
+    """Caption cache hit/miss/coalescing counters."""
+    return caption_cache.stats()
+
+
+async def save_chat_session(session: Dict, session_id: Optional[int],
+                            schedule: Callable[..., None]) -> Dict:
+    """Add a chat session, or update `session_id`, for REST and history channels.
+
+    With `"auto_caption": true` the caption is generated after the save through
+    `schedule(func, *args)` (BackgroundTasks.add_task or spawn). Sessions over
+    the size limits in history_store.py are rejected with an error.
+    """
+    messages = session.get("messages")
+    if messages is not None:
+        try:
+            check_messages(messages)
+        except MessageLimitError as e:
+            return {"error": str(e)}
+    if session_id is None:
+        messages = messages or []
+        summary = session.get("summary")
+        if summary is None:
+            summary = fallback_caption(messages) if session.get("auto_caption") else "New Chat"
+        added = await asyncio.to_thread(history_store.add, summary, messages)
+        session_id, version = added["id"], added["version"]
+    else:
+        version = await asyncio.to_thread(history_store.update, session_id, session.get("summary"), messages)
+        if version is None:
+            return {"error": "Chat session not found"}
+    if session.get("auto_caption") and messages:
+        schedule(caption_in_background, session_id, messages)
+    await notify_history_changed()
+    return {"id": session_id, "version": version}
+
+
+# Captions use the first three user messages, i.e. the first six of a normal exchange
+CAPTION_MESSAGES = 6
+
+
+class MessagesUpdate(BaseModel):
+    """Body of an append: the changed messages and the version they are based on."""
+
+    messages: Optional[List[Dict]] = None
+    start: Optional[int] = Field(None, ge=0)
+    base_version: Optional[int] = None
+    auto_caption: bool = False
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+async def append_chat_messages(session_id: int, update: MessagesUpdate,
+                               schedule: Callable[..., None]) -> Dict:
+    """Save only the messages that changed since `base_version`.
+
+    `messages` replace the stored ones from index `start` on (appended when
+    `start` is omitted). A stale `base_version` returns `conflict` with the
+    current version and nothing is written; the client then saves the whole
+    session. `auto_caption` recaptions only while the caption's messages change.
+    Errors carry the HTTP `status` for the REST endpoint.
+    """
+    messages = update.messages or []
+    try:
+        result = await asyncio.to_thread(
+            history_store.append, session_id, messages, update.start, update.base_version
+        )
+    except VersionConflictError as e:
+        return {"error": str(e), "status": 409, "conflict": True, "version": e.version}
+    except ValueError as e:
+        return {"error": str(e), "status": 400}
+    if result is None:
+        return {"error": "Chat session not found", "status": 404}
+    if update.auto_caption and result["message_count"] - len(messages) < CAPTION_MESSAGES:
+        schedule(caption_stored_session, session_id)
+    await notify_history_changed()
+    return {"id": session_id, **result}
+
+
+async def delete_chat(session_id: int):
+    await asyncio.to_thread(history_store.delete, session_id)
+    await notify_history_changed()
+
+
+@app.get("/response-cache-stats")
+async def response_cache_stats():
+    """Text response cache size, hit rate and eviction counters."""
+    return response_cache.stats()
 
 
 @app.post("/chat-history")
-async def add_chat_session(session: Dict):
-    """Add a new chat session to history."""
-    chat_session = {
-        "id": len(chat_history) + 1,
-        "summary": session.get("summary", "New Chat"),
-        "timestamp": datetime.now().isoformat(),
-        "messages": session.get("messages", [])
-    }
-    chat_history.append(chat_session)
-    return {"id": chat_session["id"], "message": "Chat session added"}
+async def add_chat_session(session: Dict, background_tasks: BackgroundTasks):
+    """Add a new chat session to history.
+
+    With `"auto_caption": true` the session is saved immediately with a
+    placeholder summary and the caption is generated in the background.
+    """
+    result = await save_chat_session(session, None, background_tasks.add_task)
+    if "error" in result:
+        return result
+    return {"id": result["id"], "version": result["version"], "message": "Chat session added"}
 
 
 @app.put("/chat-history/{session_id}")
-async def update_chat_session(session_id: int, session: Dict):
-    """Update an existing chat session."""
-    global chat_history
-    for chat in chat_history:
-        if chat["id"] == session_id:
-            chat["summary"] = session.get("summary", chat["summary"])
-            chat["messages"] = session.get("messages", chat["messages"])
-            chat["timestamp"] = datetime.now().isoformat()
-            return {"id": session_id, "message": "Chat session updated"}
-    return {"error": "Chat session not found"}
+async def update_chat_session(session_id: int, session: Dict, background_tasks: BackgroundTasks):
+    """Update an existing chat session (`auto_caption` works as for POST)."""
+    result = await save_chat_session(session, session_id, background_tasks.add_task)
+    if "error" in result:
+        return result
+    return {"id": session_id, "version": result["version"], "message": "Chat session updated"}
+
+
+@app.post("/chat-history/{session_id}/messages")
+async def append_chat_session(session_id: int, update: MessagesUpdate, response: Response,
+                              background_tasks: BackgroundTasks):
+    """Append messages, or replace them from `start` on, if `base_version` is current.
+
+    Returns the new `version`; a stale `base_version` is a 409 whose error
+    carries `"conflict": true` and the current `version`.
+    """
+    result = await append_chat_messages(session_id, update, background_tasks.add_task)
+    if "error" in result:
+        response.status_code = result.pop("status")
+    return result
 
 
 @app.delete("/chat-history/{session_id}")
 async def delete_chat_session(session_id: int):
     """Delete a chat session."""
-    global chat_history
-    chat_history = [s for s in chat_history if s["id"] != session_id]
+    await delete_chat(session_id)
     return {"message": "Chat session deleted"}
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        if os.getenv("CHAT_HISTORY_BACKEND", "sqlite") == "memory":
+            print("Warning: CHAT_HISTORY_BACKEND=memory is not shared between workers")
+        # Workers need an import string so each process builds its own app
+        uvicorn.run("main:app", host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,237 @@
+"""
+Minimal Prometheus-style metrics for the API server.
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format by `render()`. SessionTimer wraps the per-session hot-path
+measurements (connect, time-to-first-delta, inter-delta gaps, response
+duration, audio bytes) and can log a JSON timing summary per session.
+"""
+
+import os
+import json
+import time
+import bisect
+from typing import Dict, List, Optional, Sequence, Tuple
+
+SESSION_TIMING_LOG = os.getenv("SESSION_TIMING_LOG", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GAP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple, List[int]] = {}
+        self._sums: Dict[Tuple, float] = {}
+
+    def observe(self, *labels, value: float):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def count(self, *labels) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {self._sums[labels]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+def render(extra: Optional[Dict[str, float]] = None) -> str:
+    """Prometheus text format for every registered metric plus ad-hoc gauges."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for name, value in (extra or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+sessions_total = Counter("realtime_sessions_total", "WebSocket sessions started", ["endpoint", "profile"])
+active_sessions = Gauge("realtime_active_sessions", "WebSocket sessions currently open", ["endpoint"])
+connect_seconds = Histogram(
+    "realtime_connect_seconds", "Time to obtain a configured realtime connection", ["endpoint"]
+)
+session_update_seconds = Histogram(
+    "realtime_session_update_seconds", "Time to send session.update when opening a connection", ["pool"]
+)
+first_delta_seconds = Histogram(
+    "realtime_time_to_first_delta_seconds", "Request (response.create / end of speech) to first delta",
+    ["endpoint", "profile", "cached"]
+)
+inter_delta_seconds = Histogram(
+    "realtime_inter_delta_seconds", "Gap between consecutive deltas of a response", ["endpoint"], GAP_BUCKETS
+)
+response_seconds = Histogram(
+    "realtime_response_duration_seconds", "Request to response.done", ["endpoint", "profile", "cached"],
+    DURATION_BUCKETS
+)
+audio_bytes = Counter("realtime_audio_bytes_total", "PCM audio bytes relayed", ["endpoint", "direction"])
+barge_ins = Counter("realtime_barge_ins_total", "Assistant responses interrupted by the user", ["endpoint"])
+barge_in_dropped_bytes = Counter(
+    "realtime_barge_in_dropped_audio_bytes_total", "Audio bytes discarded after an interruption", ["endpoint"]
+)
+
+
+class SessionTimer:
+    """Records hot-path timings for one WebSocket session."""
+
+    def __init__(self, endpoint: str, profile: str = "default"):
+        self.endpoint = endpoint
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.connect = None
+        self.responses = 0
+        self.first_deltas: List[float] = []
+        self.audio_in = 0
+        self.audio_out = 0
+        self.voice_gate: Optional[Dict] = None
+        self.recording: Optional[Dict] = None
+        self.interruptions = 0
+        self.dropped_audio = 0
+        self._request_at: Optional[float] = None
+        self._last_delta: Optional[float] = None
+        self._cached = "false"
+        sessions_total.inc(endpoint, profile)
+        active_sessions.inc(endpoint)
+
+    def connected(self):
+        self.connect = time.perf_counter() - self.started
+        connect_seconds.observe(self.endpoint, value=self.connect)
+
+    def request_started(self, cached: bool = False):
+        """A response was requested (text) or the user stopped speaking (audio).
+
+        `cached` marks a response replayed from the response cache.
+        """
+        self._request_at = time.perf_counter()
+        self._last_delta = None
+        self._cached = "true" if cached else "false"
+
+    def delta(self):
+        now = time.perf_counter()
+        if self._last_delta is None:
+            if self._request_at is not None:
+                first = now - self._request_at
+                self.first_deltas.append(first)
+                first_delta_seconds.observe(self.endpoint, self.profile, self._cached, value=first)
+        elif self._cached == "false":
+            # Replayed deltas are paced by RESPONSE_CACHE_REPLAY_RATE, not the model
+            inter_delta_seconds.observe(self.endpoint, value=now - self._last_delta)
+        self._last_delta = now
+
+    def response_done(self):
+        self.responses += 1
+        if self._request_at is not None:
+            response_seconds.observe(self.endpoint, self.profile, self._cached,
+                                     value=time.perf_counter() - self._request_at)
+        self._request_at = None
+        self._last_delta = None
+
+    def interrupted(self):
+        self.interruptions += 1
+        barge_ins.inc(self.endpoint)
+
+    def add_dropped_audio(self, size: int):
+        self.dropped_audio += size
+        barge_in_dropped_bytes.inc(self.endpoint, amount=size)
+
+    def add_audio_in(self, size: int):
+        self.audio_in += size
+        audio_bytes.inc(self.endpoint, "in", amount=size)
+
+    def add_audio_out(self, size: int):
+        self.audio_out += size
+        audio_bytes.inc(self.endpoint, "out", amount=size)
+
+    def close(self):
+        active_sessions.dec(self.endpoint)
+        if SESSION_TIMING_LOG:
+            print(json.dumps({
+                "event": "session_timing",
+                "endpoint": self.endpoint,
+                "profile": self.profile,
+                "duration": round(time.perf_counter() - self.started, 4),
+                "connect": round(self.connect, 4) if self.connect is not None else None,
+                "responses": self.responses,
+                "first_delta": [round(t, 4) for t in self.first_deltas],
+                "audio_in": self.audio_in,
+                "audio_out": self.audio_out,
+                "voice_gate": self.voice_gate,
+                "recording": self.recording,
+                "interruptions": self.interruptions,
+                "dropped_audio": self.dropped_audio,
+            }))
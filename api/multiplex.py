@@ -0,0 +1,228 @@
+"""
+Multiplexed WebSocket transport: many logical channels over one socket.
+A client opens channels by id and kind (text, audio, caption, history) and
+every frame carries its channel id: JSON frames have a "channel" field and
+binary frames start with a 2-byte big-endian channel id. Each channel gets
+its own OutboundQueue, so a slow audio stream cannot hold up text on the
+same socket, and credit-based flow control bounds what the client may send:
+a channel starts with `credit` frames and the server grants more as its
+handler consumes them.
+
+Control frames (client -> server):
+    {"type": "open", "channel": 1, "kind": "text", "params": {...}}
+    {"type": "close", "channel": 1}
+Control frames (server -> client):
+    {"type": "opened", "channel": 1, "kind": "text", "credit": 64}
+    {"type": "credit", "channel": 1, "credit": 32}
+    {"type": "error", "channel": 1, "message": "..."}
+    {"type": "closed", "channel": 1}
+"""
+
+import os
+import json
+import struct
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from outbound import OutboundQueue
+
+MUX_MAX_CHANNELS = int(os.getenv("MUX_MAX_CHANNELS", "16"))
+MUX_CHANNEL_CREDIT = int(os.getenv("MUX_CHANNEL_CREDIT", "64"))
+
+_HEADER = struct.Struct(">H")
+_CLOSED = object()
+
+# Totals across every multiplexed socket in this process
+mux_stats: Dict[str, int] = {
+    "open_sockets": 0,
+    "sockets": 0,
+    "channels": 0,
+    "frames_in": 0,
+    "dropped_no_credit": 0,
+}
+
+
+class ChannelSocket:
+    """What a channel's OutboundQueue writes to: tags frames with the channel id."""
+
+    def __init__(self, mux: "Multiplexer", channel_id: int):
+        self.mux = mux
+        self.channel_id = channel_id
+
+    async def send_json(self, data: Dict):
+        await self.mux.write_json({**data, "channel": self.channel_id})
+
+    async def send_bytes(self, data: bytes):
+        await self.mux.write_bytes(_HEADER.pack(self.channel_id) + data)
+
+
+class Channel:
+    """One logical conversation or request stream on a multiplexed socket.
+
+    Handlers read with `receive()` (a dict for JSON frames, bytes for binary
+    frames; WebSocketDisconnect once the channel or socket closes) and write
+    through `outbound`, whose writer task `outbound.run()` they must run.
+    """
+
+    def __init__(self, mux: "Multiplexer", channel_id: int, kind: str, params: Dict, credit: int):
+        self.mux = mux
+        self.id = channel_id
+        self.kind = kind
+        self.params = params
+        self.credit = credit
+        self.outbound = OutboundQueue(ChannelSocket(mux, channel_id))
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._window = credit
+        self._consumed = 0
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def deliver(self, item: Union[Dict, bytes]):
+        """Queue a client frame if the client still has credit."""
+        if self._window <= 0:
+            self.dropped += 1
+            mux_stats["dropped_no_credit"] += 1
+            return
+        self._window -= 1
+        self._inbox.put_nowait(item)
+
+    def end(self):
+        self._inbox.put_nowait(_CLOSED)
+
+    async def receive(self) -> Union[Dict, bytes]:
+        item = await self._inbox.get()
+        if item is _CLOSED:
+            # Let any other reader of this channel see the close too
+            self._inbox.put_nowait(_CLOSED)
+            raise WebSocketDisconnect(1000)
+        self._consumed += 1
+        # Grant credit back in batches rather than per frame
+        if self._consumed >= max(1, self.credit // 2):
+            self._window += self._consumed
+            self.mux.control({"type": "credit", "channel": self.id, "credit": self._consumed})
+            self._consumed = 0
+        return item
+
+
+ChannelHandler = Callable[[Channel], Awaitable[None]]
+
+
+class Multiplexer:
+    """Reads a multiplexed socket and runs one handler task per open channel."""
+
+    def __init__(self, websocket: WebSocket, handlers: Dict[str, ChannelHandler],
+                 max_channels: int = MUX_MAX_CHANNELS, credit: int = MUX_CHANNEL_CREDIT):
+        self.websocket = websocket
+        self.handlers = handlers
+        self.max_channels = max_channels
+        self.credit = credit
+        self.channels: Dict[int, Channel] = {}
+        # Control frames share the socket through their own queue
+        self._control = OutboundQueue(self)
+        self._write_lock = asyncio.Lock()
+
+    async def write_json(self, data: Dict):
+        async with self._write_lock:
+            await self.websocket.send_json(data)
+
+    async def write_bytes(self, data: bytes):
+        async with self._write_lock:
+            await self.websocket.send_bytes(data)
+
+    # The control queue writes straight to the socket
+    send_json = write_json
+    send_bytes = write_bytes
+
+    def control(self, data: Dict):
+        self._control.send(data)
+
+    def _open(self, channel_id, kind: str, params: Dict):
+        if not isinstance(channel_id, int) or not 0 < channel_id <= 0xFFFF:
+            self.control({"type": "error", "channel": channel_id, "message": "Invalid channel id"})
+            return
+        if channel_id in self.channels:
+            self.control({"type": "error", "channel": channel_id, "message": "Channel already open"})
+            return
+        handler = self.handlers.get(kind)
+        if handler is None:
+            self.control({"type": "error", "channel": channel_id, "message": f"Unknown channel kind: {kind}"})
+            return
+        if len(self.channels) >= self.max_channels:
+            self.control({"type": "error", "channel": channel_id, "message": "Too many channels"})
+            return
+        channel = Channel(self, channel_id, kind, params or {}, self.credit)
+        self.channels[channel_id] = channel
+        mux_stats["channels"] += 1
+        self.control({"type": "opened", "channel": channel_id, "kind": kind, "credit": self.credit})
+        channel.task = asyncio.create_task(self._run_channel(channel, handler))
+
+    async def _run_channel(self, channel: Channel, handler: ChannelHandler):
+        try:
+            await handler(channel)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print(f"Error in {channel.kind} channel {channel.id}: {e}")
+            self.control({"type": "error", "channel": channel.id, "message": str(e)})
+        finally:
+            channel.outbound.close()
+            if self.channels.get(channel.id) is channel:
+                del self.channels[channel.id]
+            self.control({"type": "closed", "channel": channel.id})
+
+    async def _read(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            mux_stats["frames_in"] += 1
+            if message.get("bytes") is not None:
+                data = message["bytes"]
+                if len(data) < _HEADER.size:
+                    continue
+                channel = self.channels.get(_HEADER.unpack_from(data)[0])
+                if channel is not None:
+                    channel.deliver(data[_HEADER.size:])
+                continue
+            try:
+                data = json.loads(message["text"])
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                self.control({"type": "error", "message": "Invalid frame"})
+                continue
+            kind = data.get("type")
+            channel_id = data.pop("channel", None)
+            if kind == "open":
+                self._open(channel_id, data.get("kind"), data.get("params"))
+            elif kind == "close":
+                channel = self.channels.get(channel_id)
+                if channel is not None:
+                    channel.end()
+            else:
+                channel = self.channels.get(channel_id)
+                if channel is not None:
+                    channel.deliver(data)
+
+    async def run(self):
+        """Serve the socket until the client disconnects, then end every channel."""
+        mux_stats["sockets"] += 1
+        mux_stats["open_sockets"] += 1
+        writer = asyncio.create_task(self._control.run())
+        try:
+            await self._read()
+        finally:
+            channels = list(self.channels.values())
+            for channel in channels:
+                channel.end()
+            tasks = [c.task for c in channels if c.task is not None]
+            if tasks:
+                await asyncio.wait(tasks, timeout=5)
+            for task in tasks:
+                task.cancel()
+            self._control.close()
+            writer.cancel()
+            await asyncio.gather(writer, *tasks, return_exceptions=True)
+            mux_stats["open_sockets"] -= 1
@@ -0,0 +1,323 @@
+"""
+Bounded, backpressure-aware outbound queue for a browser WebSocket, plus a
+delta batcher that merges streamed deltas into fewer, larger frames.
+Handlers enqueue frames without awaiting the socket; a dedicated writer task
+drains the queue. When a slow client lets the queue fill up, the configured
+policy decides what happens instead of stalling the upstream realtime stream:
+
+- coalesce:   merge queued text/transcript deltas and drop the oldest audio
+- drop_audio: only drop the oldest audio frames
+- disconnect: close the client socket
+
+Text and control frames are never dropped, so when neither merging nor
+dropping audio makes room the client is disconnected under every policy;
+the queue never grows past its size.
+"""
+
+import os
+import base64
+import asyncio
+import weakref
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from fastapi import WebSocket
+
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "256"))
+OUTBOUND_POLICY = os.getenv("OUTBOUND_POLICY", "coalesce")
+OUTBOUND_POLICIES = ("coalesce", "drop_audio", "disconnect")
+
+# Delta batching window (0 ms sends every delta as its own frame)
+DELTA_FLUSH_MS = float(os.getenv("DELTA_FLUSH_MS", "15"))
+DELTA_FLUSH_BYTES = int(os.getenv("DELTA_FLUSH_BYTES", "512"))
+DELTA_BATCH_AUDIO = os.getenv("DELTA_BATCH_AUDIO", "false").lower() == "true"
+DELTA_FLUSH_AUDIO_BYTES = int(os.getenv("DELTA_FLUSH_AUDIO_BYTES", "9600"))
+
+# Deltas that can be merged into an earlier queued frame of the same type
+COALESCABLE = ("text_delta", "assistant_transcript_delta")
+JSON_AUDIO = "audio_delta"
+
+# Totals across every queue in this process
+outbound_stats: Dict[str, int] = {
+    "sent": 0,
+    "coalesced": 0,
+    "dropped_audio": 0,
+    "overflow_disconnects": 0,
+    "max_depth": 0,
+}
+_active_queues: "weakref.WeakSet[OutboundQueue]" = weakref.WeakSet()
+
+
+def _is_audio(frame: List) -> bool:
+    kind, payload = frame
+    return kind == "bytes" or payload.get("type") == JSON_AUDIO
+
+
+class OutboundQueue:
+    """Per-connection send queue with a single writer task."""
+
+    def __init__(self, websocket: WebSocket, max_size: int = OUTBOUND_QUEUE_SIZE,
+                 policy: str = OUTBOUND_POLICY):
+        if policy not in OUTBOUND_POLICIES:
+            raise ValueError(f"Unknown OUTBOUND_POLICY: {policy}")
+        self.websocket = websocket
+        self.max_size = max_size
+        self.policy = policy
+        self.is_open = True
+        self._frames: Deque[List] = deque()
+        self._ready = asyncio.Event()
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped_audio = 0
+        self.max_depth = 0
+        _active_queues.add(self)
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    def send(self, data: Dict):
+        """Queue a JSON frame."""
+        self._enqueue(["json", data])
+
+    def send_bytes(self, data: bytes):
+        """Queue a binary frame."""
+        self._enqueue(["bytes", data])
+
+    def _coalesce(self, frame: List) -> bool:
+        """Merge a delta into the last queued delta of the same type.
+
+        Audio frames in between are skipped (text and audio play independently);
+        any other frame, e.g. response_done, ends the search.
+        """
+        kind, payload = frame
+        if kind != "json" or payload.get("type") not in COALESCABLE:
+            return False
+        for queued in reversed(self._frames):
+            if _is_audio(queued):
+                continue
+            queued_payload = queued[1]
+            if queued_payload.get("type") == payload["type"]:
+                queued_payload["delta"] += payload["delta"]
+                self.coalesced += 1
+                outbound_stats["coalesced"] += 1
+                return True
+            return False
+        return False
+
+    def _drop_oldest_audio(self) -> bool:
+        for i, queued in enumerate(self._frames):
+            if _is_audio(queued):
+                del self._frames[i]
+                self.dropped_audio += 1
+                outbound_stats["dropped_audio"] += 1
+                return True
+        return False
+
+    def _overflow(self):
+        outbound_stats["overflow_disconnects"] += 1
+        self.close()
+
+    def _enqueue(self, frame: List):
+        if not self.is_open:
+            return
+        if len(self._frames) >= self.max_size:
+            if self.policy == "disconnect":
+                self._overflow()
+                return
+            if self.policy == "coalesce" and self._coalesce(frame):
+                return
+            if not self._drop_oldest_audio():
+                if _is_audio(frame):
+                    # Nothing older to drop; the new audio frame is the stale one
+                    self.dropped_audio += 1
+                    outbound_stats["dropped_audio"] += 1
+                else:
+                    # Control and text frames are never dropped; a queue full of them means
+                    # the client is not keeping up at all
+                    self._overflow()
+                return
+        self._frames.append(frame)
+        depth = len(self._frames)
+        if depth > self.max_depth:
+            self.max_depth = depth
+            if depth > outbound_stats["max_depth"]:
+                outbound_stats["max_depth"] = depth
+        self._ready.set()
+
+    async def run(self):
+        """Writer task: drain the queue into the socket until it closes."""
+        try:
+            while self.is_open:
+                if not self._frames:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                kind, payload = self._frames.popleft()
+                if kind == "bytes":
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_json(payload)
+                self.sent += 1
+                outbound_stats["sent"] += 1
+        except Exception:
+            pass
+        finally:
+            self.close()
+
+    def discard_audio(self) -> int:
+        """Drop every queued audio frame (barge-in); returns the audio bytes dropped."""
+        dropped = 0
+        kept: Deque[List] = deque()
+        for frame in self._frames:
+            if not _is_audio(frame):
+                kept.append(frame)
+                continue
+            kind, payload = frame
+            dropped += len(payload) if kind == "bytes" else len(payload["delta"]) * 3 // 4
+        self._frames = kept
+        return dropped
+
+    def close(self):
+        """Stop accepting frames and wake the writer so it exits."""
+        self.is_open = False
+        self._frames.clear()
+        self._ready.set()
+
+    def stats(self) -> Dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped_audio": self.dropped_audio,
+        }
+
+
+def outbound_totals() -> Dict:
+    """Process-wide totals plus current depth across open queues."""
+    queues = [q for q in _active_queues if q.is_open]
+    return {
+        **outbound_stats,
+        "open_queues": len(queues),
+        "queued": sum(q.depth for q in queues),
+    }
+
+
+class DeltaBatcher:
+    """Accumulates streamed deltas and flushes them as one frame.
+
+    Text/transcript deltas and audio are batched in separate slots since the
+    client plays them independently. A slot is flushed when its window
+    (`flush_ms`) elapses or it reaches its byte threshold; every other frame
+    flushes all slots first so ordering relative to e.g. response_done holds.
+    """
+
+    def __init__(self, outbound: OutboundQueue, flush_ms: float = DELTA_FLUSH_MS,
+                 flush_bytes: int = DELTA_FLUSH_BYTES, batch_audio: bool = DELTA_BATCH_AUDIO,
+                 flush_audio_bytes: int = DELTA_FLUSH_AUDIO_BYTES):
+        self.outbound = outbound
+        self.flush_ms = flush_ms
+        self.flush_bytes = flush_bytes
+        self.batch_audio = batch_audio
+        self.flush_audio_bytes = flush_audio_bytes
+        self._text_type: Optional[str] = None
+        self._text: List[str] = []
+        self._text_size = 0
+        self._audio: List[bytes] = []
+        self._audio_size = 0
+        self._audio_binary = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.deltas = 0
+        self.frames = 0
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_ms / 1000, self.flush)
+
+    def add_text(self, frame_type: str, delta: str):
+        """Queue a text_delta or assistant_transcript_delta."""
+        self.deltas += 1
+        if self.flush_ms <= 0:
+            self.frames += 1
+            self.outbound.send({"type": frame_type, "delta": delta})
+            return
+        if self._text_type is not None and self._text_type != frame_type:
+            self._flush_text()
+        self._text_type = frame_type
+        self._text.append(delta)
+        self._text_size += len(delta)
+        if self._text_size >= self.flush_bytes:
+            self._flush_text()
+        else:
+            self._schedule()
+
+    def add_audio(self, audio: bytes, binary: bool):
+        """Queue decoded PCM, sent as a binary frame or a base64 audio_delta."""
+        self.deltas += 1
+        if self.flush_ms <= 0 or not self.batch_audio:
+            self._send_audio(audio, binary)
+            return
+        self._audio_binary = binary
+        self._audio.append(audio)
+        self._audio_size += len(audio)
+        if self._audio_size >= self.flush_audio_bytes:
+            self._flush_audio()
+        else:
+            self._schedule()
+
+    def add_audio_b64(self, delta: str, binary: bool):
+        """Queue an upstream base64 audio delta without re-encoding when unbatched."""
+        if binary or (self.batch_audio and self.flush_ms > 0):
+            self.add_audio(base64.b64decode(delta), binary)
+            return
+        self.deltas += 1
+        self.frames += 1
+        self.outbound.send({"type": JSON_AUDIO, "delta": delta})
+
+    def _send_audio(self, audio: bytes, binary: bool):
+        self.frames += 1
+        if binary:
+            self.outbound.send_bytes(audio)
+        else:
+            self.outbound.send({"type": JSON_AUDIO, "delta": base64.b64encode(audio).decode("ascii")})
+
+    def _flush_text(self):
+        if self._text:
+            self.frames += 1
+            self.outbound.send({"type": self._text_type, "delta": "".join(self._text)})
+        self._text_type = None
+        self._text = []
+        self._text_size = 0
+
+    def _flush_audio(self):
+        if self._audio:
+            self._send_audio(b"".join(self._audio), self._audio_binary)
+        self._audio = []
+        self._audio_size = 0
+
+    def discard_audio(self) -> int:
+        """Drop audio waiting in the batch window; returns the bytes dropped."""
+        dropped = self._audio_size
+        self._audio = []
+        self._audio_size = 0
+        return dropped
+
+    def flush(self):
+        """Send everything pending."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._flush_audio()
+        self._flush_text()
+
+    def send(self, data: Dict):
+        """Send a non-delta frame after flushing pending deltas."""
+        self.flush()
+        self.frames += 1
+        self.outbound.send(data)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,206 @@
+"""
+Warm pool of pre-configured Realtime API connections.
+Connections are opened and sent their profile's session.update ahead of time so a
+WebSocket handler can check one out without waiting for the upstream
+handshake. Checked-out connections are never returned: once a client has
+used a session its conversation state belongs to that client. Connections
+are opened through an EndpointRouter, which picks the upstream endpoint.
+"""
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+from collections import deque
+
+from endpoint_router import Endpoint, EndpointRouter
+from metrics import session_update_seconds
+from session_profiles import SessionProfile
+
+
+class _PooledConnection:
+    """An open realtime connection plus its context manager, endpoint and age."""
+
+    def __init__(self, manager, connection, endpoint: Endpoint):
+        self.manager = manager
+        self.connection = connection
+        self.endpoint = endpoint
+        self.created_at = time.monotonic()
+
+
+class RealtimePool:
+    """Keeps `size` configured realtime connections open and ready.
+
+    `name` is the session mode ("text" or "audio") the connections are set up for.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        router: EndpointRouter,
+        profile: SessionProfile,
+        size: int = 2,
+        max_idle: float = 600.0,
+        health_interval: float = 30.0,
+        connect_timeout: float = 10.0,
+    ):
+        self.name = name
+        self.router = router
+        self.profile = profile
+        self.size = size
+        self.max_idle = max_idle
+        self.health_interval = health_interval
+        self.connect_timeout = connect_timeout
+        self._idle: Deque[_PooledConnection] = deque()
+        self._opening = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.opened = 0
+        self.evicted = 0
+        self.failed = 0
+        self.ping_unsupported = False
+
+    async def _open(self) -> _PooledConnection:
+        """Open and configure a new upstream connection on the best endpoint."""
+        manager, connection, endpoint = await self.router.connect()
+        try:
+            started = time.perf_counter()
+            await self.profile.apply(connection, self.name)
+            session_update_seconds.observe(self.name, value=time.perf_counter() - started)
+        except Exception:
+            await connection.close()
+            raise
+        self.opened += 1
+        return _PooledConnection(manager, connection, endpoint)
+
+    async def _close(self, pooled: _PooledConnection):
+        try:
+            await pooled.connection.close()
+        except Exception:
+            pass
+
+    async def is_healthy(self, pooled: _PooledConnection) -> bool:
+        """Ping the underlying websocket; a dead socket fails fast.
+
+        The SDK has no public ping, and a realtime event would leave its reply
+        queued for the next client, so this uses the websockets connection the
+        SDK keeps in `_connection`. If a newer SDK drops that attribute, every
+        connection counts as healthy: idle ones are still recycled after
+        `max_idle` and a dead one fails on first use.
+        """
+        ping = getattr(getattr(pooled.connection, "_connection", None), "ping", None)
+        if ping is None:
+            if not self.ping_unsupported:
+                self.ping_unsupported = True
+                print(f"Realtime connections have no websocket ping; {self.name} pool health checks are off")
+            return True
+        try:
+            pong = await ping()
+            await asyncio.wait_for(pong, self.connect_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _fill(self):
+        missing = self.size - len(self._idle) - self._opening
+        if missing <= 0:
+            return
+        self._opening += missing
+        results = await asyncio.gather(*[self._open() for _ in range(missing)], return_exceptions=True)
+        self._opening -= missing
+        for result in results:
+            if isinstance(result, Exception):
+                self.failed += 1
+                print(f"Error opening pooled {self.name} connection: {result}")
+            else:
+                self._idle.append(result)
+
+    async def _evict_and_check(self):
+        now = time.monotonic()
+        keep: Deque[_PooledConnection] = deque()
+        while self._idle:
+            pooled = self._idle.popleft()
+            if now - pooled.created_at > self.max_idle or not await self.is_healthy(pooled):
+                self.evicted += 1
+                await self._close(pooled)
+            else:
+                keep.append(pooled)
+        # Connections checked out while we were pinging are already gone from _idle
+        self._idle.extend(keep)
+
+    async def _maintain(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() - last_check >= self.health_interval:
+                    await self._evict_and_check()
+                    last_check = time.monotonic()
+                await self._fill()
+            except Exception as e:
+                print(f"Error maintaining {self.name} pool: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.health_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._idle:
+            await self._close(self._idle.popleft())
+
+    async def checkout(self) -> _PooledConnection:
+        """Take a ready connection, or open one inline if the pool is empty."""
+        now = time.monotonic()
+        pooled = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if now - candidate.created_at > self.max_idle:
+                self.evicted += 1
+                await self._close(candidate)
+                continue
+            pooled = candidate
+            break
+        self._wakeup.set()
+        if pooled is not None:
+            self.hits += 1
+            return pooled
+        self.misses += 1
+        return await self._open()
+
+    async def release(self, pooled: _PooledConnection):
+        """Close a connection taken with checkout()."""
+        await self._close(pooled)
+
+    @asynccontextmanager
+    async def connection(self):
+        """Check out a configured connection and close it when the handler is done."""
+        pooled = await self.checkout()
+        try:
+            yield pooled.connection
+        finally:
+            await self._close(pooled)
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "opening": self._opening,
+            "hits": self.hits,
+            "misses": self.misses,
+            "opened": self.opened,
+            "evicted": self.evicted,
+            "failed": self.failed,
+        }
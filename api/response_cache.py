@@ -0,0 +1,118 @@
+"""
+Exact-match response cache for /ws/text.
+Many conversations open with the same FAQ-style question. When enabled, a
+completed response is stored under a hash of the normalized prompt, the
+session instructions, the model and a hash of the conversation before the
+prompt, and a later identical prompt is answered by replaying the stored
+deltas instead of calling response.create upstream. Entries live in an
+in-process LRU bounded by total bytes, with a TTL.
+"""
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", "65536"))
+# Only the first N turns of a conversation are looked up and stored
+RESPONSE_CACHE_MAX_TURNS = int(os.getenv("RESPONSE_CACHE_MAX_TURNS", "1"))
+# Replay pace in deltas per second (0 replays everything at once)
+RESPONSE_CACHE_REPLAY_RATE = float(os.getenv("RESPONSE_CACHE_REPLAY_RATE", "200"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Case and whitespace differences don't change the answer to an FAQ."""
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def extend_prefix(prefix: str, role: str, text: str) -> str:
+    """Hash of the conversation so far, extended by one message."""
+    return hashlib.sha256(f"{prefix}\n{role}\n{text}".encode("utf-8")).hexdigest()
+
+
+def response_key(prompt: str, instructions: str, model: str, prefix: str = "") -> str:
+    """Content hash identifying a cacheable response."""
+    parts = (model, instructions, prefix, normalize_prompt(prompt))
+    return hashlib.sha256("\n\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of streamed text responses, bounded in bytes."""
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, ttl: float = RESPONSE_CACHE_TTL,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES,
+                 replay_rate: float = RESPONSE_CACHE_REPLAY_RATE):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.replay_rate = replay_rate
+        self._entries: "OrderedDict[str, Tuple[List[str], float, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.too_large = 0
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Cached deltas for `key`, counting a hit or a miss."""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() > entry[1]:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, deltas: List[str]):
+        size = len(key) + sum(len(d.encode("utf-8")) for d in deltas)
+        if size > self.max_entry_bytes:
+            self.too_large += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (list(deltas), time.monotonic() + self.ttl, size)
+        self.bytes += size
+        self.stores += 1
+        while self.bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    async def replay(self, deltas: List[str]) -> AsyncIterator[str]:
+        """Yield cached deltas paced like a streaming response."""
+        interval = 1.0 / self.replay_rate if self.replay_rate > 0 else 0
+        for i, delta in enumerate(deltas):
+            if interval and i:
+                await asyncio.sleep(interval)
+            yield delta
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": int(self.enabled),
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "too_large": self.too_large,
+        }
@@ -0,0 +1,143 @@
+"""
+Full-text search over chat history.
+The SQLite backend uses an FTS5 table. The memory backend keeps
+InvertedIndex, a term -> session postings map updated message by message,
+so saves never rebuild it. Both treat a query as a set of words that must
+all occur in a session (in its summary or any message) and rank sessions by
+BM25, with summary matches weighted SUMMARY_WEIGHT times.
+
+Words found in more than SEARCH_COMMON_FRACTION of sessions (and in more
+than a thousand) add next to nothing to the ranking but are expensive to
+score, so when a query has rarer words only those are scored; the common
+words still have to occur in every result. A query made only of such words
+lists the newest sessions containing all of them, unranked.
+"""
+
+import os
+import re
+import math
+import heapq
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+SEARCH_COMMON_FRACTION = float(os.getenv("SEARCH_COMMON_FRACTION", "0.05"))
+
+SUMMARY_WEIGHT = 2
+
+# Scoring this many matches is cheap, so smaller histories are always exact
+_COMMON_MIN = 1000
+
+# Letters and digits; matches the unicode61 tokenizer closely enough
+_TOKEN = re.compile(r"[^\W_]+")
+
+# BM25 term frequency saturation
+_K1 = 1.2
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.casefold() for t in _TOKEN.findall(text)]
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct words of a search query, in order."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def common_threshold(sessions: int, fraction: float = SEARCH_COMMON_FRACTION) -> int:
+    """How many sessions a word may be in before it counts as common."""
+    return int(max(fraction * sessions, _COMMON_MIN))
+
+
+def rare_terms(terms: List[str], frequency: Callable[[str], int], threshold: int) -> List[str]:
+    """The terms worth ranking on; empty when every term is common.
+
+    `frequency` is the number of sessions a term occurs in.
+    """
+    return [t for t in terms if frequency(t) <= threshold]
+
+
+def fts_query(terms: List[str]) -> str:
+    """FTS5 MATCH expression requiring every term; quoting keeps words literal."""
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def snippet(text: str, terms: List[str], width: int = 80) -> Optional[str]:
+    """About `width` characters of `text` around the first query term, or None."""
+    if not terms:
+        return None
+    pattern = re.compile("|".join(rf"(?<![^\W_]){re.escape(t)}(?![^\W_])" for t in terms), re.IGNORECASE)
+    match = pattern.search(text)
+    if match is None:
+        return None
+    begin = max(0, match.start() - width // 3)
+    end = min(len(text), begin + width)
+    return ("…" if begin else "") + text[begin:end] + ("…" if end < len(text) else "")
+
+
+class InvertedIndex:
+    """Weighted term frequencies per session, maintained incrementally."""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+
+    def add(self, session_id: int, text: str, weight: int = 1):
+        for term, count in Counter(tokenize(text)).items():
+            postings = self._postings.setdefault(term, {})
+            postings[session_id] = postings.get(session_id, 0) + count * weight
+
+    def remove(self, session_id: int, text: str, weight: int = 1):
+        for term, count in Counter(tokenize(text)).items():
+            postings = self._postings.get(term)
+            if postings is None or session_id not in postings:
+                continue
+            left = postings[session_id] - count * weight
+            if left > 0:
+                postings[session_id] = left
+            else:
+                del postings[session_id]
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, terms: List[str], sessions: int, limit: int,
+               offset: int = 0) -> List[Tuple[int, float]]:
+        """(session id, score) of sessions containing every term, best first."""
+        found = {term: self._postings.get(term) for term in terms}
+        if not terms or not all(found.values()):
+            return []
+        rare = rare_terms(terms, lambda term: len(found[term]), common_threshold(sessions))
+        if not rare:
+            return self._newest(sorted(found.values(), key=len), limit, offset)
+        postings = sorted((found[term] for term in rare), key=len)
+        # Common terms are not scored, but a result must still contain them
+        common = [found[term] for term in terms if term not in rare]
+        weights = [
+            math.log(1 + (sessions - len(p) + 0.5) / (len(p) + 0.5)) for p in postings
+        ]
+        scores = []
+        for session_id, tf in postings[0].items():
+            score = weights[0] * tf * (_K1 + 1) / (tf + _K1)
+            for p, idf in zip(postings[1:], weights[1:]):
+                tf = p.get(session_id)
+                if tf is None:
+                    break
+                score += idf * tf * (_K1 + 1) / (tf + _K1)
+            else:
+                if all(session_id in p for p in common):
+                    scores.append((score, session_id))
+        # Ties go to the newer session
+        best = heapq.nlargest(offset + limit, scores)
+        return [(session_id, score) for score, session_id in best[offset:]]
+
+    @staticmethod
+    def _newest(postings: List[Dict[int, int]], limit: int, offset: int) -> List[Tuple[int, float]]:
+        # Postings keep insertion order, so reversed is roughly newest first
+        found = []
+        for session_id in reversed(postings[0]):
+            if all(session_id in p for p in postings[1:]):
+                found.append((session_id, 0.0))
+                if len(found) >= offset + limit:
+                    break
+        return found[offset:]
+
+    def terms(self) -> int:
+        return len(self._postings)
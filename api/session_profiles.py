@@ -0,0 +1,166 @@
+"""
+Named realtime session profiles.
+A profile sets the instructions, voice, transcription model and server VAD
+timing used for the text and audio sessions. Profiles are validated and
+their session configs built once at startup, and clients pick one per
+connection with `?profile=` so VAD timings can be compared without a
+redeploy.
+
+Built-in profiles: default, low-latency (short silence window) and accurate
+(longer windows). SESSION_PROFILES_FILE points to a JSON object of extra or
+overriding profiles, e.g.
+    {"fast-ends": {"extends": "low-latency", "silence_duration_ms": 200}}
+"""
+
+import os
+import json
+from typing import Dict, Optional
+
+SESSION_PROFILES_FILE = os.getenv("SESSION_PROFILES_FILE")
+SESSION_PROFILE = os.getenv("SESSION_PROFILE", "default")
+
+# Setting -> (type, min, max); min/max are None for strings
+PROFILE_FIELDS = {
+    "text_instructions": (str, None, None),
+    "audio_instructions": (str, None, None),
+    "voice": (str, None, None),
+    "transcription_model": (str, None, None),
+    "vad_threshold": (float, 0.0, 1.0),
+    "prefix_padding_ms": (int, 0, 2000),
+    "silence_duration_ms": (int, 100, 5000),
+}
+
+DEFAULT_SETTINGS = {
+    "text_instructions": "You are a helpful assistant. Be concise.",
+    "audio_instructions": "You are a helpful assistant. Keep responses brief.",
+    "voice": "alloy",
+    "transcription_model": "whisper-1",
+    "vad_threshold": 0.5,
+    "prefix_padding_ms": 300,
+    "silence_duration_ms": 500,
+}
+
+BUILTIN_PROFILES = {
+    "default": {},
+    "low-latency": {"prefix_padding_ms": 200, "silence_duration_ms": 250},
+    "accurate": {"vad_threshold": 0.6, "prefix_padding_ms": 400, "silence_duration_ms": 900},
+}
+
+
+class SessionProfile:
+    """Validated settings plus the text/audio session configs built from them."""
+
+    def __init__(self, name: str, settings: Dict):
+        self.name = name
+        self.settings = settings
+        self.text = {
+            "type": "realtime",
+            "instructions": settings["text_instructions"],
+            "output_modalities": ["text"],
+        }
+        self.audio = {
+            "type": "realtime",
+            "instructions": settings["audio_instructions"],
+            "output_modalities": ["audio"],
+            "audio": {
+                "input": {
+                    "transcription": {"model": settings["transcription_model"]},
+                    "format": {"type": "audio/pcm", "rate": 24000},
+                    "turn_detection": {
+                        "type": "server_vad",
+                        "threshold": settings["vad_threshold"],
+                        "prefix_padding_ms": settings["prefix_padding_ms"],
+                        "silence_duration_ms": settings["silence_duration_ms"],
+                        "create_response": True,
+                    },
+                },
+                "output": {
+                    "voice": settings["voice"],
+                    "format": {"type": "audio/pcm", "rate": 24000},
+                },
+            },
+        }
+
+    def config(self, mode: str) -> Dict:
+        return self.audio if mode == "audio" else self.text
+
+    async def apply(self, connection, mode: str):
+        """Send this profile's session.update for `mode` on a realtime connection."""
+        await connection.session.update(session=self.config(mode))
+
+    def describe(self) -> Dict:
+        return {"name": self.name, **self.settings}
+
+
+def _validate(name: str, overrides: Dict, base: Dict) -> Dict:
+    if not isinstance(overrides, dict):
+        raise ValueError(f"Session profile {name!r} must be an object")
+    settings = dict(base)
+    for key, value in overrides.items():
+        if key == "extends":
+            continue
+        if key not in PROFILE_FIELDS:
+            raise ValueError(f"Session profile {name!r}: unknown setting {key!r}")
+        kind, low, high = PROFILE_FIELDS[key]
+        if kind is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise ValueError(f"Session profile {name!r}: {key} must be {kind.__name__}")
+        if low is not None and not low <= value <= high:
+            raise ValueError(f"Session profile {name!r}: {key} must be between {low} and {high}")
+        settings[key] = value
+    return settings
+
+
+def load_profiles(path: Optional[str] = SESSION_PROFILES_FILE) -> Dict[str, SessionProfile]:
+    """Built-in profiles plus those in `path`; raises ValueError on invalid settings."""
+    definitions = dict(BUILTIN_PROFILES)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            custom = json.load(f)
+        if not isinstance(custom, dict):
+            raise ValueError(f"{path} must contain a JSON object of profiles")
+        definitions.update(custom)
+
+    resolved: Dict[str, Dict] = {}
+
+    def resolve(name: str, chain=()) -> Dict:
+        if name in resolved:
+            return resolved[name]
+        if name in chain:
+            raise ValueError(f"Session profile {name!r} extends itself")
+        if name not in definitions:
+            raise ValueError(f"Session profile {chain[-1]!r} extends unknown profile {name!r}")
+        overrides = definitions[name]
+        parent = overrides.get("extends") if isinstance(overrides, dict) else None
+        base = resolve(parent, chain + (name,)) if parent else DEFAULT_SETTINGS
+        resolved[name] = _validate(name, overrides, base)
+        return resolved[name]
+
+    return {name: SessionProfile(name, resolve(name)) for name in definitions}
+
+
+class ProfileRegistry:
+    """The loaded profiles and the one used when a client does not pick one."""
+
+    def __init__(self, profiles: Optional[Dict[str, SessionProfile]] = None,
+                 default: str = SESSION_PROFILE):
+        self.profiles = load_profiles() if profiles is None else profiles
+        if default not in self.profiles:
+            raise ValueError(f"SESSION_PROFILE {default!r} is not a known profile")
+        self.default = self.profiles[default]
+
+    def get(self, name: Optional[str]) -> SessionProfile:
+        """The named profile (the default for None); ValueError if unknown."""
+        if not name:
+            return self.default
+        profile = self.profiles.get(name)
+        if profile is None:
+            raise ValueError(f"Unknown session profile: {name}")
+        return profile
+
+    def describe(self) -> Dict:
+        return {
+            "default": self.default.name,
+            "profiles": [p.describe() for p in self.profiles.values()],
+        }
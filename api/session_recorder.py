@@ -0,0 +1,499 @@
+"""
+Recording of voice sessions to disk, off the event loop.
+Audio handlers only hand frames and events to SessionRecorder, which puts
+them on a queue drained by one background thread. That thread decodes, pads
+and encodes the audio and does all file I/O. The queue is bounded by
+RECORDING_QUEUE_BYTES: while a slow disk keeps it full, new audio frames are
+dropped and counted instead of growing memory or stalling the handlers.
+
+Each session gets its own directory under RECORDING_DIR:
+
+    input-0001.wav, input-0002.wav, ...    client audio (24 kHz PCM16)
+    output-0001.wav, ...                   assistant audio
+    timeline.jsonl                         events with `t`, seconds since start
+
+Segments rotate every RECORDING_SEGMENT_SECONDS of audio. Gaps in a track
+(between responses, or frames dropped under load) are filled with silence
+so both tracks stay aligned with the timeline. RECORDING_FORMAT=opus writes
+Ogg Opus segments instead (needs `opuslib`). Finished sessions older than
+RECORDING_RETENTION_DAYS are deleted, and the oldest ones go first when
+RECORDING_MAX_BYTES is exceeded.
+"""
+
+import os
+import json
+import time
+import queue
+import base64
+import shutil
+import struct
+import threading
+import itertools
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Union
+
+from audio_codec import SESSION_RATE, opuslib
+
+SESSION_RECORDING = os.getenv("SESSION_RECORDING", "false").lower() == "true"
+RECORDING_DIR = os.getenv("RECORDING_DIR", "recordings")
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "wav")
+RECORDING_SEGMENT_SECONDS = float(os.getenv("RECORDING_SEGMENT_SECONDS", "300"))
+RECORDING_RETENTION_DAYS = float(os.getenv("RECORDING_RETENTION_DAYS", "7"))
+# Total size of all recordings; 0 means no limit
+RECORDING_MAX_BYTES = int(os.getenv("RECORDING_MAX_BYTES", "0"))
+RECORDING_QUEUE_BYTES = int(os.getenv("RECORDING_QUEUE_BYTES", "8388608"))
+
+# Gaps shorter than this are not padded; deltas arrive in bursts
+PAD_THRESHOLD_SECONDS = 0.5
+# Events may use this much queue room beyond the audio budget
+EVENT_HEADROOM_BYTES = 65536
+# Seconds between retention sweeps
+SWEEP_INTERVAL = 600.0
+OPUS_FRAME_MS = 20
+# Encoder lookahead at 48 kHz, skipped by players (RFC 7845)
+OPUS_PRE_SKIP = 312
+
+_STOP = object()
+
+
+def _ogg_crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC = _ogg_crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC[(crc >> 24) ^ byte]
+    return crc
+
+
+class _WavSegment:
+    """Mono PCM16 WAV file; the header sizes are patched on close."""
+
+    extension = "wav"
+
+    def __init__(self, path: str, rate: int):
+        self._file = open(path, "wb")
+        self._file.write(self._header(0, rate))
+        self.rate = rate
+        self.data_bytes = 0
+
+    @staticmethod
+    def _header(data_bytes: int, rate: int) -> bytes:
+        return (b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE"
+                + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, rate, rate * 2, 2, 16)
+                + b"data" + struct.pack("<I", data_bytes))
+
+    def write(self, pcm: bytes):
+        self._file.write(pcm)
+        self.data_bytes += len(pcm)
+
+    def close(self) -> int:
+        self._file.seek(0)
+        self._file.write(self._header(self.data_bytes, self.rate))
+        self._file.close()
+        return 44 + self.data_bytes
+
+
+class _OggOpusSegment:
+    """Ogg Opus file of 20 ms packets, about one page per second."""
+
+    extension = "opus"
+    _PACKETS_PER_PAGE = 50
+
+    def __init__(self, path: str, rate: int):
+        self._file = open(path, "wb")
+        self._encoder = opuslib.Encoder(rate, 1, opuslib.APPLICATION_VOIP)
+        self._frame_bytes = rate * OPUS_FRAME_MS // 1000 * 2
+        self._pending = b""
+        self._packets: List[bytes] = []
+        self._serial = int.from_bytes(os.urandom(4), "little")
+        self._sequence = 0
+        self._granule = 0
+        self.bytes = 0
+        head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, OPUS_PRE_SKIP, rate, 0, 0)
+        vendor = b"realtime-api"
+        tags = b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+        self._page([head], 0, 0x02)
+        self._page([tags], 0, 0)
+
+    def _page(self, packets: List[bytes], granule: int, flags: int):
+        lacing = bytearray()
+        for packet in packets:
+            lacing += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+        header = struct.pack("<4sBBqIIIB", b"OggS", 0, flags, granule, self._serial,
+                             self._sequence, 0, len(lacing)) + bytes(lacing)
+        page = bytearray(header + b"".join(packets))
+        page[22:26] = struct.pack("<I", ogg_crc(page))
+        self._file.write(page)
+        self.bytes += len(page)
+        self._sequence += 1
+
+    def _flush(self, flags: int = 0):
+        self._page(self._packets, self._granule, flags)
+        self._packets = []
+
+    def write(self, pcm: bytes):
+        data = self._pending + pcm
+        whole = len(data) - len(data) % self._frame_bytes
+        for i in range(0, whole, self._frame_bytes):
+            packet = self._encoder.encode(data[i:i + self._frame_bytes], self._frame_bytes // 2)
+            # A page holds at most 255 lacing values
+            lacing = sum(len(p) // 255 + 1 for p in self._packets)
+            if len(self._packets) == self._PACKETS_PER_PAGE or lacing + len(packet) // 255 + 1 > 255:
+                self._flush()
+            self._packets.append(packet)
+            # Granule positions count 48 kHz samples whatever the input rate
+            self._granule += 48 * OPUS_FRAME_MS
+        self._pending = data[whole:]
+
+    def close(self) -> int:
+        if self._pending:
+            self.write(bytes(self._frame_bytes - len(self._pending)))
+        self._flush(0x04)
+        self._file.close()
+        return self.bytes
+
+
+class _Track:
+    """One direction of a session's audio, as a series of segment files."""
+
+    def __init__(self, session: "_SessionFiles", name: str):
+        self.session = session
+        self.name = name
+        self.samples = 0
+        self.index = 0
+        self._segment = None
+        self._segment_samples = 0
+
+    def _rotate(self):
+        self.close()
+        self.index += 1
+        segment_class = self.session.recorder.segment_class
+        filename = f"{self.name}-{self.index:04d}.{segment_class.extension}"
+        self._segment = segment_class(os.path.join(self.session.directory, filename), SESSION_RATE)
+        self._segment_samples = 0
+        self.session.recorder.segments += 1
+        self.session.log("segment", self.samples / SESSION_RATE, track=self.name, file=filename)
+
+    def _append(self, pcm: bytes):
+        limit = int(self.session.recorder.segment_seconds * SESSION_RATE)
+        while pcm:
+            if self._segment is None or self._segment_samples >= limit:
+                self._rotate()
+            room = (limit - self._segment_samples) * 2
+            chunk, pcm = pcm[:room], pcm[room:]
+            self._segment.write(chunk)
+            self._segment_samples += len(chunk) // 2
+            self.samples += len(chunk) // 2
+
+    def write(self, pcm: bytes, at: float):
+        """Append PCM16 received `at` seconds into the session, padding a gap with silence."""
+        gap = int(at * SESSION_RATE) - self.samples
+        if gap > PAD_THRESHOLD_SECONDS * SESSION_RATE:
+            # In one-second pieces so a long gap never allocates a huge buffer
+            silence = bytes(SESSION_RATE * 2)
+            while gap > 0:
+                self._append(silence[:min(gap, SESSION_RATE) * 2])
+                gap -= SESSION_RATE
+        self._append(pcm[:len(pcm) - len(pcm) % 2])
+
+    def close(self):
+        if self._segment is not None:
+            self.session.recorder.bytes_written += self._segment.close()
+            self._segment = None
+
+
+class _SessionFiles:
+    """A recorded session's directory, tracks and timeline; used by the writer thread only."""
+
+    def __init__(self, recorder: "SessionRecorder", directory: str, started: float):
+        self.recorder = recorder
+        self.directory = directory
+        self.started = started
+        os.makedirs(directory, exist_ok=True)
+        self._timeline = open(os.path.join(directory, "timeline.jsonl"), "a", encoding="utf-8")
+        self.tracks = {"input": _Track(self, "input"), "output": _Track(self, "output")}
+
+    def log(self, kind: str, t: float, **fields):
+        line = json.dumps({"t": round(t, 3), "type": kind, **fields}, ensure_ascii=False) + "\n"
+        self._timeline.write(line)
+        self.recorder.bytes_written += len(line)
+
+    def flush(self):
+        self._timeline.flush()
+
+    def close(self, t: float, **fields):
+        for track in self.tracks.values():
+            track.close()
+        self.log("session_end", t, input_seconds=round(self.tracks["input"].samples / SESSION_RATE, 3),
+                 output_seconds=round(self.tracks["output"].samples / SESSION_RATE, 3), **fields)
+        self._timeline.close()
+
+    def abandon(self):
+        for track in self.tracks.values():
+            try:
+                track.close()
+            except OSError:
+                pass
+        try:
+            self._timeline.close()
+        except OSError:
+            pass
+
+
+class Recording:
+    """Producer side of one session's recording; every method only enqueues."""
+
+    def __init__(self, recorder: "SessionRecorder", key: int):
+        self.recorder = recorder
+        self.key = key
+        self.frames_dropped = 0
+        self.bytes_dropped = 0
+
+    def audio_in(self, audio: Union[bytes, str]):
+        """Client audio as session PCM16 bytes, or the same base64 encoded."""
+        self.recorder._put_audio(self, "input", audio)
+
+    def audio_out(self, audio_b64: str):
+        """An assistant audio delta, still base64 encoded."""
+        self.recorder._put_audio(self, "output", audio_b64)
+
+    def event(self, kind: str, **fields):
+        self.recorder._put_event(self, kind, fields)
+
+    def close(self):
+        self.recorder.active -= 1
+        self.recorder._put(self.key, "close", {
+            "frames_dropped": self.frames_dropped, "bytes_dropped": self.bytes_dropped,
+        }, 0)
+
+    def stats(self) -> Dict:
+        return {"frames_dropped": self.frames_dropped, "bytes_dropped": self.bytes_dropped}
+
+
+class SessionRecorder:
+    """Queues session audio and events for a background writer thread."""
+
+    def __init__(
+        self,
+        directory: str = RECORDING_DIR,
+        enabled: bool = SESSION_RECORDING,
+        fmt: str = RECORDING_FORMAT,
+        segment_seconds: float = RECORDING_SEGMENT_SECONDS,
+        retention_days: float = RECORDING_RETENTION_DAYS,
+        max_bytes: int = RECORDING_MAX_BYTES,
+        queue_bytes: int = RECORDING_QUEUE_BYTES,
+    ):
+        if fmt not in ("wav", "opus"):
+            raise ValueError(f"Unsupported recording format: {fmt}")
+        if fmt == "opus" and opuslib is None:
+            print("RECORDING_FORMAT=opus needs the opuslib package; recording WAV instead")
+            fmt = "wav"
+        self.directory = directory
+        self.enabled = enabled
+        self.format = fmt
+        self.segment_class = _OggOpusSegment if fmt == "opus" else _WavSegment
+        self.segment_seconds = segment_seconds
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.queue_bytes = queue_bytes
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._thread: Optional[threading.Thread] = None
+        self._keys = itertools.count(1)
+        # Writer thread state
+        self._sessions: Dict[int, _SessionFiles] = {}
+        self._failed: Set[int] = set()
+        self._last_sweep = 0.0
+        # Producer counters (event loop)
+        self.sessions = 0
+        self.active = 0
+        self.frames_queued = 0
+        self.frames_dropped = 0
+        self.bytes_dropped = 0
+        self.queue_peak_bytes = 0
+        # Writer counters (writer thread)
+        self.bytes_written = 0
+        self.segments = 0
+        self.frames_lost = 0
+        self.write_errors = 0
+        self.sessions_deleted = 0
+
+    def _put(self, key: int, kind: str, payload, size: int) -> bool:
+        """Enqueue an item; False when it would take the queue past its budget."""
+        with self._lock:
+            if size and self._pending + size > self.queue_bytes + (EVENT_HEADROOM_BYTES if kind == "event" else 0):
+                return False
+            self._pending += size
+            self.queue_peak_bytes = max(self.queue_peak_bytes, self._pending)
+        self._queue.put((key, kind, payload, size, time.monotonic()))
+        return True
+
+    def _put_audio(self, recording: Recording, track: str, audio: Union[bytes, str]):
+        if self._put(recording.key, track, audio, len(audio)):
+            self.frames_queued += 1
+            return
+        size = len(audio) * 3 // 4 if isinstance(audio, str) else len(audio)
+        recording.frames_dropped += 1
+        recording.bytes_dropped += size
+        self.frames_dropped += 1
+        self.bytes_dropped += size
+
+    def _put_event(self, recording: Recording, kind: str, fields: Dict):
+        size = 128 + sum(len(v) for v in fields.values() if isinstance(v, str))
+        if not self._put(recording.key, "event", (kind, fields), size):
+            recording.frames_dropped += 1
+            self.frames_dropped += 1
+
+    def open(self, session_id: str, meta: Optional[Dict] = None) -> Optional[Recording]:
+        """Start recording a session; None when recording is disabled."""
+        if not self.enabled or self._thread is None:
+            return None
+        key = next(self._keys)
+        self.sessions += 1
+        self.active += 1
+        recording = Recording(self, key)
+        self._put(key, "open", (session_id, meta or {}), 0)
+        return recording
+
+    # Writer thread
+
+    def _handle(self, key: int, kind: str, payload, at: float):
+        if kind == "open":
+            session_id, meta = payload
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            name = f"{stamp}-{session_id}-{key}"
+            files = _SessionFiles(self, os.path.join(self.directory, name), at)
+            self._sessions[key] = files
+            files.log("session_start", 0.0, session_id=session_id, started_at=datetime.now().isoformat(), **meta)
+            return
+        files = self._sessions.get(key)
+        if files is None:
+            return
+        t = at - files.started
+        if kind == "close":
+            del self._sessions[key]
+            files.close(t, **payload)
+        elif kind == "event":
+            event_kind, fields = payload
+            files.log(event_kind, t, **fields)
+        else:
+            pcm = base64.b64decode(payload) if isinstance(payload, str) else payload
+            files.tracks[kind].write(pcm, t)
+
+    def _run(self):
+        self._sweep()
+        while True:
+            try:
+                item = self._queue.get(timeout=SWEEP_INTERVAL / 10)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                key, kind, payload, size, at = item
+                try:
+                    if key in self._failed:
+                        if kind == "close":
+                            self._failed.discard(key)
+                        elif kind != "event":
+                            self.frames_lost += 1
+                    else:
+                        self._handle(key, kind, payload, at)
+                except Exception as e:
+                    # A full or failing disk: give up on this session, keep serving the others
+                    self.write_errors += 1
+                    print(f"Error recording session: {e}")
+                    files = self._sessions.pop(key, None)
+                    if files is not None:
+                        files.abandon()
+                    if kind != "close":
+                        self._failed.add(key)
+                finally:
+                    with self._lock:
+                        self._pending -= size
+            if self._queue.empty():
+                for files in self._sessions.values():
+                    try:
+                        files.flush()
+                    except OSError:
+                        pass
+                if time.monotonic() - self._last_sweep >= SWEEP_INTERVAL:
+                    self._sweep()
+        for files in self._sessions.values():
+            try:
+                files.close(time.monotonic() - files.started, shutdown=True)
+            except OSError:
+                files.abandon()
+        self._sessions.clear()
+
+    def _sweep(self):
+        """Delete finished recordings past retention, then the oldest while over RECORDING_MAX_BYTES."""
+        self._last_sweep = time.monotonic()
+        active = {os.path.basename(files.directory) for files in self._sessions.values()}
+        try:
+            names = [n for n in os.listdir(self.directory) if n not in active]
+        except FileNotFoundError:
+            return
+        recordings = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(path):
+                continue
+            try:
+                entries = [entry.stat() for entry in os.scandir(path)]
+            except OSError:
+                continue
+            modified = max([s.st_mtime for s in entries], default=os.path.getmtime(path))
+            recordings.append((modified, sum(s.st_size for s in entries), path))
+        recordings.sort()
+        total = sum(size for _, size, _ in recordings)
+        cutoff = time.time() - self.retention_days * 86400
+        for modified, size, path in recordings:
+            expired = self.retention_days > 0 and modified < cutoff
+            if not expired and not (self.max_bytes and total > self.max_bytes):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.sessions_deleted += 1
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write out what is queued and finish the open sessions; blocks until done."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": int(self.enabled),
+            "sessions": self.sessions,
+            "active": self.active,
+            "frames_queued": self.frames_queued,
+            "frames_dropped": self.frames_dropped,
+            "bytes_dropped": self.bytes_dropped,
+            "frames_lost": self.frames_lost,
+            "queue_bytes": self._pending,
+            "queue_peak_bytes": self.queue_peak_bytes,
+            "bytes_written": self.bytes_written,
+            "segments": self.segments,
+            "write_errors": self.write_errors,
+            "sessions_deleted": self.sessions_deleted,
+        }
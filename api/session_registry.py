@@ -0,0 +1,197 @@
+"""
+Resumable realtime sessions.
+Each WebSocket session gets an id. When the browser disconnects, the upstream
+realtime connection and its conversation stay open for a grace period, so a
+client that reconnects with `?session_id=` (a mode switch, or a dropped
+network) reattaches to the same conversation instead of paying for a new
+connection and losing its context. Switching between text and audio, or to
+another session profile, sends a `session.update` on the existing connection.
+"""
+
+import os
+import time
+import asyncio
+import secrets
+from typing import Callable, Dict, Optional
+
+from realtime_pool import RealtimePool
+from session_profiles import SessionProfile
+
+SESSION_GRACE_SECONDS = float(os.getenv("SESSION_GRACE_SECONDS", "30"))
+MAX_DETACHED_SESSIONS = int(os.getenv("MAX_DETACHED_SESSIONS", "100"))
+# How long a reconnecting client waits for the old socket to let go
+TAKEOVER_TIMEOUT = 5.0
+
+
+class RealtimeSession:
+    """An upstream realtime connection that can outlive a client WebSocket."""
+
+    def __init__(self, pool: RealtimePool, pooled, mode: str, profile: SessionProfile):
+        self.id = secrets.token_urlsafe(16)
+        self.pool = pool
+        self.pooled = pooled
+        self.mode = mode
+        self.profile = profile
+        self.attached = False
+        self.closed = False
+        self.detached_at = 0.0
+        self.resumes = 0
+        # Set by the attached handler; called to make it let go of the session
+        self.kick: Optional[Callable[[], None]] = None
+        self._released = asyncio.Event()
+        self._released.set()
+
+    @property
+    def connection(self):
+        return self.pooled.connection
+
+    @property
+    def deployment(self) -> str:
+        """Deployment of the endpoint the router picked for this connection."""
+        return self.pooled.endpoint.deployment
+
+    def mark_broken(self):
+        """The upstream connection failed; do not offer it for resumption."""
+        self.closed = True
+
+
+class SessionRegistry:
+    """Keeps detached sessions alive for `grace` seconds so clients can resume."""
+
+    def __init__(self, grace: float = SESSION_GRACE_SECONDS, max_detached: int = MAX_DETACHED_SESSIONS):
+        self.grace = grace
+        self.max_detached = max_detached
+        self._sessions: Dict[str, RealtimeSession] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.created = 0
+        self.resumed = 0
+        self.mode_switches = 0
+        self.profile_switches = 0
+        self.expired = 0
+
+    async def open(self, pool: RealtimePool, mode: str, profile: SessionProfile) -> RealtimeSession:
+        """Check out a fresh connection from the pool and register it.
+
+        Pools are warmed with the default profile; another profile costs one
+        session.update on the checked-out connection.
+        """
+        pooled = await pool.checkout()
+        if profile is not pool.profile:
+            try:
+                await profile.apply(pooled.connection, mode)
+            except Exception:
+                await pool.release(pooled)
+                raise
+            self.profile_switches += 1
+        session = RealtimeSession(pool, pooled, mode, profile)
+        self._sessions[session.id] = session
+        self.created += 1
+        self._attach(session)
+        return session
+
+    async def resume(self, session_id: str, mode: str, profile: SessionProfile) -> Optional[RealtimeSession]:
+        """Reattach to a live session, switching its mode or profile if needed.
+
+        Returns None when the id is unknown, expired or its connection died.
+        """
+        session = self._sessions.get(session_id)
+        if session is None or session.closed:
+            return None
+        if session.attached:
+            # The previous socket may not have noticed its disconnect yet
+            if session.kick is not None:
+                session.kick()
+            try:
+                await asyncio.wait_for(session._released.wait(), TAKEOVER_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None
+        if session.closed or session.id not in self._sessions:
+            return None
+        self._attach(session)
+        if not await session.pool.is_healthy(session.pooled):
+            await self.close(session)
+            return None
+        if session.mode != mode or session.profile is not profile:
+            try:
+                await profile.apply(session.connection, mode)
+            except Exception as e:
+                print(f"Error switching session {session.id} to {mode}/{profile.name}: {e}")
+                await self.close(session)
+                return None
+            if session.mode != mode:
+                self.mode_switches += 1
+            if session.profile is not profile:
+                self.profile_switches += 1
+            session.mode = mode
+            session.profile = profile
+        session.resumes += 1
+        self.resumed += 1
+        return session
+
+    def _attach(self, session: RealtimeSession):
+        session.attached = True
+        session.kick = None
+        session._released.clear()
+
+    async def detach(self, session: RealtimeSession):
+        """The client left: keep the session for the grace period, or close it."""
+        session.attached = False
+        session.kick = None
+        session.detached_at = time.monotonic()
+        session._released.set()
+        if session.closed or self.grace <= 0:
+            await self.close(session)
+            return
+        await self._enforce_limit()
+
+    async def close(self, session: RealtimeSession):
+        session.closed = True
+        session._released.set()
+        if self._sessions.pop(session.id, None) is not None:
+            await session.pool.release(session.pooled)
+
+    def _detached(self):
+        return [s for s in self._sessions.values() if not s.attached]
+
+    async def _enforce_limit(self):
+        detached = sorted(self._detached(), key=lambda s: s.detached_at)
+        for session in detached[: max(0, len(detached) - self.max_detached)]:
+            self.expired += 1
+            await self.close(session)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.grace / 4))
+            cutoff = time.monotonic() - self.grace
+            for session in self._detached():
+                if session.detached_at < cutoff:
+                    self.expired += 1
+                    await self.close(session)
+
+    async def start(self):
+        if self._task is None and self.grace > 0:
+            self._task = asyncio.create_task(self._reap())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for session in list(self._sessions.values()):
+            await self.close(session)
+
+    def stats(self) -> Dict:
+        detached = len(self._detached())
+        return {
+            "attached": len(self._sessions) - detached,
+            "detached": detached,
+            "created": self.created,
+            "resumed": self.resumed,
+            "mode_switches": self.mode_switches,
+            "profile_switches": self.profile_switches,
+            "expired": self.expired,
+            "grace_seconds": self.grace,
+        }
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# Tests import the API modules the way main.py does, from the api directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from history_store import MemoryHistoryStore, SqliteHistoryStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def history_store(request, tmp_path):
+    """Each history backend, so both are held to the same contract."""
+    if request.param == "memory":
+        store = MemoryHistoryStore(archive_dir=str(tmp_path / "archive"))
+    else:
+        store = SqliteHistoryStore(str(tmp_path / "chat_history.db"))
+    yield store
+    store.close()
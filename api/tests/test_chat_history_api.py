@@ -0,0 +1,33 @@
+import pytest
+
+for module in ("fastapi", "httpx", "openai", "dotenv", "numpy"):
+    pytest.importorskip(module)
+
+from fastapi.testclient import TestClient
+
+import main
+from history_store import MemoryHistoryStore
+
+
+def message(content, role="user"):
+    return {"role": role, "content": content}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "history_store", MemoryHistoryStore(archive_dir=None))
+    return TestClient(main.app)
+
+
+def test_append_status_codes(client):
+    session_id = client.post("/chat-history", json={"summary": "Chat", "messages": [message("a")]}).json()["id"]
+    url = f"/chat-history/{session_id}/messages"
+    saved = client.post(url, json={"base_version": 1, "messages": [message("b")]})
+    assert saved.status_code == 200 and saved.json()["version"] == 2
+    conflict = client.post(url, json={"base_version": 1, "messages": [message("c")]})
+    assert conflict.status_code == 409
+    assert conflict.json()["conflict"] is True and conflict.json()["version"] == 2
+    assert client.post(url, json={"start": "soon", "messages": []}).status_code == 422
+    assert client.post(url, json={"base_version": [2], "messages": []}).status_code == 422
+    assert client.post(url, json={"start": 9, "messages": []}).status_code == 400
+    assert client.post(f"/chat-history/{session_id + 1}/messages", json={"messages": []}).status_code == 404
@@ -0,0 +1,53 @@
+import pytest
+
+from history_store import CHAT_MAX_MESSAGES, MessageLimitError, VersionConflictError
+
+
+def message(content, role="user"):
+    return {"role": role, "content": content}
+
+
+def test_append_adds_to_the_end_and_bumps_version(history_store):
+    session_id = history_store.add("Chat", [message("a")])["id"]
+    assert history_store.append(session_id, [message("b", "assistant")]) == {"version": 2, "message_count": 2}
+    assert history_store.append(session_id, [message("c")], base_version=2) == {"version": 3, "message_count": 3}
+    assert [m["content"] for m in history_store.get(session_id)["messages"]] == ["a", "b", "c"]
+
+
+def test_append_from_start_replaces_the_tail(history_store):
+    session_id = history_store.add("Chat", [message("a"), message("partial", "assistant")])["id"]
+    result = history_store.append(session_id, [message("complete", "assistant"), message("d")], start=1)
+    assert result == {"version": 2, "message_count": 3}
+    assert [m["content"] for m in history_store.get(session_id)["messages"]] == ["a", "complete", "d"]
+    assert history_store.search("partial", 10) == []
+    assert history_store.append(session_id, [], start=0) == {"version": 3, "message_count": 0}
+
+
+def test_stale_base_version_conflicts_without_writing(history_store):
+    session_id = history_store.add("Chat", [message("a")])["id"]
+    history_store.update(session_id, messages=[message("from another tab")])
+    with pytest.raises(VersionConflictError) as conflict:
+        history_store.append(session_id, [message("b")], base_version=1)
+    assert conflict.value.version == 2
+    assert history_store.get(session_id)["messages"] == [message("from another tab")]
+    assert history_store.get(session_id)["version"] == 2
+
+
+def test_start_past_the_end_is_rejected(history_store):
+    session_id = history_store.add("Chat", [message("a")])["id"]
+    with pytest.raises(ValueError):
+        history_store.append(session_id, [message("b")], start=2)
+    assert history_store.get(session_id)["version"] == 1
+
+
+def test_append_keeps_to_the_message_limit(history_store):
+    session_id = history_store.add("Chat", [message("a")] * (CHAT_MAX_MESSAGES - 1))["id"]
+    with pytest.raises(MessageLimitError):
+        history_store.append(session_id, [message("b"), message("c")])
+    # Replacing the tail counts only the messages kept ahead of `start`
+    result = history_store.append(session_id, [message("b"), message("c")], start=CHAT_MAX_MESSAGES - 2)
+    assert result["message_count"] == CHAT_MAX_MESSAGES
+
+
+def test_append_to_missing_session(history_store):
+    assert history_store.append(404, [message("a")]) is None
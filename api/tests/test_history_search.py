@@ -0,0 +1,85 @@
+import pytest
+
+import search_index
+
+
+def message(content):
+    return {"role": "user", "content": content}
+
+
+def ids(results):
+    return [r["id"] for r in results]
+
+
+def test_results_contain_every_word(history_store):
+    both = history_store.add("Trip", [message("zebra crossing"), message("hello there")])["id"]
+    history_store.add("Zebra facts", [message("stripes")])
+    history_store.add("Greeting", [message("hello")])
+    assert ids(history_store.search("zebra hello", 10)) == [both]
+    assert history_store.search("zebra unicorn", 10) == []
+    assert history_store.search("", 10) == []
+
+
+def test_summary_matches_rank_above_message_matches(history_store):
+    in_message = history_store.add("Notes", [message("the giraffe is tall")])["id"]
+    in_summary = history_store.add("Giraffe", [message("the animal is tall")])["id"]
+    results = history_store.search("giraffe", 10)
+    assert ids(results) == [in_summary, in_message]
+    assert results[0]["score"] > results[1]["score"] > 0
+    assert results[0]["snippet"] is None
+    assert "giraffe" in results[1]["snippet"]
+
+
+def test_search_pages_with_offset(history_store):
+    added = [history_store.add(f"Session {i}", [message("otter " * (i + 1))])["id"] for i in range(5)]
+    first = ids(history_store.search("otter", 2))
+    second = ids(history_store.search("otter", 2, offset=2))
+    rest = ids(history_store.search("otter", 2, offset=4))
+    assert len(first) == len(second) == 2 and len(rest) == 1
+    assert sorted(first + second + rest) == sorted(added)
+
+
+def test_search_follows_updates_and_deletes(history_store):
+    session_id = history_store.add("Old", [message("walrus")])["id"]
+    history_store.update(session_id, messages=[message("narwhal")])
+    assert history_store.search("walrus", 10) == []
+    assert ids(history_store.search("narwhal", 10)) == [session_id]
+    history_store.append(session_id, [message("beluga")])
+    assert ids(history_store.search("narwhal beluga", 10)) == [session_id]
+    history_store.delete(session_id)
+    assert history_store.search("narwhal", 10) == []
+
+
+@pytest.fixture
+def small_common_threshold(monkeypatch):
+    # Words count as common from a handful of sessions instead of a thousand
+    monkeypatch.setattr(search_index, "_COMMON_MIN", 2)
+
+
+def test_common_words_still_filter_results(history_store, small_common_threshold):
+    for _ in range(10):
+        history_store.add("Greeting", [message("hello world")])
+    zebra_only = history_store.add("Zebra only", [message("zebra")])["id"]
+    zebra_hello = history_store.add("Zebra hello", [message("zebra"), message("hello")])["id"]
+    results = history_store.search("zebra hello", 10)
+    assert ids(results) == [zebra_hello]
+    assert results[0]["score"] > 0
+    assert zebra_only not in ids(history_store.search("hello zebra", 10))
+
+
+def test_common_words_are_counted_by_session(history_store, small_common_threshold):
+    for _ in range(10):
+        history_store.add("Greeting", [message("hello")])
+    # Three rows mention zebra, but only two sessions: still a rare word, so it is scored
+    first = history_store.add("Zebra", [message("zebra"), message("zebra hello")])["id"]
+    second = history_store.add("More", [message("zebra hello")])["id"]
+    results = history_store.search("zebra hello", 10)
+    assert ids(results) == [first, second]
+    assert all(r["score"] > 0 for r in results)
+
+
+def test_query_of_only_common_words_lists_newest(history_store, small_common_threshold):
+    added = [history_store.add("Greeting", [message("hello world")])["id"] for _ in range(5)]
+    results = history_store.search("hello world", 3)
+    assert ids(results) == added[::-1][:3]
+    assert all(r["score"] == 0 for r in results)
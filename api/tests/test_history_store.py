@@ -0,0 +1,133 @@
+import sqlite3
+
+import pytest
+
+from history_store import HistoryStore, SqliteHistoryStore, create_history_store
+
+
+def message(content, role="user"):
+    return {"role": role, "content": content}
+
+
+def test_add_and_get(history_store):
+    added = history_store.add("First chat", [message("hi"), message("hello", "assistant")])
+    session = history_store.get(added["id"])
+    assert session["summary"] == "First chat"
+    assert session["messages"] == [message("hi"), message("hello", "assistant")]
+    assert session["version"] == 1
+    assert history_store.get(added["id"] + 1) is None
+
+
+def test_ids_are_not_reused_after_delete(history_store):
+    first = history_store.add("One", [])["id"]
+    second = history_store.add("Two", [])["id"]
+    assert history_store.delete(second)
+    assert not history_store.delete(second)
+    third = history_store.add("Three", [])["id"]
+    assert third > second > first
+    assert history_store.get(second) is None
+    assert history_store.count() == 2
+
+
+def test_list_summaries_pages_newest_first(history_store):
+    added = [history_store.add(f"Chat {i}", [message(str(i))] * i)["id"] for i in range(5)]
+    page = history_store.list_summaries(2)
+    assert [s["id"] for s in page] == added[:-3:-1]
+    assert "messages" not in page[0]
+    assert page[0]["message_count"] == 4
+    rest = history_store.list_summaries(10, before_id=page[-1]["id"])
+    assert [s["id"] for s in rest] == added[-3::-1]
+    assert history_store.list_summaries(10, before_id=added[0]) == []
+
+
+def test_list_returns_every_session_with_messages(history_store):
+    history_store.add("One", [message("a")])
+    history_store.add("Two", [message("b"), message("c")])
+    assert [(s["summary"], len(s["messages"])) for s in history_store.list()] == [("One", 1), ("Two", 2)]
+
+
+def test_update_replaces_summary_and_messages(history_store):
+    session_id = history_store.add("Draft", [message("a")])["id"]
+    assert history_store.update(session_id, summary="Final") == 1
+    assert history_store.update(session_id, messages=[message("b"), message("c")]) == 2
+    session = history_store.get(session_id)
+    assert session["summary"] == "Final"
+    assert session["messages"] == [message("b"), message("c")]
+    assert history_store.update(session_id + 1, summary="Missing") is None
+
+
+def test_revision_changes_on_every_write(history_store):
+    revisions = [history_store.revision()]
+    session_id = history_store.add("Chat", [])["id"]
+    revisions.append(history_store.revision())
+    history_store.update(session_id, summary="Renamed")
+    revisions.append(history_store.revision())
+    history_store.append(session_id, [message("a")])
+    revisions.append(history_store.revision())
+    history_store.delete(session_id)
+    revisions.append(history_store.revision())
+    assert len(set(revisions)) == len(revisions)
+
+
+def test_incomplete_backend_cannot_be_created():
+    class ListOnly(HistoryStore):
+        def list(self):
+            return []
+
+    with pytest.raises(TypeError):
+        ListOnly()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_history_store("redis")
+
+
+def test_sqlite_sessions_survive_reopening(tmp_path):
+    path = str(tmp_path / "chat_history.db")
+    store = SqliteHistoryStore(path)
+    session_id = store.add("Kept", [message("persisted words")])["id"]
+    store.close()
+    store = SqliteHistoryStore(path)
+    try:
+        assert store.get(session_id)["messages"] == [message("persisted words")]
+        assert [r["id"] for r in store.search("persisted", 10)] == [session_id]
+        assert store.add("Next", [])["id"] == session_id + 1
+    finally:
+        store.close()
+
+
+def test_sqlite_migrates_json_array_sessions(tmp_path):
+    path = str(tmp_path / "chat_history.db")
+    # The first layout: one JSON array of messages per session
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE chat_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            summary TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            messages TEXT NOT NULL
+        );
+        INSERT INTO chat_sessions (summary, timestamp, messages) VALUES
+            ('Old chat', '2025-01-01T00:00:00', '[{"role": "user", "content": "héllo"}, {"role": "assistant", "content": "kangaroo"}]'),
+            ('Empty', '2025-01-02T00:00:00', '[]');
+    """)
+    conn.close()
+    store = SqliteHistoryStore(path)
+    try:
+        assert store.get(1)["messages"] == [message("héllo"), message("kangaroo", "assistant")]
+        assert store.get(1)["version"] == 1
+        assert [s["message_count"] for s in store.list_summaries(10)] == [0, 2]
+        assert [r["id"] for r in store.search("kangaroo", 10)] == [1]
+        assert store.append(1, [message("more")], base_version=1) == {"version": 2, "message_count": 3}
+    finally:
+        store.close()
+    # Content bytes are filled in, so the size limit on appends counts migrated messages
+    conn = sqlite3.connect(path)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(chat_sessions)")}
+        assert "messages" not in columns
+        content_bytes = conn.execute("SELECT content_bytes FROM chat_sessions WHERE id = 1").fetchone()[0]
+        assert content_bytes == len("héllo".encode("utf-8")) + len("kangaroo") + len("more")
+    finally:
+        conn.close()
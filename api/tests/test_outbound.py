@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from outbound import OUTBOUND_POLICIES, OutboundQueue
+
+
+class StalledSocket:
+    """A client that never reads; nothing sent to it completes."""
+
+    async def send_json(self, data):
+        await asyncio.Event().wait()
+
+    async def send_bytes(self, data):
+        await asyncio.Event().wait()
+
+
+@pytest.mark.parametrize("policy", OUTBOUND_POLICIES)
+def test_text_frames_never_grow_queue_past_max_size(policy):
+    queue = OutboundQueue(StalledSocket(), max_size=8, policy=policy)
+    # Alternating types so no delta can be merged into the one queued before it
+    for i in range(100):
+        frame_type = "text_delta" if i % 2 else "assistant_transcript_delta"
+        queue.send({"type": frame_type, "delta": str(i)})
+        queue.send({"type": "response_done"})
+        assert queue.depth <= queue.max_size
+    assert not queue.is_open
+
+
+def test_audio_is_dropped_before_disconnecting():
+    queue = OutboundQueue(StalledSocket(), max_size=4, policy="drop_audio")
+    for _ in range(4):
+        queue.send_bytes(b"\0" * 10)
+    queue.send({"type": "response_done"})
+    assert queue.is_open
+    assert queue.depth == 4
+    assert queue.dropped_audio == 1
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("azure.identity")
+
+from credentials import ClientFactory, TokenCache
+from endpoint_router import Endpoint, EndpointRouter
+from fake_realtime_server import FakeRealtimeServer
+from realtime_pool import RealtimePool, _PooledConnection
+from session_profiles import load_profiles
+
+
+def test_pool_connects_to_fake_server_over_http_endpoint_and_refills():
+    async def run():
+        server = FakeRealtimeServer(port=0)
+        await server.start()
+        factory = ClientFactory(TokenCache(api_key="fake"))
+        # The fake server's url is http://, as AZURE_OPENAI_ENDPOINT is in the offline docs
+        router = EndpointRouter([Endpoint("fake", server.url, "gpt-realtime")], factory.get_realtime_client)
+        pool = RealtimePool("text", router, load_profiles()["default"], size=1, health_interval=60)
+        try:
+            await pool.start()
+            for _ in range(100):
+                if pool.stats()["idle"]:
+                    break
+                await asyncio.sleep(0.02)
+            pooled = await pool.checkout()
+            assert pool.stats()["hits"] == 1
+            assert pool.stats()["failed"] == 0
+            event = await asyncio.wait_for(pooled.connection.recv(), 5)
+            assert event.type == "session.updated"
+            await pool.release(pooled)
+            # The checkout wakes the pool, which opens a replacement in the background
+            for _ in range(100):
+                if pool.stats()["idle"]:
+                    break
+                await asyncio.sleep(0.02)
+            assert pool.stats()["opened"] == 2
+            assert pool.stats()["misses"] == 0
+        finally:
+            await pool.stop()
+            await factory.close()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_health_check_without_websocket_ping():
+    class Connection:
+        """A connection object from an SDK that no longer exposes its websocket."""
+
+    async def run():
+        router = EndpointRouter([Endpoint("fake", "http://127.0.0.1:9", "gpt-realtime")], None)
+        pool = RealtimePool("text", router, load_profiles()["default"], size=0)
+        pooled = _PooledConnection(None, Connection(), router.endpoints[0])
+        assert await pool.is_healthy(pooled)
+        assert pool.ping_unsupported
+
+    asyncio.run(run())
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from fake_realtime_server import FakeRealtimeServer
+from session_profiles import load_profiles
+
+
+def test_apply_sends_session_update_on_sdk_connection():
+    profile = load_profiles()["low-latency"]
+
+    async def run():
+        server = FakeRealtimeServer(port=0)
+        await server.start()
+        try:
+            client = openai.AsyncOpenAI(
+                websocket_base_url=f"ws://{server.host}:{server.port}/openai/v1", api_key="fake"
+            )
+            async with client.realtime.connect(model="gpt-realtime") as connection:
+                assert (await connection.recv()).type == "session.created"
+                await profile.apply(connection, "audio")
+                event = await connection.recv()
+                assert event.type == "session.updated"
+                assert event.session.instructions == profile.audio["instructions"]
+                assert event.session.output_modalities == ["audio"]
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
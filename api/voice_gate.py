@@ -0,0 +1,129 @@
+"""
+Local energy gate that keeps long silences from being sent upstream.
+Input PCM16 is split into short frames whose RMS level is computed in one
+vectorized NumPy pass. The gate opens on the first frame above the threshold
+and forwards a pre-roll of the audio just before it, matching the session's
+`prefix_padding_ms`. It closes after a hangover longer than the session's
+`silence_duration_ms`, so server-side VAD still sees the trailing silence it
+needs to end the turn.
+"""
+
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+VOICE_GATE = os.getenv("VOICE_GATE", "false").lower() == "true"
+VOICE_GATE_THRESHOLD_DB = float(os.getenv("VOICE_GATE_THRESHOLD_DB", "-45"))
+# Extra open time beyond the session's silence_duration_ms
+VOICE_GATE_HANGOVER_MARGIN_MS = int(os.getenv("VOICE_GATE_HANGOVER_MARGIN_MS", "300"))
+
+FRAME_MS = 20
+
+# Process-wide totals for /metrics
+voice_gate_totals = {"bytes_in": 0, "bytes_forwarded": 0, "segments": 0}
+
+
+def frame_levels(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """RMS level in dBFS of each whole frame of int16 samples."""
+    frames = samples[: len(samples) // frame_size * frame_size].reshape(-1, frame_size)
+    power = np.mean(np.square(frames, dtype=np.float64), axis=1)
+    return 10 * np.log10(np.maximum(power, 1e-10) / (32768.0 ** 2))
+
+
+class VoiceGate:
+    """Drops PCM16 silence between utterances, keeping pre-roll and hangover."""
+
+    def __init__(
+        self,
+        rate: int = 24000,
+        threshold_db: float = VOICE_GATE_THRESHOLD_DB,
+        preroll_ms: int = 300,
+        hangover_ms: int = 800,
+        frame_ms: int = FRAME_MS,
+    ):
+        self.rate = rate
+        self.threshold_db = threshold_db
+        self.frame_size = rate * frame_ms // 1000
+        self.frame_bytes = self.frame_size * 2
+        self.preroll_frames = max(1, preroll_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self._preroll: Deque[bytes] = deque(maxlen=self.preroll_frames)
+        self._remainder = b""
+        self._open = False
+        self._quiet = 0
+        self.bytes_in = 0
+        self.bytes_forwarded = 0
+        self.segments = 0
+
+    @classmethod
+    def for_session(cls, session: Dict, **kwargs) -> "VoiceGate":
+        """Gate sized from a session config's rate and server_vad settings."""
+        audio_in = session.get("audio", {}).get("input", {})
+        vad = audio_in.get("turn_detection") or {}
+        rate = audio_in.get("format", {}).get("rate", 24000)
+        kwargs.setdefault("preroll_ms", vad.get("prefix_padding_ms", 300))
+        kwargs.setdefault("hangover_ms", vad.get("silence_duration_ms", 500) + VOICE_GATE_HANGOVER_MARGIN_MS)
+        return cls(rate=rate, **kwargs)
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    @property
+    def bytes_suppressed(self) -> int:
+        # Bytes still held in the remainder or pre-roll are not yet decided
+        pending = len(self._remainder) + sum(len(f) for f in self._preroll)
+        return max(0, self.bytes_in - self.bytes_forwarded - pending)
+
+    def process(self, pcm: bytes) -> bytes:
+        """Feed PCM16 audio; returns the bytes to forward (possibly empty)."""
+        self.bytes_in += len(pcm)
+        voice_gate_totals["bytes_in"] += len(pcm)
+        data = self._remainder + pcm
+        whole = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[whole:]
+        if not whole:
+            return b""
+        levels = frame_levels(np.frombuffer(data[:whole], dtype="<i2"), self.frame_size)
+        voiced = levels >= self.threshold_db
+        out = []
+        for i, is_voiced in enumerate(voiced):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            if is_voiced:
+                self._quiet = 0
+                if not self._open:
+                    self._open = True
+                    self.segments += 1
+                    voice_gate_totals["segments"] += 1
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                out.append(frame)
+            elif self._open:
+                self._quiet += 1
+                out.append(frame)
+                if self._quiet >= self.hangover_frames:
+                    self._open = False
+            else:
+                self._preroll.append(frame)
+        forwarded = b"".join(out)
+        self.bytes_forwarded += len(forwarded)
+        voice_gate_totals["bytes_forwarded"] += len(forwarded)
+        return forwarded
+
+    def stats(self) -> Dict:
+        return {
+            "open": self._open,
+            "bytes_in": self.bytes_in,
+            "bytes_forwarded": self.bytes_forwarded,
+            "bytes_suppressed": self.bytes_suppressed,
+            "segments": self.segments,
+        }
+
+
+def create_voice_gate(session: Dict, enabled: Optional[bool] = None) -> Optional[VoiceGate]:
+    """A gate for the session when enabled (VOICE_GATE by default), else None."""
+    if not (VOICE_GATE if enabled is None else enabled):
+        return None
+    return VoiceGate.for_session(session)
@@ -1,8 +1,18 @@
 import { useState, useRef, useEffect } from 'react'
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8001'
-const WEBSOCKET_URL_TEXT = API_URL.replace('http', 'ws') + '/ws/text'
-const WEBSOCKET_URL_AUDIO = API_URL.replace('http', 'ws') + '/ws/audio'
+// Optional server session profile (e.g. low-latency, accurate)
+const SESSION_PROFILE = import.meta.env.VITE_SESSION_PROFILE
+const PROFILE_QUERY = SESSION_PROFILE ? `profile=${encodeURIComponent(SESSION_PROFILE)}` : ''
+const WEBSOCKET_URL_TEXT = API_URL.replace('http', 'ws') + '/ws/text' + (PROFILE_QUERY ? `?${PROFILE_QUERY}` : '')
+// Microphone capture rate; the server resamples to the session's 24 kHz
+const INPUT_SAMPLE_RATE = 16000
+// Binary transport: raw PCM16 frames instead of base64 inside JSON
+const WEBSOCKET_URL_AUDIO = API_URL.replace('http', 'ws') +
+  `/ws/audio?transport=binary&input_rate=${INPUT_SAMPLE_RATE}` + (PROFILE_QUERY ? `&${PROFILE_QUERY}` : '')
+// Multiplexed socket; chat history requests go over one of its channels
+const WEBSOCKET_URL_MUX = API_URL.replace('http', 'ws') + '/ws'
+const HISTORY_CHANNEL = 1
 
 function App() {
   const [messages, setMessages] = useState([])
@@ -11,12 +21,31 @@ function App() {
   const [isConnected, setIsConnected] = useState(false)
   const [mode, setMode] = useState('text') // 'text' or 'audio'
   const [chatHistory, setChatHistory] = useState([])
+  const [historyCursor, setHistoryCursor] = useState(null)
   const [currentChatId, setCurrentChatId] = useState(null)
+  const [searchQuery, setSearchQuery] = useState('')
+  // null while not searching
+  const [searchResults, setSearchResults] = useState(null)
   
   const wsRef = useRef(null)
+  // Server session reused across reconnects and text/voice switches
+  const sessionIdRef = useRef(null)
+  const muxRef = useRef(null)
+  // History requests awaiting their reply, by request id
+  const pendingRef = useRef(new Map())
+  const requestIdRef = useRef(0)
+  // Messages and version of the last save, so the next save only sends changes
+  const savedRef = useRef({ messages: [], version: null })
   const mediaRecorderRef = useRef(null)
   const audioContextRef = useRef(null)
+  // Assistant audio is queued on one context so an interruption can stop it
+  const playbackContextRef = useRef(null)
+  const playbackSourcesRef = useRef(new Set())
+  const nextPlayTimeRef = useRef(0)
   const messagesEndRef = useRef(null)
+  const searchQueryRef = useRef('')
+  // Summaries currently listed, including pages fetched with "Load more"
+  const historyLoadedRef = useRef(0)
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -31,49 +60,157 @@ function App() {
   }, [messages])
 
   useEffect(() => {
-    loadChatHistory()
+    historyLoadedRef.current = chatHistory.length
+  }, [chatHistory])
+
+  useEffect(() => {
+    searchQueryRef.current = searchQuery
+    if (!searchQuery.trim()) {
+      setSearchResults(null)
+      return
+    }
+    const timer = setTimeout(() => searchHistory(searchQuery), 300)
+    return () => clearTimeout(timer)
+  }, [searchQuery])
+
+  useEffect(() => {
+    connectMux()
+    return () => {
+      if (muxRef.current) {
+        muxRef.current.onclose = null
+        muxRef.current.close()
+      }
+    }
   }, [])
 
+  const connectMux = () => {
+    const ws = new WebSocket(WEBSOCKET_URL_MUX)
+    let opened
+    ws.ready = new Promise(resolve => { opened = resolve })
+
+    ws.onopen = () => {
+      ws.send(JSON.stringify({ type: 'open', channel: HISTORY_CHANNEL, kind: 'history' }))
+    }
+
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data)
+      if (data.channel !== HISTORY_CHANNEL) return
+      if (data.type === 'opened') {
+        opened()
+        loadChatHistory()
+      } else if (data.type === 'changed') {
+        // A save, delete or background caption changed the listing
+        refreshChatHistory()
+        if (searchQueryRef.current.trim()) searchHistory(searchQueryRef.current)
+      } else if (pendingRef.current.has(data.id)) {
+        pendingRef.current.get(data.id)(data)
+        pendingRef.current.delete(data.id)
+      }
+    }
+
+    ws.onclose = () => {
+      for (const resolve of pendingRef.current.values()) {
+        resolve({ type: 'error', message: 'Connection closed' })
+      }
+      pendingRef.current.clear()
+      muxRef.current = null
+    }
+
+    muxRef.current = ws
+    return ws
+  }
+
+  const historyRequest = async (request) => {
+    const ws = muxRef.current || connectMux()
+    await ws.ready
+    const id = ++requestIdRef.current
+    const reply = new Promise(resolve => pendingRef.current.set(id, resolve))
+    ws.send(JSON.stringify({ ...request, id, channel: HISTORY_CHANNEL }))
+    const data = await reply
+    if (data.type === 'error') throw new Error(data.message)
+    return data
+  }
+
   const loadChatHistory = async () => {
     try {
-      const response = await fetch(`${API_URL}/chat-history`)
-      const data = await response.json()
+      // First page of summaries
+      const data = await historyRequest({ type: 'list' })
       setChatHistory(data.history)
+      setHistoryCursor(data.next_cursor)
+    } catch (err) {
+      console.error('Failed to load chat history:', err)
+    }
+  }
+
+  const refreshChatHistory = async () => {
+    try {
+      // Refetch as many pages as are loaded, so "Load more" pages stay listed
+      const history = []
+      let cursor = null
+      do {
+        const data = await historyRequest({ type: 'list', cursor })
+        history.push(...data.history)
+        cursor = data.next_cursor
+      } while (cursor && history.length < historyLoadedRef.current)
+      setChatHistory(history)
+      setHistoryCursor(cursor)
+    } catch (err) {
+      console.error('Failed to refresh chat history:', err)
+    }
+  }
+
+  const loadMoreHistory = async () => {
+    if (!historyCursor) return
+    try {
+      const data = await historyRequest({ type: 'list', cursor: historyCursor })
+      setChatHistory(prev => [...prev, ...data.history])
+      setHistoryCursor(data.next_cursor)
     } catch (err) {
       console.error('Failed to load chat history:', err)
     }
   }
 
+  const searchHistory = async (query) => {
+    try {
+      const data = await historyRequest({ type: 'search', query })
+      // Ignore replies to queries the user has already changed
+      if (query === searchQueryRef.current) setSearchResults(data.results)
+    } catch (err) {
+      console.error('Failed to search chat history:', err)
+    }
+  }
+
   const saveCurrentChat = async () => {
     if (messages.length === 0) return
     
     try {
-      // Generate caption using AI
-      const captionResponse = await fetch(`${API_URL}/generate-caption`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ messages })
-      })
-      const { caption } = await captionResponse.json()
-      
-      if (currentChatId) {
-        // Update existing chat
-        await fetch(`${API_URL}/chat-history/${currentChatId}`, {
-          method: 'PUT',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ summary: caption, messages })
-        })
-      } else {
-        // Create new chat
-        const response = await fetch(`${API_URL}/chat-history`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ summary: caption, messages })
+      const saved = savedRef.current
+      if (currentChatId && saved.version !== null) {
+        // Messages are replaced rather than mutated, so unchanged ones are the
+        // same objects; only send from the first one that differs
+        let start = 0
+        while (start < messages.length && start < saved.messages.length &&
+               messages[start] === saved.messages[start]) {
+          start++
+        }
+        if (start === messages.length && start === saved.messages.length) return
+        const data = await historyRequest({
+          type: 'append', session_id: currentChatId, base_version: saved.version,
+          start, messages: messages.slice(start), auto_caption: true
         })
-        const data = await response.json()
-        setCurrentChatId(data.id)
+        if (data.type === 'saved') {
+          savedRef.current = { messages, version: data.version }
+          return
+        }
+        // 'conflict': changed elsewhere, so fall back to saving everything
       }
-      await loadChatHistory()
+      // The server generates the caption in the background after saving
+      // and pushes 'changed' so the sidebar refreshes
+      const data = await historyRequest({
+        type: 'save', session_id: currentChatId, messages, auto_caption: true
+      })
+      savedRef.current = { messages, version: data.version }
+      setCurrentChatId(data.session_id)
     } catch (err) {
       console.error('Failed to save chat:', err)
     }
@@ -85,24 +222,31 @@ function App() {
     }
     setMessages([])
     setCurrentChatId(null)
+    savedRef.current = { messages: [], version: null }
+    sessionIdRef.current = null
   }
 
-  const loadChat = (chat) => {
-    setMessages(chat.messages)
-    setCurrentChatId(chat.id)
+  const loadChat = async (chat) => {
+    try {
+      const data = await historyRequest({ type: 'get', session_id: chat.id })
+      setMessages(data.session.messages)
+      savedRef.current = { messages: data.session.messages, version: data.session.version }
+      setCurrentChatId(chat.id)
+      sessionIdRef.current = null
+    } catch (err) {
+      console.error('Failed to load chat:', err)
+    }
   }
 
   const deleteChat = async (chatId, e) => {
     e.stopPropagation() // Prevent triggering loadChat
     try {
-      await fetch(`${API_URL}/chat-history/${chatId}`, {
-        method: 'DELETE'
-      })
-      await loadChatHistory()
+      await historyRequest({ type: 'delete', session_id: chatId })
       // If deleted chat was active, start new chat
       if (currentChatId === chatId) {
         setMessages([])
         setCurrentChatId(null)
+        savedRef.current = { messages: [], version: null }
       }
     } catch (err) {
       console.error('Failed to delete chat:', err)
@@ -114,8 +258,12 @@ function App() {
       wsRef.current.close()
     }
 
-    const url = audioMode ? WEBSOCKET_URL_AUDIO : WEBSOCKET_URL_TEXT
+    let url = audioMode ? WEBSOCKET_URL_AUDIO : WEBSOCKET_URL_TEXT
+    if (sessionIdRef.current) {
+      url += (url.includes('?') ? '&' : '?') + `session_id=${sessionIdRef.current}`
+    }
     const ws = new WebSocket(url)
+    ws.binaryType = 'arraybuffer'
     
     ws.onopen = () => {
       setIsConnected(true)
@@ -123,9 +271,15 @@ function App() {
     }
     
     ws.onmessage = (event) => {
+      if (event.data instanceof ArrayBuffer) {
+        playPcm16(new Int16Array(event.data))
+        return
+      }
       const data = JSON.parse(event.data)
       
-      if (data.type === 'text_delta') {
+      if (data.type === 'connected') {
+        sessionIdRef.current = data.session_id
+      } else if (data.type === 'text_delta') {
         setMessages(prev => {
           const last = prev[prev.length - 1]
           if (last && last.role === 'assistant' && !last.complete) {
@@ -135,6 +289,16 @@ function App() {
         })
       } else if (data.type === 'audio_delta') {
         playAudioChunk(data.delta)
+      } else if (data.type === 'interrupted') {
+        // The user talked over the assistant; drop audio not yet played
+        stopPlayback()
+        setMessages(prev => {
+          const last = prev[prev.length - 1]
+          if (last && last.role === 'assistant' && !last.complete) {
+            return [...prev.slice(0, -1), { ...last, complete: true }]
+          }
+          return prev
+        })
       } else if (data.type === 'user_transcript') {
         setMessages(prev => [...prev, { role: 'user', content: data.text }])
       } else if (data.type === 'assistant_transcript_delta') {
@@ -187,7 +351,7 @@ function App() {
 
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true })
       
-      audioContextRef.current = new AudioContext({ sampleRate: 24000 })
+      audioContextRef.current = new AudioContext({ sampleRate: INPUT_SAMPLE_RATE })
       const source = audioContextRef.current.createMediaStreamSource(stream)
       const processor = audioContextRef.current.createScriptProcessor(4096, 1, 1)
       
@@ -200,8 +364,7 @@ function App() {
           pcm16[i] = Math.max(-32768, Math.min(32767, inputData[i] * 32768))
         }
         
-        const base64 = btoa(String.fromCharCode(...new Uint8Array(pcm16.buffer)))
-        wsRef.current.send(JSON.stringify({ type: 'audio', audio: base64 }))
+        wsRef.current.send(pcm16.buffer)
       }
       
       source.connect(processor)
@@ -239,21 +402,43 @@ function App() {
     for (let i = 0; i < binary.length; i++) {
       bytes[i] = binary.charCodeAt(i)
     }
-    
-    const pcm16 = new Int16Array(bytes.buffer)
+    playPcm16(new Int16Array(bytes.buffer))
+  }
+
+  const playPcm16 = (pcm16) => {
     const float32 = new Float32Array(pcm16.length)
     for (let i = 0; i < pcm16.length; i++) {
       float32[i] = pcm16[i] / 32768
     }
     
-    const audioContext = new AudioContext({ sampleRate: 24000 })
+    if (!playbackContextRef.current) {
+      playbackContextRef.current = new AudioContext({ sampleRate: 24000 })
+    }
+    const audioContext = playbackContextRef.current
     const buffer = audioContext.createBuffer(1, float32.length, 24000)
     buffer.copyToChannel(float32, 0)
     
     const source = audioContext.createBufferSource()
     source.buffer = buffer
     source.connect(audioContext.destination)
-    source.start()
+    // Play chunks back to back instead of on top of each other
+    const startAt = Math.max(audioContext.currentTime, nextPlayTimeRef.current)
+    source.start(startAt)
+    nextPlayTimeRef.current = startAt + buffer.duration
+    playbackSourcesRef.current.add(source)
+    source.onended = () => playbackSourcesRef.current.delete(source)
+  }
+
+  const stopPlayback = () => {
+    for (const source of playbackSourcesRef.current) {
+      try {
+        source.stop()
+      } catch (err) {
+        // Already stopped
+      }
+    }
+    playbackSourcesRef.current.clear()
+    nextPlayTimeRef.current = 0
   }
 
   useEffect(() => {
@@ -334,14 +519,27 @@ function App() {
       
       <aside className="sidebar">
         <h2>Chat History</h2>
+        <input
+          type="search"
+          className="history-search"
+          value={searchQuery}
+          onChange={(e) => setSearchQuery(e.target.value)}
+          placeholder="Search chats..."
+        />
         <div className="prompts">
-          {chatHistory.map((chat) => (
+          {searchResults && searchResults.length === 0 && (
+            <div className="search-empty">No matching chats</div>
+          )}
+          {(searchResults || chatHistory).map((chat) => (
             <div 
               key={chat.id} 
               className={`prompt-item ${currentChatId === chat.id ? 'active' : ''}`}
               onClick={() => loadChat(chat)}
             >
-              <span className="chat-summary">{chat.summary}</span>
+              <div className="chat-summary">
+                {chat.summary}
+                {chat.snippet && <div className="chat-snippet">{chat.snippet}</div>}
+              </div>
               <button 
                 className="delete-chat-btn"
                 onClick={(e) => deleteChat(chat.id, e)}
@@ -353,6 +551,11 @@ function App() {
               </button>
             </div>
           ))}
+          {!searchResults && historyCursor && (
+            <button className="load-more-btn" onClick={loadMoreHistory}>
+              Load more
+            </button>
+          )}
         </div>
       </aside>
     </div>
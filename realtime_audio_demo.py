@@ -1,159 +1,398 @@
 import os
-import asyncio
-import pyaudio
+import sys
+import time
 import base64
+import asyncio
+import argparse
+import threading
+from typing import List, Optional
 from openai import AsyncOpenAI
 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 from dotenv import load_dotenv
 
+try:
+    import pyaudio
+except ImportError:  # only needed for a real microphone and speaker
+    pyaudio = None
+
+# Shared with the API server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+from voice_gate import VoiceGate
+from session_profiles import SESSION_PROFILE, load_profiles
+
+# pyaudio.paInt16 / pyaudio.paContinue, usable without PyAudio installed
+PA_INT16 = 8
+PA_CONTINUE = 0
+
+# Audio delta event names (GA and preview API versions)
+AUDIO_DELTA_EVENTS = ("response.output_audio.delta", "response.audio.delta")
+
+# Audio held back before playback starts, to ride out gaps between deltas
+JITTER_BUFFER_MS = int(os.getenv("JITTER_BUFFER_MS", "120"))
+# Microphone buffers waiting to be sent; the oldest is dropped beyond this
+MIC_QUEUE_SIZE = int(os.getenv("MIC_QUEUE_SIZE", "64"))
+
+
+class JitterBuffer:
+    """Playback buffer shared by the event loop and the audio output callback.
+
+    Playback starts once `target_bytes` are buffered (or the response has
+    ended) and then runs continuously. An underrun pads the callback with
+    silence and buffers up to the target again before resuming.
+    """
+
+    def __init__(self, target_bytes: int):
+        self.target_bytes = target_bytes
+        self._data = bytearray()
+        self._lock = threading.Lock()
+        self._playing = False
+        self._ending = False
+        self.underruns = 0
+        self.played_bytes = 0
+        self.first_played_at: Optional[float] = None
+
+    def write(self, data: bytes):
+        with self._lock:
+            self._data += data
+
+    def end_of_response(self):
+        """Play out what is left even if it is below the target."""
+        with self._lock:
+            self._ending = True
+
+    def position(self) -> int:
+        """Byte offset at which the next written audio will be played."""
+        with self._lock:
+            return self.played_bytes + len(self._data)
+
+    def clear(self) -> int:
+        """Drop everything not yet played (barge-in); returns the bytes dropped."""
+        with self._lock:
+            dropped = len(self._data)
+            self._data.clear()
+            self._playing = False
+            self._ending = False
+            return dropped
+
+    def start_turn(self):
+        with self._lock:
+            self.first_played_at = None
+
+    def read(self, size: int) -> bytes:
+        """Called from the audio thread; never blocks on the network."""
+        with self._lock:
+            if not self._playing:
+                if len(self._data) < self.target_bytes and not (self._ending and self._data):
+                    return bytes(size)
+                self._playing = True
+            chunk = bytes(self._data[:size])
+            del self._data[:size]
+            self.played_bytes += len(chunk)
+            if chunk and self.first_played_at is None:
+                self.first_played_at = time.monotonic()
+            if len(chunk) < size:
+                if not self._ending:
+                    self.underruns += 1
+                self._playing = False
+                self._ending = False
+                chunk += bytes(size - len(chunk))
+            return chunk
+
 
 class RealtimeAudioDemo:
-    def __init__(self):
+    def __init__(self, audio=None, endpoint: Optional[str] = None, api_key: Optional[str] = None,
+                 profile: Optional[str] = None):
         load_dotenv()
-        self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT")
         self.deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-realtime")
         if not self.endpoint:
             raise ValueError("AZURE_OPENAI_ENDPOINT not found")
-        self.credential = DefaultAzureCredential()
-        
-        # Audio setup
-        self.audio = pyaudio.PyAudio()
+        # An API key (e.g. for the fake realtime server) skips Azure AD
+        self.api_key = api_key or os.getenv("AZURE_OPENAI_API_KEY")
+        self.credential = None if self.api_key else DefaultAzureCredential()
+
+        # Audio setup; any PyAudio-compatible device works (see api/fake_audio_device.py)
+        if audio is None:
+            if pyaudio is None:
+                raise ImportError("pyaudio is required for microphone input")
+            audio = pyaudio.PyAudio()
+        self.audio = audio
         self.rate = 24000  # 24kHz for GPT-4o Realtime
         self.chunk = 1024
-        self.format = pyaudio.paInt16
-    
-    async def send_audio(self, connection, stream):
+        self.format = PA_INT16
+
+        # Instructions, voice and VAD timing (SESSION_PROFILE, see api/session_profiles.py)
+        self.profile = load_profiles()[profile or SESSION_PROFILE]
+
+        # Optional local gate so silence between utterances is not uploaded
+        self.gate = VoiceGate.for_session(self.profile.audio) if os.getenv("VOICE_GATE", "false").lower() == "true" else None
+
+        # Microphone buffers arrive on PortAudio's thread and are handed to
+        # the event loop; playback reads from the jitter buffer on its thread
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._mic: Optional[asyncio.Queue] = None
+        self.mic_dropped = 0
+        self.jitter = JitterBuffer(self.rate * 2 * JITTER_BUFFER_MS // 1000)
+
+        # Per-turn timing: speech stopped -> first delta -> first sample played
+        self._speech_stopped_at: Optional[float] = None
+        self._first_delta_at: Optional[float] = None
+        self.latencies_ms: List[float] = []
+        self._reports = set()
+
+        # Barge-in: the response being spoken and where its item starts playing
+        self._response_id: Optional[str] = None
+        self._responding = False
+        self._item_id: Optional[str] = None
+        self._item_offset = 0
+        self._cancelled = set()
+        self.interruptions = 0
+        self.dropped_bytes = 0
+
+    def _on_input(self, in_data, frame_count, time_info, status):
+        """PortAudio input callback: pass the buffer to the event loop without blocking."""
+        self._loop.call_soon_threadsafe(self._enqueue_mic, in_data)
+        return (None, PA_CONTINUE)
+
+    def _enqueue_mic(self, data: bytes):
+        if self._mic.full():
+            # Falling behind; stale audio is worth less than fresh audio
+            self._mic.get_nowait()
+            self.mic_dropped += 1
+        self._mic.put_nowait(data)
+
+    def _on_output(self, in_data, frame_count, time_info, status):
+        """PortAudio output callback: play buffered audio or silence."""
+        return (self.jitter.read(frame_count * 2), PA_CONTINUE)
+
+    async def send_audio(self, connection):
         """Send audio from microphone to the model."""
         try:
             print("🎤 Listening... (Speak naturally)")
             while True:
-                data = stream.read(self.chunk, exception_on_overflow=False)
+                data = await self._mic.get()
+                if self.gate is not None:
+                    data = self.gate.process(data)
                 if data:
                     audio_b64 = base64.b64encode(data).decode('utf-8')
                     await connection.input_audio_buffer.append(audio=audio_b64)
-                await asyncio.sleep(0.01)
         except asyncio.CancelledError:
             pass
-    
-    async def receive_audio(self, connection, stream):
+
+    async def report_latency(self, speech_stopped_at: float, first_delta_at: float):
+        """Print the turn's latency once its first audio has actually been played."""
+        for _ in range(500):
+            if self.jitter.first_played_at is not None:
+                break
+            await asyncio.sleep(0.01)
+        else:
+            return
+        played_at = self.jitter.first_played_at
+        total = (played_at - speech_stopped_at) * 1000
+        self.latencies_ms.append(total)
+        print(f"⏱️  Latency: {total:.0f} ms to first audio "
+              f"(first delta {(first_delta_at - speech_stopped_at) * 1000:.0f} ms, "
+              f"buffering {(played_at - first_delta_at) * 1000:.0f} ms)")
+
+    async def interrupt(self, connection):
+        """The user talked over the assistant: stop it, keep only what was heard."""
+        if self._responding and self._response_id is not None:
+            self._cancelled.add(self._response_id)
+            await connection.response.cancel()
+        played = max(0, self.jitter.played_bytes - self._item_offset)
+        dropped = self.jitter.clear()
+        if self._item_id is not None:
+            await connection.conversation.item.truncate(
+                item_id=self._item_id, content_index=0, audio_end_ms=played * 1000 // (self.rate * 2)
+            )
+        self.interruptions += 1
+        self.dropped_bytes += dropped
+        print(f"\n✋ Interrupted: dropped {dropped} bytes of unplayed audio")
+        self._responding = False
+        self._item_id = None
+
+    async def receive_audio(self, connection):
         """Receive audio responses and events from the model."""
         try:
             async for event in connection:
-                if event.type == "response.audio.delta":
-                    audio_data = base64.b64decode(event.delta)
-                    stream.write(audio_data)
+                if event.type in AUDIO_DELTA_EVENTS:
+                    audio = base64.b64decode(event.delta)
+                    if event.response_id in self._cancelled:
+                        self.dropped_bytes += len(audio)
+                        continue
+                    if event.item_id != self._item_id:
+                        self._item_id = event.item_id
+                        self._item_offset = self.jitter.position()
+                    if self._first_delta_at is None:
+                        self._first_delta_at = time.monotonic()
+                    self.jitter.write(audio)
+                elif event.type == "response.created":
+                    self._response_id = event.response.id
+                    self._responding = True
                 elif event.type == "conversation.item.input_audio_transcription.completed":
                     print(f"\n👤 You: {event.transcript}")
                 elif event.type == "response.output_audio_transcript.delta":
-                    print(event.delta, end="", flush=True)
+                    if event.response_id not in self._cancelled:
+                        print(event.delta, end="", flush=True)
                 elif event.type == "response.output_audio_transcript.done":
                     print()
                 elif event.type == "input_audio_buffer.speech_started":
+                    if self._responding or self.jitter.position() > self.jitter.played_bytes:
+                        await self.interrupt(connection)
                     print("🎤 Speech detected...")
                 elif event.type == "input_audio_buffer.speech_stopped":
                     print("🎤 Processing...")
+                    self._speech_stopped_at = time.monotonic()
+                    self._first_delta_at = None
+                    self.jitter.start_turn()
+                elif event.type == "response.done" and event.response.id in self._cancelled:
+                    self._cancelled.discard(event.response.id)
                 elif event.type == "response.done":
+                    self._responding = False
+                    self.jitter.end_of_response()
+                    if self._speech_stopped_at is not None and self._first_delta_at is not None:
+                        # Playback may not have started yet; report without blocking events
+                        task = asyncio.create_task(
+                            self.report_latency(self._speech_stopped_at, self._first_delta_at))
+                        self._reports.add(task)
+                        task.add_done_callback(self._reports.discard)
+                    self._speech_stopped_at = None
                     print("✅ Response complete\n")
                 elif event.type == "error":
                     print(f"\n❌ Error: {event.error.message}")
         except asyncio.CancelledError:
             pass
-    
-    async def run(self):
-        """Run the audio demo."""
+
+    async def connect_client(self) -> AsyncOpenAI:
+        """Realtime client authenticated with the API key or an Azure AD token."""
+        if self.api_key:
+            token = self.api_key
+        else:
+            token_provider = get_bearer_token_provider(
+                self.credential, "https://cognitiveservices.azure.com/.default"
+            )
+            # The credential chain may shell out to the Azure CLI; keep it off the loop
+            token = await asyncio.to_thread(token_provider)
+        base_url = self.endpoint.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/openai/v1"
+        return AsyncOpenAI(websocket_base_url=base_url, api_key=token)
+
+    def print_summary(self):
+        if self.latencies_ms:
+            ordered = sorted(self.latencies_ms)
+            print(f"⏱️  {len(ordered)} turns, median latency {ordered[len(ordered) // 2]:.0f} ms, "
+                  f"worst {ordered[-1]:.0f} ms")
+        print(f"🔊 Playback underruns: {self.jitter.underruns}, microphone buffers dropped: {self.mic_dropped}")
+        if self.interruptions:
+            print(f"✋ {self.interruptions} interruptions, {self.dropped_bytes} bytes of stale audio dropped")
+        if self.gate is not None:
+            stats = self.gate.stats()
+            print(f"🔇 Voice gate: {stats['bytes_suppressed']} of {stats['bytes_in']} bytes not sent")
+
+    async def run(self, duration: Optional[float] = None):
+        """Run the audio demo (until Ctrl+C, or for `duration` seconds)."""
         print("=" * 60)
         print("GPT-4o Realtime API - Audio Mode")
         print("=" * 60)
         print("🎤 Speak into your microphone")
         print("⌨️  Press Ctrl+C to exit\n")
-        
-        # Get auth token
-        token_provider = get_bearer_token_provider(
-            self.credential, "https://cognitiveservices.azure.com/.default"
-        )
-        token = token_provider()
-        base_url = self.endpoint.replace("https://", "wss://").rstrip("/") + "/openai/v1"
-        
-        client = AsyncOpenAI(websocket_base_url=base_url, api_key=token)
-        
+
+        client = await self.connect_client()
+        self._loop = asyncio.get_running_loop()
+        self._mic = asyncio.Queue(maxsize=MIC_QUEUE_SIZE)
+        input_stream = output_stream = None
+
         print("🔌 Connecting...")
-        
+
         try:
             async with client.realtime.connect(model=self.deployment) as connection:
-                # Configure session for audio
-                await connection.session.update(session={
-                    "type": "realtime",
-                    "instructions": "You are a helpful assistant. Keep responses brief and conversational.",
-                    "output_modalities": ["audio"],
-                    "audio": {
-                        "input": {
-                            "transcription": {
-                                "model": "whisper-1",
-                            },
-                            "format": {
-                                "type": "audio/pcm",
-                                "rate": 24000,
-                            },
-                            "turn_detection": {
-                                "type": "server_vad",
-                                "threshold": 0.5,
-                                "prefix_padding_ms": 300,
-                                "silence_duration_ms": 500,
-                                "create_response": True,
-                            }
-                        },
-                        "output": {
-                            "voice": "alloy",
-                            "format": {
-                                "type": "audio/pcm",
-                                "rate": 24000,
-                            }
-                        }
-                    }
-                })
-                
+                # Configure session for audio from the selected profile
+                await connection.session.update(session=self.profile.audio)
+
                 print("✅ Connected!\n")
-                
-                # Open audio streams
+
+                # Callback-mode streams: PortAudio's threads do the blocking
+                # device I/O, the event loop only handles the network
                 input_stream = self.audio.open(
                     format=self.format,
                     channels=1,
                     rate=self.rate,
                     input=True,
-                    frames_per_buffer=self.chunk
+                    frames_per_buffer=self.chunk,
+                    stream_callback=self._on_input
                 )
-                
+
                 output_stream = self.audio.open(
                     format=self.format,
                     channels=1,
                     rate=self.rate,
                     output=True,
-                    frames_per_buffer=self.chunk
+                    frames_per_buffer=self.chunk,
+                    stream_callback=self._on_output
                 )
-                
+                input_stream.start_stream()
+                output_stream.start_stream()
+
                 # Run send and receive tasks concurrently
-                send_task = asyncio.create_task(self.send_audio(connection, input_stream))
-                receive_task = asyncio.create_task(self.receive_audio(connection, output_stream))
-                
-                await asyncio.gather(send_task, receive_task)
-                
-        except KeyboardInterrupt:
+                send_task = asyncio.create_task(self.send_audio(connection))
+                receive_task = asyncio.create_task(self.receive_audio(connection))
+
+                await asyncio.wait([send_task, receive_task], timeout=duration,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                send_task.cancel()
+                receive_task.cancel()
+                await asyncio.gather(send_task, receive_task, return_exceptions=True)
+
+        except (KeyboardInterrupt, asyncio.CancelledError):
             print("\n\n👋 Goodbye!")
         finally:
-            try:
-                input_stream.stop_stream()
-                input_stream.close()
-                output_stream.stop_stream()
-                output_stream.close()
-            except:
-                pass
+            for stream in (input_stream, output_stream):
+                if stream is None:
+                    continue
+                try:
+                    stream.stop_stream()
+                    stream.close()
+                except:
+                    pass
             self.audio.terminate()
-            self.credential.close()
+            if self.credential is not None:
+                self.credential.close()
+            self.print_summary()
+
+
+async def run_fake(duration: float, profile: Optional[str] = None):
+    """Run the demo offline against the fake realtime server and a fake device."""
+    from fake_realtime_server import FakeRealtimeServer
+    from fake_audio_device import FakeAudioDevice
+
+    # One simulated turn per second of captured audio
+    server = FakeRealtimeServer(port=0, turn_bytes=24000 * 2)
+    await server.start()
+    try:
+        demo = RealtimeAudioDemo(audio=FakeAudioDevice(), endpoint=server.url, api_key="fake",
+                                 profile=profile)
+        await demo.run(duration=duration)
+    finally:
+        await server.stop()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Azure OpenAI Realtime audio demo")
+    parser.add_argument("--fake", action="store_true",
+                        help="Use the fake realtime server and a fake audio device (no Azure, no microphone)")
+    parser.add_argument("--seconds", type=float, default=None,
+                        help="Stop after this many seconds (default: until Ctrl+C; 10 with --fake)")
+    parser.add_argument("--profile", default=None,
+                        help="Session profile, e.g. low-latency or accurate (default: SESSION_PROFILE)")
+    return parser.parse_args(argv)
 
 
 async def main():
-    demo = RealtimeAudioDemo()
-    await demo.run()
+    args = parse_args()
+    if args.fake:
+        await run_fake(args.seconds or 10, args.profile)
+        return
+    demo = RealtimeAudioDemo(profile=args.profile)
+    await demo.run(duration=args.seconds)
 
 
 if __name__ == "__main__":
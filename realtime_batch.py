@@ -0,0 +1,374 @@
+"""
+Batch prompt runner for the Realtime API.
+Reads prompts from a JSONL file, one per line: either a JSON string or an
+object with "prompt" and optional "id" (default: the line number) and
+"instructions". Prompts are spread over a fixed number of realtime
+connections that stay open for the whole run. Each connection runs one
+prompt at a time as an out-of-band response, so no conversation state
+carries over between prompts. Connections go through the API's endpoint
+router, so REALTIME_ENDPOINTS failover applies.
+
+Results are appended to an output JSONL as they finish (completion order)
+with time to first token and total latency. `--resume` skips prompts
+whose id already has a finished result, so an interrupted run can pick up
+where it stopped.
+
+Usage:
+    python realtime_batch.py prompts.jsonl results.jsonl --concurrency 16
+    python realtime_batch.py prompts.jsonl results.jsonl --resume
+    python realtime_batch.py prompts.jsonl results.jsonl --fake
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, Iterator, List, Optional, Set, TextIO
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared with the API server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+from endpoint_router import REALTIME_ENDPOINTS, EndpointRouter, parse_endpoints
+from session_profiles import SESSION_PROFILE, SessionProfile, load_profiles
+
+# Text delta event names (GA and preview API versions)
+TEXT_DELTA_EVENTS = ("response.output_text.delta", "response.text.delta",
+                     "response.output_audio_transcript.delta")
+
+# Response statuses that are final; anything else is retried, and run again on --resume
+FINISHED = ("completed", "incomplete")
+
+# First retry delay in seconds, doubled per attempt
+RETRY_BACKOFF = 0.5
+
+
+class PromptError(Exception):
+    """The service rejected or failed a prompt."""
+
+
+def read_prompts(path: str) -> Iterator[Dict]:
+    """Prompts from a JSONL file; malformed lines are reported and skipped."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                print(f"⚠️  {path}:{number}: invalid JSON ({e}), skipped")
+                continue
+            if isinstance(entry, str):
+                entry = {"prompt": entry}
+            if not isinstance(entry, dict) or not isinstance(entry.get("prompt"), str):
+                print(f"⚠️  {path}:{number}: expected a string or an object with \"prompt\", skipped")
+                continue
+            entry.setdefault("id", number)
+            yield entry
+
+
+def finished_ids(path: str) -> Set[str]:
+    """Ids with a finished result in an earlier run's output.
+
+    A line cut short by an interrupted run is removed so new results start
+    on a line of their own.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    done = set()
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and record.get("status") in FINISHED:
+            done.add(str(record.get("id")))
+    return done
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _error_message(error) -> str:
+    return str(getattr(error, "message", None) or error)
+
+
+async def _close(connection):
+    try:
+        await connection.close()
+    except Exception:
+        pass
+
+
+class BatchRunner:
+    """Runs prompts over `concurrency` realtime connections and writes results as they finish."""
+
+    def __init__(
+        self,
+        router: EndpointRouter,
+        profile: SessionProfile,
+        concurrency: int = 8,
+        timeout: float = 120.0,
+        retries: int = 2,
+        progress_interval: float = 10.0,
+    ):
+        self.router = router
+        self.profile = profile
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.progress_interval = progress_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._output: Optional[TextIO] = None
+        self.ttft_ms: List[float] = []
+        self.total_ms: List[float] = []
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.retried = 0
+        self.connections = 0
+
+    async def _ask(self, connection, entry: Dict) -> Dict:
+        """Run one prompt as an out-of-band response and wait for response.done."""
+        response = {
+            "conversation": "none",
+            "output_modalities": ["text"],
+            "input": [{
+                "type": "message", "role": "user",
+                "content": [{"type": "input_text", "text": entry["prompt"]}],
+            }],
+        }
+        if entry.get("instructions"):
+            response["instructions"] = entry["instructions"]
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        parts: List[str] = []
+        await connection.response.create(response=response)
+        async for event in connection:
+            if event.type in TEXT_DELTA_EVENTS:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(event.delta)
+            elif event.type == "error":
+                raise PromptError(_error_message(event.error))
+            elif event.type == "response.done":
+                finished = time.perf_counter()
+                result = {
+                    "status": event.response.status,
+                    "text": "".join(parts),
+                    "ttft_ms": round((first_token - started) * 1000, 1) if first_token else None,
+                    "total_ms": round((finished - started) * 1000, 1),
+                }
+                details = getattr(event.response, "status_details", None)
+                if result["status"] not in FINISHED and details is not None:
+                    result["error"] = _error_message(getattr(details, "error", None) or details)
+                return result
+        raise ConnectionError("Realtime connection closed")
+
+    async def _connect(self):
+        _, connection, endpoint = await self.router.connect()
+        try:
+            await self.profile.apply(connection, "text")
+        except Exception:
+            await _close(connection)
+            raise
+        self.connections += 1
+        return connection, endpoint
+
+    async def _worker(self, connection=None, endpoint=None):
+        try:
+            while True:
+                entry = await self._queue.get()
+                if entry is None:
+                    return
+                result: Dict = {}
+                for attempt in range(self.retries + 1):
+                    if attempt:
+                        self.retried += 1
+                        await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+                    try:
+                        if connection is None:
+                            connection, endpoint = await self._connect()
+                        result = await asyncio.wait_for(self._ask(connection, entry), self.timeout)
+                    except Exception as e:
+                        # The connection may still be streaming the failed response; start afresh
+                        result = {"status": "error", "error": str(e) or type(e).__name__}
+                        if connection is not None:
+                            await _close(connection)
+                            connection = None
+                        continue
+                    if result["status"] in FINISHED:
+                        break
+                result["attempts"] = attempt + 1
+                if endpoint is not None:
+                    result["endpoint"] = endpoint.name
+                self._record(entry, result)
+        finally:
+            if connection is not None:
+                await _close(connection)
+
+    def _record(self, entry: Dict, result: Dict):
+        if result["status"] in FINISHED:
+            self.completed += 1
+            self.total_ms.append(result["total_ms"])
+            if result["ttft_ms"] is not None:
+                self.ttft_ms.append(result["ttft_ms"])
+        else:
+            self.failed += 1
+        record = {"id": entry["id"], "prompt": entry["prompt"], **result}
+        # One flushed line per result, so an interrupted run loses nothing written
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+
+    async def _report_progress(self, started: float):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            done = self.completed + self.failed
+            elapsed = time.perf_counter() - started
+            print(f"⏳ {done} done ({self.failed} failed), {done / elapsed:.1f} prompts/s")
+
+    async def run(self, prompts: Iterator[Dict], output: TextIO, skip: Set[str] = frozenset()) -> Dict:
+        """Run every prompt not in `skip` and return the run's summary."""
+        self._output = output
+        # Bounded, so a huge prompt file is read only as fast as it is consumed
+        self._queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.perf_counter()
+        # Open one connection before any prompt is queued, so an unreachable endpoint or a bad
+        # credential fails the run at once instead of every prompt waiting out its retries
+        try:
+            first = await self._connect()
+        except Exception as e:
+            raise ConnectionError(f"Could not open a realtime connection: {str(e) or type(e).__name__}") from e
+        workers = [asyncio.create_task(self._worker(*first))]
+        workers += [asyncio.create_task(self._worker()) for _ in range(self.concurrency - 1)]
+        progress = asyncio.create_task(self._report_progress(started)) if self.progress_interval > 0 else None
+        try:
+            for entry in prompts:
+                if str(entry["id"]) in skip:
+                    self.skipped += 1
+                    continue
+                await self._queue.put(entry)
+            for _ in workers:
+                await self._queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers + ([progress] if progress else []):
+                task.cancel()
+            await asyncio.gather(*workers, *([progress] if progress else []), return_exceptions=True)
+        return self.summary(time.perf_counter() - started)
+
+    def summary(self, elapsed: float) -> Dict:
+        summary = {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "retried": self.retried,
+            "connections": self.connections,
+            "seconds": round(elapsed, 2),
+            "prompts_per_sec": round((self.completed + self.failed) / elapsed, 2) if elapsed else 0.0,
+        }
+        for name, values in (("ttft_ms", self.ttft_ms), ("total_ms", self.total_ms)):
+            for pct in (50, 95, 99):
+                summary[f"{name}_p{pct}"] = percentile(values, pct) if values else None
+        return summary
+
+
+def print_summary(summary: Dict):
+    print(f"\n✅ {summary['completed']} completed, ❌ {summary['failed']} failed, "
+          f"⏭️  {summary['skipped']} skipped in {summary['seconds']:.1f} s "
+          f"({summary['prompts_per_sec']:.1f} prompts/s, {summary['connections']} connections opened, "
+          f"{summary['retried']} retries)")
+    for name, label in (("ttft_ms", "First token"), ("total_ms", "Total")):
+        if summary[f"{name}_p50"] is None:
+            continue
+        print(f"⏱️  {label:<12} p50 {summary[f'{name}_p50']:>7.0f} ms   "
+              f"p95 {summary[f'{name}_p95']:>7.0f} ms   p99 {summary[f'{name}_p99']:>7.0f} ms")
+
+
+async def run_batch(args, endpoint: Optional[str], api_key: Optional[str] = None) -> Dict:
+    from credentials import ClientFactory, TokenCache
+
+    profile = load_profiles()[args.profile or SESSION_PROFILE]
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-realtime")
+    token_cache = TokenCache(api_key=api_key or os.getenv("AZURE_OPENAI_API_KEY"))
+    factory = ClientFactory(token_cache)
+    spec = "" if args.fake else REALTIME_ENDPOINTS
+    router = EndpointRouter(parse_endpoints(spec, endpoint, deployment), factory.get_realtime_client)
+    skip = finished_ids(args.output) if args.resume else set()
+    runner = BatchRunner(router, profile, concurrency=args.concurrency, timeout=args.timeout,
+                         retries=args.retries, progress_interval=args.progress)
+    await token_cache.start()
+    await router.start()
+    try:
+        with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+            return await runner.run(read_prompts(args.prompts), output, skip)
+    finally:
+        await router.stop()
+        await factory.close()
+        await token_cache.stop()
+
+
+async def run_fake(args) -> Dict:
+    """Run the batch offline against the fake realtime server."""
+    from fake_realtime_server import FakeRealtimeServer
+
+    server = FakeRealtimeServer(port=0, tokens_per_sec=50)
+    await server.start()
+    try:
+        return await run_batch(args, server.url, api_key="fake")
+    finally:
+        await server.stop()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the Realtime API")
+    parser.add_argument("prompts", help="JSONL file of prompts")
+    parser.add_argument("output", help="JSONL file results are written to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Realtime connections to run prompts on")
+    parser.add_argument("--resume", action="store_true",
+                        help="Append to the output and skip prompts that already have a finished result")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per prompt after an error")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed per prompt attempt")
+    parser.add_argument("--progress", type=float, default=10.0,
+                        help="Seconds between progress lines (0 disables them)")
+    parser.add_argument("--profile", default=None,
+                        help="Session profile whose text instructions are used (default: SESSION_PROFILE)")
+    parser.add_argument("--fake", action="store_true", help="Use the fake realtime server (no Azure)")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if not args.resume and os.path.exists(args.output) and os.path.getsize(args.output):
+        parser.error(f"{args.output} already has results; pass --resume to continue that run")
+    return args
+
+
+async def main():
+    args = parse_args()
+    try:
+        if args.fake:
+            summary = await run_fake(args)
+        else:
+            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+            if not endpoint and not REALTIME_ENDPOINTS:
+                raise ValueError("AZURE_OPENAI_ENDPOINT not found")
+            summary = await run_batch(args, endpoint)
+    except ConnectionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    print("\n🚀 Starting Azure OpenAI Realtime Batch Runner...\n")
+    asyncio.run(main())
@@ -12,7 +12,9 @@ class RealtimeTextDemo:
         self.deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-realtime")
         if not self.endpoint:
             raise ValueError("AZURE_OPENAI_ENDPOINT not found")
-        self.credential = DefaultAzureCredential()
+        # An API key (e.g. for the fake realtime server) skips Azure AD
+        self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        self.credential = None if self.api_key else DefaultAzureCredential()
     
     async def chat(self):
         print("=" * 60)
@@ -21,11 +23,15 @@ class RealtimeTextDemo:
         print("Type your messages and press Enter")
         print("Type 'quit' to exit\n")
         
-        token_provider = get_bearer_token_provider(
-            self.credential, "https://cognitiveservices.azure.com/.default"
-        )
-        token = token_provider()
-        base_url = self.endpoint.replace("https://", "wss://").rstrip("/") + "/openai/v1"
+        if self.api_key:
+            token = self.api_key
+        else:
+            token_provider = get_bearer_token_provider(
+                self.credential, "https://cognitiveservices.azure.com/.default"
+            )
+            # The credential chain may shell out to the Azure CLI; keep it off the loop
+            token = await asyncio.to_thread(token_provider)
+        base_url = self.endpoint.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/openai/v1"
         
         client = AsyncOpenAI(websocket_base_url=base_url, api_key=token)
         
@@ -40,7 +46,7 @@ class RealtimeTextDemo:
             print("✅ Connected!\n")
             
             while True:
-                user_input = await asyncio.get_event_loop().run_in_executor(None, input, "💬 You: ")
+                user_input = await asyncio.to_thread(input, "💬 You: ")
                 if user_input.lower() in ['quit', 'exit', 'q']:
                     print("\n👋 Goodbye!")
                     break